@@ -1,7 +1,7 @@
 from django.contrib import admin
 from django.urls import reverse
 from django.utils.html import format_html
-from .models import Group, Photo, Tag, PhotoTag
+from .models import Group, Photo, Tag, PhotoTag, Job
 
 class MemberInline(admin.TabularInline):
     model = Group.members.through
@@ -49,22 +49,20 @@ class PhotoTagAssociationInline(admin.TabularInline):
 
 @admin.register(Group)
 class GroupAdmin(admin.ModelAdmin):
-    list_display = ('name', 'created_by', 'member_count')
+    changelist_query_budget = 8 # See core.query_budgets
+    # Counters are denormalized columns maintained by core.signals
+    list_display = ('name', 'created_by', 'member_count', 'photo_count', 'tag_count')
     search_fields = ('name', 'created_by__username', 'members__username')
     inlines = [MemberInline, PhotoTagAssociationInline]
     raw_id_fields = ('created_by',)
     list_filter = ('created_by',)
-
-    def member_count(self, obj):
-        return obj.members.count()
-    member_count.short_description = "Members"
-
-    def get_queryset(self, request):
-        return super().get_queryset(request).prefetch_related('members')
+    list_select_related = ('created_by',)
+    readonly_fields = ('member_count', 'photo_count', 'tag_count')
 
 
 @admin.register(Photo)
 class PhotoAdmin(admin.ModelAdmin):
+    changelist_query_budget = 11
     list_display = ('image_thumbnail', 'uploaded_by', 'uploaded_at', 'group_associations_list')
     search_fields = ('uploaded_by__username',)
     list_filter = ('uploaded_at', 'uploaded_by')
@@ -73,7 +71,8 @@ class PhotoAdmin(admin.ModelAdmin):
 
     def image_thumbnail(self, obj):
         if obj.image:
-            return format_html('<img src="{}" style="max-height: 50px; max-width: 50px;" />', obj.image.url)
+            return format_html('<img src="{}" srcset="{}" sizes="50px" style="max-height: 50px; max-width: 50px;" />',
+                               obj.thumbnail_url, obj.jpeg_srcset)
         return "No image"
     image_thumbnail.short_description = 'Thumbnail'
 
@@ -87,15 +86,18 @@ class PhotoAdmin(admin.ModelAdmin):
         associations = obj.group_tag_associations.all()
         if not associations:
             return "-"
-        return ", ".join([f"{assoc.group.name} ({assoc.tags.count()} tags)" for assoc in associations])
+        return ", ".join([f"{assoc.group.name} ({len(assoc.tag_ids)} tags)" for assoc in associations])
     group_associations_list.short_description = "Group Associations"
 
     def get_queryset(self, request):
-        return super().get_queryset(request).prefetch_related('group_tag_associations__group', 'group_tag_associations__tags')
+        return super().get_queryset(request).prefetch_related(
+            'group_tag_associations__group', 'renditions'
+        )
 
 
 @admin.register(Tag)
 class TagAdmin(admin.ModelAdmin):
+    changelist_query_budget = 8
     list_display = ('name', 'group_link')
     search_fields = ('name', 'group__name')
     list_select_related = ('group',) # Performance optimization
@@ -112,6 +114,7 @@ class TagAdmin(admin.ModelAdmin):
 
 @admin.register(PhotoTag)
 class PhotoTagAdmin(admin.ModelAdmin):
+    changelist_query_budget = 11
     list_display = ('photo_thumbnail', 'group_name', 'tag_list')
     raw_id_fields = ('photo', 'group')
     filter_horizontal = ('tags',)
@@ -120,7 +123,8 @@ class PhotoTagAdmin(admin.ModelAdmin):
 
     def photo_thumbnail(self, obj):
         if obj.photo and obj.photo.image:
-            return format_html('<img src="{}" style="max-height: 50px; max-width: 50px;" />', obj.photo.image.url)
+            return format_html('<img src="{}" srcset="{}" sizes="50px" style="max-height: 50px; max-width: 50px;" />',
+                               obj.photo.thumbnail_url, obj.photo.jpeg_srcset)
         return "No image"
     photo_thumbnail.short_description = 'Photo'
 
@@ -134,7 +138,7 @@ class PhotoTagAdmin(admin.ModelAdmin):
     tag_list.short_description = 'Tags'
 
     def get_queryset(self, request):
-        return super().get_queryset(request).select_related('photo', 'group').prefetch_related('tags')
+        return super().get_queryset(request).select_related('photo', 'group').prefetch_related('tags', 'photo__renditions')
 
     def formfield_for_manytomany(self, db_field, request, **kwargs):
         # Limit tags to those belonging to the selected group for this PhotoTag instance
@@ -148,4 +152,15 @@ class PhotoTagAdmin(admin.ModelAdmin):
             else: # For new PhotoTag instances, this won't filter initially until group is selected.
                   # This might require JavaScript or a custom form for dynamic filtering on add page.
                 kwargs["queryset"] = Tag.objects.none() # Or Tag.objects.all() as a fallback
-        return super().formfield_for_manytomany(db_field, request, **kwargs)
\ No newline at end of file
+        return super().formfield_for_manytomany(db_field, request, **kwargs)
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    changelist_query_budget = 8
+    list_display = ('id', 'kind', 'status', 'attempts', 'created_by', 'created_at', 'finished_at')
+    list_filter = ('status', 'kind')
+    search_fields = ('kind', 'created_by__username')
+    list_select_related = ('created_by',)
+    raw_id_fields = ('created_by',)
+    readonly_fields = ('created_at', 'updated_at', 'started_at', 'finished_at')
@@ -0,0 +1,181 @@
+"""
+Async versions of the group page, upload and tag views, routed in place of
+the core.views ones by tagmi.urls_async under the ASGI deployment profile
+(see tagmi/gunicorn_asgi.py).
+
+Lookups and writes go through the async ORM, and uploads are sent to storage
+concurrently from worker threads (uploads.abulk_upload_photos), so slow
+storage or database round trips no longer hold a whole worker. Forms,
+template rendering and the group page (GroupDetailView as is) use the
+synchronous ORM, so they run through sync_to_async.
+"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib import messages
+from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse
+from django.shortcuts import aget_object_or_404, redirect, render
+from django.views.decorators.http import require_POST
+
+from .forms import BulkTagAssignmentForm, PhotoTagAssignmentForm
+from .jobs import enqueue_photo_upload
+from .models import Group, Photo, PhotoTag, Tag
+from .query_budgets import query_budget
+from .suggestions import suggest_tags_for_photo
+from .tagging import AUTOCOMPLETE_LIMIT, aautocomplete_tags, bulk_assign_tags, get_or_create_tag
+from .uploads import abulk_upload_photos
+from .views import (
+    GroupDetailView, filtered_group_detail_url, get_int_param, is_htmx_request, render_photo_card_fragment,
+    report_upload_results
+)
+
+sync_group_detail_view = GroupDetailView.as_view()
+
+
+async def get_user(request):
+    """The request's user, loaded with the async ORM and also set as request.user for sync code."""
+    user = await request.auser()
+    request.user = user
+    return user
+
+
+async def get_member_group(request, group_pk):
+    return await aget_object_or_404(Group, pk=group_pk, members=await get_user(request))
+
+
+def validated_form(form_class, data, group):
+    # Run through sync_to_async: the tag forms query the group's tags when built and validated
+    form = form_class(data, group=group)
+    form.is_valid()
+    return form
+
+
+@query_budget(GroupDetailView.query_budget)
+@login_required
+async def group_detail_view(request, pk):
+    # A compatibility shim: the page (conditional GET, filters, caches, card
+    # and page templates) is GroupDetailView's, built in a thread, whose
+    # validator lookup also checks membership. The async ORM would run the
+    # same queries one after another through sync_to_async too, so a port
+    # would only duplicate the page logic.
+    return await sync_to_async(sync_group_detail_view)(request, pk=pk)
+
+
+@query_budget(19)
+@login_required
+async def upload_photos_view(request):
+    user = await get_user(request)
+    user_groups = [group async for group in Group.objects.filter(members=user).order_by('name')]
+
+    if request.method != "POST":
+        return await sync_to_async(render)(request, "core/upload_photos.html", {'groups': user_groups})
+
+    images = request.FILES.getlist('images')
+    group_ids = set(request.POST.getlist('groups'))
+    # Only groups the user is a member of (security measure)
+    selected_groups = [group for group in user_groups if str(group.id) in group_ids]
+    if not images:
+        messages.error(request, "Please select at least one image to upload.")
+    elif not group_ids:
+        messages.error(request, "Please select at least one group.")
+    elif not selected_groups:
+        messages.error(request, "Invalid or no accessible groups selected.")
+    elif settings.ASYNC_UPLOADS:
+        job = await sync_to_async(enqueue_photo_upload)(user, images, selected_groups)
+        messages.info(request, f"{len(images)} photo(s) received and queued for processing.")
+        return redirect('upload_job_status', job_pk=job.pk)
+    else:
+        content_hashes = getattr(request, 'upload_content_hashes', {}).get('images')
+        results = await abulk_upload_photos(images, user, selected_groups, content_hashes=content_hashes)
+        if report_upload_results(request, results):
+            return redirect('group_list')
+    return await sync_to_async(render)(request, "core/upload_photos.html", {'groups': user_groups})
+
+
+@query_budget(11)
+@login_required
+@require_POST
+async def add_group_tag_view(request, group_pk):
+    group = await get_member_group(request, group_pk)
+    tag_name = request.POST.get('tag_name', '').strip()
+
+    if not tag_name:
+        messages.error(request, "Tag name cannot be empty.")
+    else:
+        # A transaction with a retry on conflicts, so kept synchronous
+        tag, created = await sync_to_async(get_or_create_tag)(group, tag_name)
+        if created:
+            messages.success(request, f"Tag '{tag.name}' added to group '{group.name}'.")
+        else:
+            messages.info(request, f"Tag '{tag.name}' already exists in group '{group.name}'.")
+    return redirect('group_detail', pk=group_pk)
+
+
+@query_budget(8)
+@login_required
+async def tag_autocomplete_view(request, group_pk):
+    group = await get_member_group(request, group_pk)
+    query, photo_id = request.GET.get('q', ''), get_int_param(request, 'photo')
+    tags = None
+    if photo_id is not None:
+        tags = await sync_to_async(suggest_tags_for_photo)(group, photo_id, query, AUTOCOMPLETE_LIMIT)
+    if tags is None:
+        tags = await aautocomplete_tags(group, query)
+    if is_htmx_request(request):
+        return await sync_to_async(render)(request, 'core/partials/_tag_suggestions.html', {'tags': tags})
+    return JsonResponse({'results': [{'id': tag.id, 'name': tag.name, 'usage': tag.usage} for tag in tags]})
+
+
+@query_budget(19)
+@login_required
+@require_POST
+async def remove_group_tag_view(request, group_pk, tag_pk):
+    group = await get_member_group(request, group_pk)
+    tag = await aget_object_or_404(Tag, pk=tag_pk, group=group)
+
+    tag_name = tag.name
+    await tag.adelete()
+    messages.success(request, f"Tag '{tag_name}' and its associations within this group have been removed.")
+    return redirect('group_detail', pk=group_pk)
+
+
+@query_budget(34)
+@login_required
+@require_POST
+async def assign_photo_tags_view(request, group_pk, photo_pk):
+    group = await get_member_group(request, group_pk)
+    photo = await aget_object_or_404(Photo, pk=photo_pk)
+    photo_tag_association, _ = await PhotoTag.objects.aget_or_create(photo=photo, group=group)
+
+    form = await sync_to_async(validated_form)(PhotoTagAssignmentForm, request.POST, group)
+    if form.is_valid():
+        await photo_tag_association.tags.aset(form.cleaned_data['tags_to_assign'])
+        messages.success(request, f"Tags updated for photo in group '{group.name}'.")
+    else:
+        for field, errors in form.errors.items():
+            for error in errors:
+                messages.error(request, f"Error assigning tags: {field} - {error}")
+    if is_htmx_request(request):
+        return await sync_to_async(render_photo_card_fragment)(request, group, photo_tag_association)
+    return redirect('group_detail', pk=group_pk)
+
+
+@query_budget(22)
+@login_required
+@require_POST
+async def bulk_assign_photo_tags_view(request, group_pk):
+    group = await get_member_group(request, group_pk)
+    form = await sync_to_async(validated_form)(BulkTagAssignmentForm, request.POST, group)
+    if form.is_valid():
+        photos_count, added, removed = await sync_to_async(bulk_assign_tags)(
+            group,
+            [photo.id for photo in form.cleaned_data['photos']],
+            [tag.id for tag in form.cleaned_data['tags']],
+            form.cleaned_data['action'],
+        )
+        messages.success(request, f"Tags updated on {photos_count} photo(s): {added} added, {removed} removed.")
+    else:
+        for field, errors in form.errors.items():
+            for error in errors:
+                messages.error(request, f"Error updating tags: {error}")
+    return redirect(filtered_group_detail_url(request, group_pk))
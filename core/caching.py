@@ -0,0 +1,125 @@
+"""
+Versioned fragment cache for the group photo grid.
+
+Cached HTML is never invalidated explicitly. Instead, every key embeds a
+version stamp that is stored in the database: PhotoTag.cache_version for a
+photo card, and Group.cache_version for a whole page of the grid. core.signals
+bumps these stamps whenever tags, assignments or membership change. Old
+entries then become unreachable and expire on their own, and every worker
+agrees on what is current even when each one has its own cache.
+
+The cached HTML holds CSRF_PLACEHOLDER where the card forms need the CSRF
+token, so a fragment can be shared between users. fill_csrf_token() swaps in
+the requesting user's token before the HTML is served.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+from django.middleware.csrf import get_token
+from django.template.loader import render_to_string
+from django.utils import translation
+
+from . import metrics
+from .models import Group
+from .profiling import record_cache
+
+CARD_TEMPLATE = 'core/partials/_photo_card.html'
+CARD_TIMEOUT = 60 * 60 * 24
+PAGE_TIMEOUT = 60 * 60
+CSRF_PLACEHOLDER = '__tagmi_csrf_token__'
+
+CACHE_LAYERS = ('card', 'page', 'facets')
+
+
+def bump_group_versions(group_ids):
+    group_ids = set(group_ids)
+    if group_ids:
+        Group.objects.filter(pk__in=group_ids).update(cache_version=F('cache_version') + 1)
+
+
+def bump_card_versions(phototags):
+    """Bumps the cards of the ``phototags`` queryset and the groups showing them."""
+    group_ids = set(phototags.values_list('group_id', flat=True))
+    phototags.update(cache_version=F('cache_version') + 1)
+    bump_group_versions(group_ids)
+
+
+def vocabulary_digest(group_tags):
+    """Short digest of the group's tags, which the full (non-compact) cards list."""
+    raw = '|'.join(f"{tag.id}:{tag.name}" for tag in group_tags)
+    return hashlib.md5(raw.encode(), usedforsecurity=False).hexdigest()[:12]
+
+
+def card_cache_key(phototag, vocabulary, compact):
+    return (
+        f"photo-card:{settings.RELEASE_VERSION}:{phototag.id}:{phototag.cache_version}:{vocabulary}:"
+        f"{int(compact)}:{translation.get_language()}"
+    )
+
+
+def _filter_digest(filter_key):
+    return hashlib.md5(filter_key.encode(), usedforsecurity=False).hexdigest()[:16] if filter_key else ''
+
+
+def page_cache_key(group, filter_key, cursor, compact, page_size):
+    """``filter_key`` is the canonical text of the page's tag filter (see core.tag_query)."""
+    return (
+        f"group-page:{settings.RELEASE_VERSION}:{group.id}:{group.cache_version}:{_filter_digest(filter_key)}:"
+        f"{cursor or ''}:{int(compact)}:{page_size}:{translation.get_language()}"
+    )
+
+
+def facet_cache_key(group, filter_key):
+    return f"tag-facets:{group.id}:{group.cache_version}:{_filter_digest(filter_key)}"
+
+
+def render_photo_cards(detail_items, group, group_tags, compact):
+    """
+    Returns the HTML of every card in ``detail_items``. Cards found in the cache
+    are reused, and only the missing ones are rendered (then stored).
+    """
+    vocabulary = vocabulary_digest(group_tags)
+    keys = [card_cache_key(item['photo_tag_association'], vocabulary, compact) for item in detail_items]
+    cached = cache.get_many(keys)
+    rendered = {}
+    for key, detail_item in zip(keys, detail_items):
+        if key not in cached:
+            rendered[key] = render_to_string(CARD_TEMPLATE, {
+                'detail_item': detail_item,
+                'group': group,
+                'compact_cards': compact,
+                'csrf_token': CSRF_PLACEHOLDER,
+            })
+    if rendered:
+        cache.set_many(rendered, CARD_TIMEOUT)
+    record_cache_stats('card', hits=len(keys) - len(rendered), misses=len(rendered))
+    return [cached.get(key) or rendered[key] for key in keys]
+
+
+def fill_csrf_token(html, request):
+    return html.replace(CSRF_PLACEHOLDER, get_token(request))
+
+
+def record_cache_stats(layer, hits=0, misses=0):
+    record_cache(layer, hits, misses) # For the request's Server-Timing header, when profiled
+    # Counted in the per-process metric files: an add()/incr() pair on the
+    # file-based cache is a read-modify-write that concurrent workers race on
+    for outcome, count in (('hits', hits), ('misses', misses)):
+        if count:
+            metrics.inc('tagmi_fragment_cache_lookups_total', count, layer=layer, outcome=outcome)
+
+
+def get_cache_stats():
+    """Hit/miss totals per cache layer across workers, with the hit ratio (None before any lookup)."""
+    counters, _ = metrics.collect()
+    stats = {}
+    for layer in CACHE_LAYERS:
+        hits, misses = (
+            int(counters.get(('tagmi_fragment_cache_lookups_total', (('layer', layer), ('outcome', outcome))), 0))
+            for outcome in ('hits', 'misses')
+        )
+        lookups = hits + misses
+        stats[layer] = {'hits': hits, 'misses': misses, 'hit_ratio': round(hits / lookups, 4) if lookups else None}
+    return stats
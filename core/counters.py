@@ -0,0 +1,50 @@
+"""
+Maintenance of the denormalized Group.member_count / photo_count / tag_count
+columns. Single-row changes adjust them from signals (core.signals); bulk
+writes, which send no signals, call recount_group_counters() afterwards.
+"""
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Group, PhotoTag, Tag
+
+COUNTER_FIELDS = ('member_count', 'photo_count', 'tag_count')
+
+
+def _count_subquery(queryset):
+    counts = queryset.filter(group_id=OuterRef('pk')).order_by().values('group_id').annotate(n=Count('*')).values('n')
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+def counter_expressions():
+    return {
+        'member_count': _count_subquery(Group.members.through.objects.all()),
+        'photo_count': _count_subquery(PhotoTag.objects.all()),
+        'tag_count': _count_subquery(Tag.objects.all()),
+    }
+
+
+def recount_group_counters(group_ids=None, fields=COUNTER_FIELDS):
+    """Recomputes the counters of ``group_ids`` (every group if None) with one UPDATE."""
+    groups = Group.objects.all() if group_ids is None else Group.objects.filter(pk__in=group_ids)
+    expressions = counter_expressions()
+    return groups.update(**{field: expressions[field] for field in fields})
+
+
+def adjust_group_counter(group_id, field, delta):
+    Group.objects.filter(pk=group_id).update(**{field: F(field) + delta})
+
+
+def find_counter_drift():
+    """Returns ``(group, {field: (stored, actual)})`` for every group whose counters are wrong."""
+    drifted = []
+    groups = Group.objects.annotate(**{f'actual_{field}': expression for field, expression in counter_expressions().items()})
+    for group in groups.order_by('pk'):
+        wrong = {
+            field: (getattr(group, field), getattr(group, f'actual_{field}'))
+            for field in COUNTER_FIELDS
+            if getattr(group, field) != getattr(group, f'actual_{field}')
+        }
+        if wrong:
+            drifted.append((group, wrong))
+    return drifted
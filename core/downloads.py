@@ -0,0 +1,127 @@
+"""
+ZIP downloads of a group's photos, streamed as they are built.
+
+stream_photo_archive() yields the archive piece by piece: photos are read
+from the database in keyset-paginated batches, and each original is fetched
+from storage and copied into the archive chunk by chunk, so memory use does
+not depend on the size of the photos (only the manifest rows accumulate).
+Images are already compressed, so entries are stored without compression.
+
+A ``manifest.csv`` at the end of the archive lists every photo with its
+uploader, upload time and tags in the group. It also flags the photos
+that could not be fetched, since the response is already under way by then.
+"""
+import contextlib
+import csv
+import io
+import zipfile
+
+import requests
+from django.utils import timezone
+
+from .metrics import storage_timer
+from .pagination import paginate_photo_associations
+
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+DOWNLOAD_BATCH_SIZE = 100 # Photos read from the database at a time
+FETCH_TIMEOUT = 30 # Seconds, per storage request
+
+DOWNLOAD_ERRORS = (requests.RequestException, OSError)
+
+MANIFEST_NAME = 'manifest.csv'
+MANIFEST_FIELDS = ('file', 'photo_id', 'uploaded_by', 'uploaded_at', 'tags', 'error')
+
+
+class _ArchiveBuffer(io.RawIOBase):
+    """
+    The unseekable file the ZipFile writes to (so entries use data
+    descriptors); take() returns what was written since the last call.
+    """
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def take(self):
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+@contextlib.contextmanager
+def open_photo(photo):
+    """The original of ``photo``, streamed from storage, as an iterator over chunks of bytes."""
+    with storage_timer('download'):
+        response = requests.get(photo.image.url, stream=True, timeout=FETCH_TIMEOUT)
+    with response:
+        response.raise_for_status()
+        yield response.iter_content(DOWNLOAD_CHUNK_SIZE)
+
+
+def archive_name(photo):
+    extension = getattr(photo.image, 'format', None) or 'jpg'
+    return f"{photo.uploaded_at:%Y-%m-%d}_{photo.id}.{extension}"
+
+
+def iter_photo_associations(phototags, batch_size=DOWNLOAD_BATCH_SIZE):
+    """Every row of ``phototags`` in grid order, one short query per batch."""
+    cursor = None
+    while True:
+        batch, next_cursor = paginate_photo_associations(phototags, cursor, batch_size)
+        yield from batch
+        if next_cursor is None:
+            return
+        last_photo = batch[-1].photo
+        cursor = (last_photo.uploaded_at, last_photo.id)
+
+
+def stream_photo_archive(phototags, tag_names):
+    """
+    Yields a ZIP archive of the photos of ``phototags`` (PhotoTag rows, with
+    ``photo__uploaded_by`` selected) and its manifest. ``tag_names`` maps the
+    group's tag ids to their names.
+    """
+    return (data for data in _archive_chunks(phototags, tag_names) if data)
+
+
+def _archive_chunks(phototags, tag_names):
+    buffer = _ArchiveBuffer()
+    manifest = io.StringIO()
+    writer = csv.DictWriter(manifest, MANIFEST_FIELDS)
+    writer.writeheader()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_STORED) as archive:
+        for phototag in iter_photo_associations(phototags):
+            photo = phototag.photo
+            name = archive_name(photo)
+            error = ''
+            try:
+                with open_photo(photo) as chunks:
+                    info = zipfile.ZipInfo(name, date_time=timezone.localtime(photo.uploaded_at).timetuple()[:6])
+                    with archive.open(info, 'w') as entry:
+                        for chunk in chunks:
+                            entry.write(chunk)
+                            yield buffer.take()
+            except DOWNLOAD_ERRORS as exc:
+                # Before the entry was opened the photo is left out; after, it is truncated
+                error = str(exc) or exc.__class__.__name__
+            writer.writerow({
+                'file': name,
+                'photo_id': photo.id,
+                'uploaded_by': photo.uploaded_by.username,
+                'uploaded_at': photo.uploaded_at.isoformat(),
+                'tags': '; '.join(sorted(tag_names[tag_id] for tag_id in phototag.tag_ids if tag_id in tag_names)),
+                'error': error,
+            })
+            yield buffer.take()
+        archive.writestr(MANIFEST_NAME, manifest.getvalue())
+    yield buffer.take()
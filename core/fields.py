@@ -0,0 +1,49 @@
+from django.db import models
+from django.db.models import Lookup
+
+
+class TagIdSetField(models.Field):
+    """
+    A set of tag ids, as a sorted list in Python. Stored as ``bigint[]`` on
+    PostgreSQL (GIN-indexable, see migration 0014) and as ``,1,5,9,`` text on
+    other databases (SQLite in DEBUG). Filter with the ``has_tag`` lookup.
+    """
+    description = "Set of tag ids"
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('default', list)
+        kwargs.setdefault('blank', True)
+        super().__init__(*args, **kwargs)
+
+    def db_type(self, connection):
+        return 'bigint[]' if connection.vendor == 'postgresql' else 'text'
+
+    def from_db_value(self, value, expression, connection):
+        return self.to_python(value)
+
+    def to_python(self, value):
+        if value is None:
+            return []
+        if isinstance(value, str):
+            value = [part for part in value.split(',') if part]
+        return sorted({int(tag_id) for tag_id in value})
+
+    def get_db_prep_value(self, value, connection, prepared=False):
+        tag_ids = self.to_python(value)
+        if connection.vendor == 'postgresql':
+            return tag_ids
+        return f",{','.join(map(str, tag_ids))}," if tag_ids else ''
+
+
+@TagIdSetField.register_lookup
+class HasTag(Lookup):
+    """``tag_ids__has_tag=<tag id>``: array containment on PostgreSQL, a delimited LIKE elsewhere."""
+    lookup_name = 'has_tag'
+    prepare_rhs = False
+
+    def as_sql(self, compiler, connection):
+        lhs, params = self.process_lhs(compiler, connection)
+        tag_id = int(self.rhs)
+        if connection.vendor == 'postgresql':
+            return f"{lhs} @> ARRAY[%s]::bigint[]", [*params, tag_id]
+        return f"{lhs} LIKE %s", [*params, f"%,{tag_id},%"]
@@ -1,7 +1,9 @@
 from django import forms
 from django.contrib.auth.models import User
 from django.utils.translation import gettext_lazy as _
-from .models import Group, Tag # PhotoTag model not directly used in forms here
+from .models import Group, Photo, Tag # PhotoTag model not directly used in forms here
+from .tagging import BULK_ADD, BULK_REMOVE, BULK_REPLACE
+from .tag_query import TagQueryError, all_tags_query, parse_tag_query
 
 class GroupForm(forms.ModelForm):
     members = forms.ModelMultipleChoiceField(
@@ -25,20 +27,24 @@ class PhotoTagAssignmentForm(forms.Form):
         required=False
     )
 
-    def __init__(self, *args, group=None, selected_tags=None, **kwargs):
+    def __init__(self, *args, group=None, selected_tags=None, group_tags=None, **kwargs):
         super().__init__(*args, **kwargs)
 
         if group:
-            all_tags = Tag.objects.filter(group=group)
+            # group_tags lets a page building many cards load the group's tags
+            # once and share them; it must be in display (name) order.
+            if group_tags is None:
+                group_tags = list(Tag.objects.filter(group=group).order_by('name'))
             selected_tags = selected_tags or []
             selected_ids = [tag.id for tag in selected_tags]
 
-            selected = list(all_tags.filter(id__in=selected_ids).order_by('name'))
-            not_selected = list(all_tags.exclude(id__in=selected_ids).order_by('name'))
+            selected_id_set = set(selected_ids)
+            selected = [tag for tag in group_tags if tag.id in selected_id_set]
+            not_selected = [tag for tag in group_tags if tag.id not in selected_id_set]
             ordered_tags = selected + not_selected
 
-            # ✅ nécessaire pour validation du formulaire
-            self.fields['tags_to_assign'].queryset = all_tags
+            # ✅ nécessaire pour validation du formulaire (lazy: only queried on POST)
+            self.fields['tags_to_assign'].queryset = Tag.objects.filter(group=group)
 
             # ✅ nécessaire pour l’ordre visuel dans le rendu HTML
             self.fields['tags_to_assign'].choices = [(tag.pk, str(tag)) for tag in ordered_tags]
@@ -53,8 +59,84 @@ class TagFilterForm(forms.Form):
         required=False,
         label=_("Filter by tags"),
     )
+    tag_query = forms.CharField(
+        max_length=500,
+        required=False,
+        label=_("Tag query"),
+        widget=forms.TextInput(attrs={'placeholder': _("e.g. beach AND (2024 OR summer) NOT blurry")}),
+    )
+
+    def __init__(self, *args, group=None, group_tags=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.group_tags = group_tags
+        if group:
+            self.fields['tags_to_filter_by'].queryset = Tag.objects.filter(group=group).order_by('name')
+            if self.group_tags is None:
+                self.group_tags = list(Tag.objects.filter(group=group))
+
+    def clean_tag_query(self):
+        tag_query = self.cleaned_data['tag_query'].strip()
+        try:
+            self.cleaned_data['tag_query_tree'] = parse_tag_query(tag_query, self.group_tags or [])
+        except TagQueryError as exc:
+            raise forms.ValidationError(str(exc))
+        return tag_query
+
+    def get_filter_tree(self):
+        """
+        The parsed filter (see core.tag_query): every ticked tag AND the tag
+        query. None when nothing filters. Only valid after is_valid().
+        """
+        checked = all_tags_query(tag.id for tag in self.cleaned_data.get('tags_to_filter_by') or [])
+        query = self.cleaned_data.get('tag_query_tree')
+        if checked and query:
+            return ('and', checked, query)
+        return checked or query
+
+
+class BulkTagAssignmentForm(forms.Form):
+    action = forms.ChoiceField(
+        choices=[
+            (BULK_ADD, _("Add tags")),
+            (BULK_REMOVE, _("Remove tags")),
+            (BULK_REPLACE, _("Replace tags")),
+        ],
+        initial=BULK_ADD,
+        label=_("Action"),
+    )
+    photos = forms.ModelMultipleChoiceField(
+        queryset=Photo.objects.none(),
+        label=_("Selected photos"),
+        error_messages={'required': _("Select at least one photo.")},
+    )
+    tags = forms.ModelMultipleChoiceField(
+        queryset=Tag.objects.none(),
+        widget=forms.CheckboxSelectMultiple,
+        required=False, # Replacing with no tags clears the selected photos
+        label=_("Tags"),
+    )
+
+    def __init__(self, *args, group=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if group:
+            # Only photos and tags of this group can be targeted
+            self.fields['photos'].queryset = Photo.objects.filter(group_tag_associations__group=group)
+            self.fields['tags'].queryset = Tag.objects.filter(group=group).order_by('name')
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if cleaned_data.get('action') in (BULK_ADD, BULK_REMOVE) and not cleaned_data.get('tags'):
+            self.add_error('tags', _("Select at least one tag."))
+        return cleaned_data
+
+class BulkPhotoRemovalForm(forms.Form):
+    photos = forms.ModelMultipleChoiceField(
+        queryset=Photo.objects.none(),
+        label=_("Photos to remove"),
+        error_messages={'required': _("Select at least one photo.")},
+    )
 
     def __init__(self, *args, group=None, **kwargs):
         super().__init__(*args, **kwargs)
         if group:
-            self.fields['tags_to_filter_by'].queryset = Tag.objects.filter(group=group).order_by('name')
\ No newline at end of file
+            self.fields['photos'].queryset = Photo.objects.filter(group_tag_associations__group=group)
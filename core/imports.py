@@ -0,0 +1,171 @@
+"""
+Bulk photo imports from a directory tree or a ZIP archive, used by the
+import_photos management command.
+
+Files are processed in batches:
+- a thread pool reads, hashes and validates them (with Pillow);
+- the valid files of the batch go through bulk_upload_photos(), which sends
+  them to storage on the same pool and inserts the Photo and PhotoTag rows
+  in bulk;
+- tags mapped from the files' folder names are then linked in bulk.
+
+Progress is kept in an ImportState file: after every batch, the names of
+its imported (or invalid) files are appended to it, so an interrupted import
+resumes after the last batch and retries the files that failed. Files that
+were stored but not recorded in the state are recognised by their content
+hash and not stored again.
+"""
+import os
+import threading
+import zipfile
+from dataclasses import dataclass
+from io import BytesIO
+from pathlib import Path, PurePosixPath
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image
+
+from .models import normalize_tag_name
+from .renditions import IMAGE_ERRORS
+from .tagging import BULK_ADD, bulk_assign_tags, get_or_create_tag
+from .uploads import UploadResult, bulk_upload_photos, compute_content_hash
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.webp', '.bmp', '.tif', '.tiff'}
+
+
+@dataclass(frozen=True)
+class ImportSource:
+    name: str  # Path relative to the imported directory or archive, with '/' separators
+    size: int
+
+    @property
+    def folders(self):
+        return PurePosixPath(self.name).parent.parts
+
+
+class SourceReader:
+    """Lists and reads the image files of a directory tree or a ZIP archive."""
+    def __init__(self, path):
+        self.path = Path(path)
+        self.is_archive = self.path.is_file()
+        if self.is_archive and not zipfile.is_zipfile(self.path):
+            raise ValueError(f"{self.path} is neither a directory nor a ZIP archive.")
+        self.local = threading.local() # A ZipFile per thread
+
+    def sources(self):
+        """Every image file, sorted by name."""
+        if self.is_archive:
+            with zipfile.ZipFile(self.path) as archive:
+                found = [
+                    ImportSource(info.filename, info.file_size) for info in archive.infolist()
+                    if not info.is_dir() and not info.filename.startswith('__MACOSX/')
+                ]
+        else:
+            found = []
+            for directory, _, filenames in os.walk(self.path):
+                for filename in filenames:
+                    path = Path(directory) / filename
+                    found.append(ImportSource(path.relative_to(self.path).as_posix(), path.stat().st_size))
+        return sorted(
+            (source for source in found if PurePosixPath(source.name).suffix.lower() in IMAGE_EXTENSIONS),
+            key=lambda source: source.name,
+        )
+
+    def read(self, source):
+        if not self.is_archive:
+            return (self.path / source.name).read_bytes()
+        archive = getattr(self.local, 'archive', None)
+        if archive is None:
+            archive = self.local.archive = zipfile.ZipFile(self.path)
+        return archive.read(source.name)
+
+
+class ImportState:
+    """The names of the files already imported, one per line, appended after every batch."""
+    def __init__(self, path):
+        self.path = Path(path)
+
+    def load(self):
+        if not self.path.exists():
+            return set()
+        return set(self.path.read_text(encoding='utf-8').splitlines())
+
+    def record(self, names):
+        with self.path.open('a', encoding='utf-8') as state_file:
+            state_file.writelines(f"{name}\n" for name in names)
+            state_file.flush()
+            os.fsync(state_file.fileno())
+
+    def clear(self):
+        self.path.unlink(missing_ok=True)
+
+
+def prepare_file(reader, source):
+    """Reads, validates and hashes one source: returns ``(image_file, content_hash)``."""
+    data = reader.read(source)
+    with Image.open(BytesIO(data)) as image:
+        image.verify()
+    image_file = SimpleUploadedFile(PurePosixPath(source.name).name, data)
+    return image_file, compute_content_hash(image_file)
+
+
+def folder_tag_names(source, tag_map):
+    """The tag names ``tag_map`` (folder name: tag name or list of names) gives ``source``."""
+    names = []
+    for folder in source.folders:
+        mapped = tag_map.get(folder, [])
+        names.extend([mapped] if isinstance(mapped, str) else mapped)
+    return [name.strip() for name in names if name.strip()]
+
+
+def is_settled(result):
+    """
+    Whether a file is done with: imported, or not a valid image (which has no
+    content hash). Files that failed in storage or the database are retried.
+    """
+    return result.ok or not result.content_hash
+
+
+def import_batch(sources, reader, user, group, tag_map, executor, tags_by_name):
+    """
+    Imports one batch of sources into ``group`` for ``user``. Returns one
+    UploadResult per source, in order. ``tags_by_name`` caches the group's
+    tags across batches.
+    """
+    results = {}
+    prepared = {}
+
+    def prepare(source):
+        try:
+            return source, prepare_file(reader, source), None
+        except (OSError, *IMAGE_ERRORS) as exc:
+            return source, None, f"Not a valid image ({exc.__class__.__name__}: {exc})"
+
+    for source, image_and_hash, error in executor.map(prepare, sources):
+        if error:
+            results[source] = UploadResult(name=source.name, error=error)
+        else:
+            prepared[source] = image_and_hash
+
+    if prepared:
+        uploaded = bulk_upload_photos(
+            [image_file for image_file, _ in prepared.values()], user, [group],
+            content_hashes=[content_hash for _, content_hash in prepared.values()], executor=executor,
+        )
+        results.update(zip(prepared, uploaded))
+
+    # Tags of the photos now in the group, also on resumed files (links are only added once)
+    photo_ids_by_tags = {}
+    for source in prepared:
+        result = results[source]
+        names = folder_tag_names(source, tag_map)
+        if result.ok and names:
+            for name in names:
+                if normalize_tag_name(name) not in tags_by_name:
+                    tags_by_name[normalize_tag_name(name)] = get_or_create_tag(group, name)[0]
+            tag_ids = frozenset(tags_by_name[normalize_tag_name(name)].id for name in names)
+            photo_ids_by_tags.setdefault(tag_ids, []).append(result.photo.id)
+    for tag_ids, photo_ids in photo_ids_by_tags.items():
+        bulk_assign_tags(group, photo_ids, tag_ids, BULK_ADD)
+
+    return [results[source] for source in sources]
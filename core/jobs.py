@@ -0,0 +1,144 @@
+"""
+Database-backed background job queue.
+
+Jobs are rows of core.models.Job, so no broker is needed. The
+``run_worker`` management command claims pending jobs and runs the handler
+registered for their ``kind``. A failed job is retried with exponential
+backoff until it reaches ``max_attempts``.
+"""
+import logging
+from datetime import timedelta
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Group, Job, JobFile
+from .uploads import bulk_upload_photos
+
+logger = logging.getLogger(__name__)
+
+JOB_HANDLERS = {}
+RETRY_BASE_DELAY = timedelta(seconds=30)
+
+
+def register_job(kind):
+    """Registers the decorated function as the handler for jobs of ``kind``."""
+    def decorator(handler):
+        JOB_HANDLERS[kind] = handler
+        return handler
+    return decorator
+
+
+def enqueue_job(kind, payload=None, user=None, **kwargs):
+    if kind not in JOB_HANDLERS:
+        raise ValueError(f"No handler registered for job kind '{kind}'.")
+    return Job.objects.create(kind=kind, payload=payload or {}, created_by=user, **kwargs)
+
+
+def claim_next_job():
+    """
+    Marks the next due pending job as running and returns it, or returns None.
+    The conditional UPDATE makes the claim safe with several workers, on
+    SQLite as well as on PostgreSQL.
+    """
+    now = timezone.now()
+    candidates = Job.objects.filter(status=Job.Status.PENDING, run_after__lte=now).order_by('run_after', 'id')
+    for job_id in candidates.values_list('id', flat=True)[:10]:
+        claimed = Job.objects.filter(id=job_id, status=Job.Status.PENDING).update(
+            status=Job.Status.RUNNING, started_at=now, updated_at=now, attempts=F('attempts') + 1
+        )
+        if claimed:
+            return Job.objects.get(id=job_id)
+    return None
+
+
+def requeue_stale_jobs(stale_after):
+    """Puts back jobs left running by a worker that died more than ``stale_after`` ago."""
+    cutoff = timezone.now() - stale_after
+    return Job.objects.filter(status=Job.Status.RUNNING, started_at__lt=cutoff).update(
+        status=Job.Status.PENDING, run_after=timezone.now()
+    )
+
+
+def run_job(job):
+    handler = JOB_HANDLERS.get(job.kind)
+    try:
+        if handler is None:
+            raise LookupError(f"No handler registered for job kind '{job.kind}'.")
+        result = handler(job)
+    except Exception as exc:
+        logger.exception("Job %s (%s) failed on attempt %d", job.id, job.kind, job.attempts)
+        job.last_error = f"{exc.__class__.__name__}: {exc}"
+        if handler is not None and job.attempts < job.max_attempts:
+            job.status = Job.Status.PENDING
+            job.run_after = timezone.now() + RETRY_BASE_DELAY * 2 ** (job.attempts - 1)
+        else:
+            job.status = Job.Status.FAILED
+            job.finished_at = timezone.now()
+    else:
+        job.status = Job.Status.DONE
+        job.result = result or {}
+        job.finished_at = timezone.now()
+    job.save()
+    return job
+
+
+# Photo uploads
+
+UPLOAD_PHOTOS_JOB = 'upload_photos'
+
+
+def enqueue_photo_upload(user, image_files, groups):
+    """Stores the uploaded bytes in the database and queues their processing."""
+    with transaction.atomic():
+        job = enqueue_job(UPLOAD_PHOTOS_JOB, {'group_ids': [group.id for group in groups]}, user=user)
+        JobFile.objects.bulk_create([
+            JobFile(job=job, name=image_file.name, content_type=image_file.content_type or '', content=image_file.read())
+            for image_file in image_files
+        ])
+    return job
+
+
+class UploadIncomplete(Exception):
+    """Some files of an upload job could not be stored; the job is retried for them."""
+
+
+@register_job(UPLOAD_PHOTOS_JOB)
+def process_photo_upload(job):
+    """
+    Stores the job's files. Stored files leave the queue and are recorded in
+    job.result, and if others failed UploadIncomplete is raised, so that
+    run_job() retries them with backoff. The last attempt reports them as
+    failed, unless no file of the job could be stored at all.
+    """
+    user = job.created_by
+    groups = list(Group.objects.filter(id__in=job.payload.get('group_ids', []), members=user))
+    job_files = list(job.files.all())
+    image_files = [
+        SimpleUploadedFile(job_file.name, bytes(job_file.content), job_file.content_type)
+        for job_file in job_files
+    ]
+    results = bulk_upload_photos(image_files, user, groups)
+    JobFile.objects.filter(pk__in=[job_file.pk for job_file, result in zip(job_files, results) if result.ok]).delete()
+
+    # Files stored by earlier attempts, then this attempt's
+    files = [entry for entry in job.result.get('files', []) if entry['ok']] + [
+        {'name': result.name, 'ok': result.ok, 'error': result.error,
+         'photo_id': result.photo.id if result.ok else None,
+         'duplicate': result.duplicate, 'group_entries': result.group_entries}
+        for result in results
+    ]
+    uploaded = sum(1 for entry in files if entry['ok'])
+    job.result = { # Saved by run_job() even when a retry is raised below
+        'uploaded': uploaded,
+        # Reused photos only get the group links they were missing
+        'group_entries': sum(entry['group_entries'] for entry in files),
+        'files': files,
+    }
+    failed = [result for result in results if not result.ok]
+    if failed and (job.attempts < job.max_attempts or not uploaded):
+        raise UploadIncomplete(f"{len(failed)} of {len(results)} file(s) could not be stored: {failed[0].error}")
+    JobFile.objects.filter(job=job).delete()
+    return job.result
@@ -0,0 +1,95 @@
+import random
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from core.models import Group, Photo, PhotoTag, Tag
+from core.tag_query import all_tags_query, compile_tag_query
+from core.tagging import sync_tag_ids
+
+
+class BenchmarkRollback(Exception):
+    """Raised to roll back everything a benchmark run wrote."""
+
+
+def chained_join_filter(phototags, tags):
+    # The previous GroupDetailView filter: one join per tag, then DISTINCT
+    for tag in tags:
+        phototags = phototags.filter(tags=tag)
+    return phototags.distinct()
+
+
+def compiled_filter(phototags, tags):
+    return phototags.filter(compile_tag_query(all_tags_query(tag.id for tag in tags)))
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares the chained-join tag filter with the compiled filter on "
+        "PhotoTag.tag_ids (core.tag_query) on a synthetic group, for 1 to --max-filter-tags "
+        "ticked tags. Everything written is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--photos', type=int, default=5000)
+        parser.add_argument('--tags', type=int, default=30)
+        parser.add_argument('--tags-per-photo', type=int, default=6)
+        parser.add_argument('--max-filter-tags', type=int, default=6)
+        parser.add_argument('--page-size', type=int, default=24)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                tags = self.create_group(options)
+                phototags = PhotoTag.objects.filter(group=tags[0].group_id).order_by('-photo__uploaded_at', '-photo_id')
+                # The most used tags, so that combinations still match something
+                for count in range(1, options['max_filter_tags'] + 1):
+                    filter_tags = tags[:count]
+                    for label, build in (('chained joins', chained_join_filter), ('compiled', compiled_filter)):
+                        queryset = build(phototags, filter_tags).values_list('id', flat=True)
+                        # The view only fetches one page (plus one row), see core.pagination
+                        page_ms, page_queries, _ = self.measure(queryset[:options['page_size'] + 1], options['repeat'])
+                        all_ms, _, matches = self.measure(queryset, options['repeat'])
+                        self.stdout.write(
+                            f"{count} tag(s) {label:14} first page {page_ms:8.2f} ms ({page_queries} query), "
+                            f"all {matches:6} matches {all_ms:8.2f} ms"
+                        )
+                raise BenchmarkRollback
+        except BenchmarkRollback:
+            pass
+
+    def measure(self, queryset, repeat):
+        """Best time in ms, query count and row count of evaluating ``queryset``."""
+        timings = []
+        for _ in range(repeat):
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                rows = len(list(queryset.all()))
+                timings.append(time.perf_counter() - start)
+        return min(timings) * 1000, len(queries.captured_queries), rows
+
+    def create_group(self, options):
+        rng = random.Random(options['seed'])
+        user = User.objects.create_user(username='__tag_filter_benchmark__')
+        group = Group.objects.create(name="Tag filter benchmark", created_by=user)
+        tags = Tag.objects.bulk_create([
+            Tag(name=f"tag {i}", name_key=f"tag {i}", group=group) for i in range(options['tags'])
+        ])
+        photos = Photo.objects.bulk_create([
+            Photo(image=f"benchmark/photo_{i}", uploaded_by=user) for i in range(options['photos'])
+        ])
+        phototags = PhotoTag.objects.bulk_create([PhotoTag(photo=photo, group=group) for photo in photos])
+        # Skewed towards the first tags, like real vocabularies
+        weights = [1 / (rank + 1) for rank in range(len(tags))]
+        links = []
+        for phototag in phototags:
+            chosen = set(rng.choices(range(len(tags)), weights=weights, k=options['tags_per_photo']))
+            links.extend(PhotoTag.tags.through(phototag_id=phototag.id, tag_id=tags[index].id) for index in chosen)
+        PhotoTag.tags.through.objects.bulk_create(links)
+        sync_tag_ids(phototag.id for phototag in phototags)
+        return tags
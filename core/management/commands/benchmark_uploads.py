@@ -0,0 +1,67 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from core.models import Group, Photo, PhotoTag
+from core.uploads import UploadResult, save_staged_uploads
+
+
+class BenchmarkRollback(Exception):
+    """Raised to roll back everything a benchmark run wrote."""
+
+
+def legacy_upload_loop(staged_images, user, groups):
+    # The pre-batch handleMultipleImagesUpload loop: one INSERT per row, autocommit
+    for staged_image in staged_images:
+        photo_instance = Photo.objects.create(image=staged_image, uploaded_by=user)
+        for group_instance in groups:
+            PhotoTag.objects.create(photo=photo_instance, group=group_instance)
+
+
+def batch_upload(staged_images, user, groups):
+    results = [UploadResult(name=image, staged_image=image) for image in staged_images]
+    save_staged_uploads(results, user, groups)
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares the database cost of the legacy per-row upload loop with the "
+        "bulk, transactional upload path. Storage is excluded: both paths save "
+        "the same placeholder public ids. Everything written is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--photos', type=int, default=200)
+        parser.add_argument('--groups', type=int, default=3)
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        staged_images = [f"benchmark/photo_{i}" for i in range(options['photos'])]
+        for label, upload in (('legacy loop', legacy_upload_loop), ('bulk batch', batch_upload)):
+            timings = []
+            for _ in range(options['repeat']):
+                elapsed, query_count = self.run_once(upload, staged_images, options['groups'])
+                timings.append(elapsed)
+            self.stdout.write(
+                f"{label:12} {options['photos']} photos x {options['groups']} groups: "
+                f"best {min(timings) * 1000:.1f} ms, {query_count} queries"
+            )
+
+    def run_once(self, upload, staged_images, group_count):
+        elapsed = query_count = None
+        try:
+            with transaction.atomic():
+                user = User.objects.create_user(username='__upload_benchmark__')
+                groups = [Group.objects.create(name=f"Benchmark {i}", created_by=user) for i in range(group_count)]
+                with CaptureQueriesContext(connection) as queries:
+                    start = time.perf_counter()
+                    upload(staged_images, user, groups)
+                    elapsed = time.perf_counter() - start
+                query_count = len(queries.captured_queries)
+                raise BenchmarkRollback
+        except BenchmarkRollback:
+            pass
+        return elapsed, query_count
@@ -0,0 +1,210 @@
+import contextlib
+import json
+import math
+import platform
+import statistics
+import subprocess
+import time
+from io import BytesIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from core import uploads
+from core.models import Group, Photo, Tag
+
+
+class BenchmarkRollback(Exception):
+    """Raised to roll back everything a benchmark run wrote."""
+
+
+def percentile(values, percent):
+    """Nearest-rank percentile of ``values`` (a non-empty list)."""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(percent / 100 * len(ordered)) - 1)]
+
+
+def summarize(values, digits=2):
+    return {
+        'min': round(min(values), digits),
+        'p50': round(percentile(values, 50), digits),
+        'p90': round(percentile(values, 90), digits),
+        'p95': round(percentile(values, 95), digits),
+        'p99': round(percentile(values, 99), digits),
+        'max': round(max(values), digits),
+        'mean': round(statistics.fmean(values), digits),
+    }
+
+
+def fake_jpeg(name, seed, size=(640, 480)):
+    """An in-memory JPEG with a per-``seed`` colour, so uploads are not deduplicated."""
+    buffer = BytesIO()
+    Image.new('RGB', size, (seed % 256, seed // 256 % 256, 128)).save(buffer, 'JPEG', quality=80)
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/jpeg')
+
+
+def current_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures latency percentiles, query counts and response sizes of the "
+        "main views (group list, group detail with and without filters, tag "
+        "assignment, upload) through the test client, on existing data such as "
+        "a seed_data dataset. Writes the results as JSON. Everything the run "
+        "writes is rolled back, then the cache is cleared so no fragment of the "
+        "rolled-back state survives. Uploads use a placeholder storage id unless "
+        "--real-storage is given (their renditions still go to the default storage)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--username', default='seed_user_0', help="Member whose groups are requested.")
+        parser.add_argument('--group', type=int, help="Group id (default: the user's group with the most photos).")
+        parser.add_argument('--requests', type=int, default=20, help="Measured requests per scenario.")
+        parser.add_argument('--warmup', type=int, default=2, help="Unmeasured requests per scenario.")
+        parser.add_argument('--upload-batch', type=int, default=3, help="Images per upload request.")
+        parser.add_argument('--cold-cache', action='store_true', help="Clear the cache before every request.")
+        parser.add_argument('--real-storage', action='store_true', help="Send uploads to the configured storage.")
+        parser.add_argument('--label', default='', help="Free-form label stored with the results.")
+        parser.add_argument('--output', help="JSON file to write (default: standard output).")
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1:
+            raise CommandError("--requests must be at least 1.")
+        user = User.objects.filter(username=options['username']).first()
+        if user is None:
+            raise CommandError(f"No user '{options['username']}'; run seed_data first or pass --username.")
+        group = self.get_group(user, options['group'])
+
+        client = Client()
+        client.force_login(user)
+        results = {}
+        progress = self.stdout if options['output'] else self.stderr # Keep stdout for the JSON
+        upload_counter = iter(range(10**9))
+        try:
+            with transaction.atomic(), self.storage_patch(options['real_storage']):
+                for name, send in self.scenarios(group, options, upload_counter):
+                    results[name] = self.measure(client, send, options)
+                    progress.write(
+                        f"{name:28} p50 {results[name]['latency_ms']['p50']:8.2f} ms  "
+                        f"p95 {results[name]['latency_ms']['p95']:8.2f} ms  "
+                        f"{results[name]['queries']['max']:3} queries  "
+                        f"{results[name]['response_bytes']['max']:8} bytes"
+                    )
+                raise BenchmarkRollback
+        except BenchmarkRollback:
+            pass
+        finally:
+            cache.clear()
+
+        report = {
+            'label': options['label'],
+            'commit': current_commit(),
+            'release': settings.RELEASE_VERSION,
+            'created_at': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'cache': settings.CACHES['default']['BACKEND'],
+            'python': platform.python_version(),
+            'options': {key: options[key] for key in ('requests', 'warmup', 'upload_batch', 'cold_cache', 'real_storage')},
+            'dataset': {
+                'users': User.objects.count(),
+                'groups': Group.objects.count(),
+                'photos': Photo.objects.count(),
+                'group_photos': group.photo_tag_associations.count(),
+                'group_tags': group.tags.count(),
+            },
+            'scenarios': results,
+        }
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as output_file:
+                output_file.write(output + '\n')
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+        else:
+            self.stdout.write(output)
+
+    def get_group(self, user, group_id):
+        groups = Group.objects.filter(members=user)
+        if group_id is not None:
+            group = groups.filter(pk=group_id).first()
+            if group is None:
+                raise CommandError(f"{user.username} is not a member of group {group_id}.")
+            return group
+        group = groups.annotate(photos=Count('photo_tag_associations')).order_by('-photos', 'pk').first()
+        if group is None:
+            raise CommandError(f"{user.username} is not a member of any group.")
+        return group
+
+    def storage_patch(self, real_storage):
+        if real_storage:
+            return contextlib.nullcontext()
+        return mock.patch.object(uploads, 'stage_image', lambda image_file: f"benchmark/{image_file.name}")
+
+    def scenarios(self, group, options, upload_counter):
+        """``(name, send)`` pairs; ``send(client)`` issues one request and returns the response."""
+        detail_url = reverse('group_detail', kwargs={'pk': group.pk})
+        tags = list(Tag.objects.filter(group=group).annotate(usage=Count('phototag')).order_by('-usage', 'pk')[:3])
+        phototag = group.photo_tag_associations.order_by('-pk').first()
+
+        yield 'group_list', lambda client: client.get(reverse('group_list'))
+        yield 'group_detail', lambda client: client.get(detail_url)
+        if tags:
+            yield 'group_detail_tag_filter', lambda client: client.get(
+                detail_url, {'tags_to_filter_by': [tag.id for tag in tags[:2]]}
+            )
+            yield 'group_detail_tag_query', lambda client: client.get(
+                detail_url, {'tag_query': ' OR '.join(f'"{tag.name}"' for tag in tags)}
+            )
+        if phototag is not None:
+            assign_url = reverse('assign_photo_tags', kwargs={'group_pk': group.pk, 'photo_pk': phototag.photo_id})
+            yield 'assign_photo_tags', lambda client: client.post(
+                assign_url, {'tags_to_assign': [tag.id for tag in tags[:2]]}, HTTP_HX_REQUEST='true'
+            )
+
+        def upload(client):
+            images = [fake_jpeg(f"benchmark_{n}.jpg", n) for n in
+                      (next(upload_counter) for _ in range(options['upload_batch']))]
+            return client.post(reverse('upload_photo'), {'images': images, 'groups': [group.pk]})
+        yield 'upload_photo', upload
+
+    def measure(self, client, send, options):
+        timings, query_counts, sizes, statuses = [], [], [], {}
+        for run in range(options['warmup'] + options['requests']):
+            if options['cold_cache']:
+                cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                response = send(client)
+                content = b''.join(response) if response.streaming else response.content
+                elapsed = time.perf_counter() - start
+            if run < options['warmup']:
+                continue
+            timings.append(elapsed * 1000)
+            query_counts.append(len(queries.captured_queries))
+            sizes.append(len(content))
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+        return {
+            'requests': options['requests'],
+            'status_codes': {str(code): count for code, count in sorted(statuses.items())},
+            'latency_ms': summarize(timings),
+            'queries': summarize(query_counts, digits=1),
+            'response_bytes': summarize(sizes, digits=0),
+        }
@@ -0,0 +1,174 @@
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.auth.models import User
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from django.urls import reverse
+from django.utils import timezone
+
+from core.models import Group, Tag
+
+from .benchmark_views import current_commit, summarize
+
+# name: gunicorn arguments before --workers/--bind
+PROFILES = {
+    'wsgi': ['tagmi.wsgi'],
+    'asgi': ['-c', 'python:tagmi.gunicorn_asgi', 'tagmi.asgi'],
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-tests the sync (gunicorn, tagmi.wsgi) and ASGI (gunicorn with "
+        "uvicorn workers, tagmi/gunicorn_asgi.py) deployment profiles at equal "
+        "worker counts: starts each on a local port against the current "
+        "database, sends concurrent GET requests to the group pages as a "
+        "logged-in member and reports throughput and latency percentiles as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--username', default='seed_user_0', help="Member whose groups are requested.")
+        parser.add_argument('--group', type=int, help="Group id (default: the user's group with the most photos).")
+        parser.add_argument('--profiles', nargs='+', choices=PROFILES, default=list(PROFILES))
+        parser.add_argument('--workers', type=int, default=2, help="Gunicorn workers of every profile.")
+        parser.add_argument('--concurrency', type=int, default=16, help="Requests in flight at once.")
+        parser.add_argument('--requests', type=int, default=200, help="Measured requests per scenario.")
+        parser.add_argument('--warmup', type=int, default=20, help="Unmeasured requests per scenario.")
+        parser.add_argument('--port', type=int, default=8765, help="Port the servers listen on, one at a time.")
+        parser.add_argument('--startup-timeout', type=float, default=30, help="Seconds to wait for a server.")
+        parser.add_argument('--label', default='', help="Free-form label stored with the results.")
+        parser.add_argument('--output', help="JSON file to write (default: standard output).")
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1 or options['concurrency'] < 1 or options['workers'] < 1:
+            raise CommandError("--requests, --concurrency and --workers must be at least 1.")
+        user = User.objects.filter(username=options['username']).first()
+        if user is None:
+            raise CommandError(f"No user '{options['username']}'; run seed_data first or pass --username.")
+        group = Group.objects.filter(members=user).annotate(
+            photos=Count('photo_tag_associations')
+        ).order_by('-photos', 'pk')
+        group = (group.filter(pk=options['group']) if options['group'] else group).first()
+        if group is None:
+            raise CommandError(f"{user.username} is not a member of the group.")
+
+        session = self.create_session(user)
+        progress = self.stdout if options['output'] else self.stderr # Keep stdout for the JSON
+        results = {}
+        try:
+            for profile in options['profiles']:
+                results[profile] = {}
+                with self.server(profile, options):
+                    base_url = f"http://127.0.0.1:{options['port']}"
+                    for name, path in self.scenarios(group):
+                        results[profile][name] = self.load(base_url + path, session.session_key, options)
+                        progress.write(
+                            f"{profile:5} {name:24} {results[profile][name]['requests_per_second']:8.1f} req/s  "
+                            f"p50 {results[profile][name]['latency_ms']['p50']:8.2f} ms  "
+                            f"p95 {results[profile][name]['latency_ms']['p95']:8.2f} ms"
+                        )
+        finally:
+            session.delete()
+
+        report = {
+            'label': options['label'],
+            'commit': current_commit(),
+            'created_at': timezone.now().isoformat(),
+            'options': {key: options[key] for key in ('workers', 'concurrency', 'requests', 'warmup')},
+            'group_photos': group.photos,
+            'profiles': results,
+        }
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as output_file:
+                output_file.write(output + '\n')
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+        else:
+            self.stdout.write(output)
+
+    def create_session(self, user):
+        """A logged-in session of ``user``, as django.contrib.auth.login() would store it."""
+        session = SessionStore()
+        session[SESSION_KEY] = str(user.pk)
+        session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+        session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        session.create()
+        return session
+
+    def scenarios(self, group):
+        detail_url = reverse('group_detail', kwargs={'pk': group.pk})
+        tags = list(Tag.objects.filter(group=group).annotate(usage=Count('phototag')).order_by('-usage', 'pk')[:2])
+        yield 'group_list', reverse('group_list')
+        yield 'group_detail', detail_url
+        if tags:
+            yield 'group_detail_tag_filter', detail_url + '?' + '&'.join(f'tags_to_filter_by={tag.id}' for tag in tags)
+            yield 'tag_autocomplete', reverse('tag_autocomplete', kwargs={'group_pk': group.pk}) + f'?q={tags[0].name[:2]}'
+
+    def server(self, profile, options):
+        command = [
+            sys.executable, '-m', 'gunicorn', *PROFILES[profile][:-1],
+            '--workers', str(options['workers']), '--bind', f"127.0.0.1:{options['port']}",
+            '--log-level', 'warning', PROFILES[profile][-1],
+        ]
+        return _Server(command, options['port'], options['startup_timeout'])
+
+    def load(self, url, session_key, options):
+        cookies = {settings.SESSION_COOKIE_NAME: session_key}
+
+        def send(_):
+            start = time.perf_counter()
+            response = requests.get(url, cookies=cookies, allow_redirects=False, timeout=60)
+            return (time.perf_counter() - start) * 1000, response.status_code
+
+        with ThreadPoolExecutor(options['concurrency']) as executor:
+            list(executor.map(send, range(options['warmup'])))
+            start = time.perf_counter()
+            outcomes = list(executor.map(send, range(options['requests'])))
+            elapsed = time.perf_counter() - start
+
+        statuses = {}
+        for _, status in outcomes:
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+        return {
+            'requests_per_second': round(len(outcomes) / elapsed, 1),
+            'status_codes': statuses,
+            'latency_ms': summarize([latency for latency, _ in outcomes]),
+        }
+
+
+class _Server:
+    """A gunicorn process, started on enter once it accepts connections and stopped on exit."""
+    def __init__(self, command, port, timeout):
+        self.command, self.port, self.timeout = command, port, timeout
+
+    def __enter__(self):
+        self.process = subprocess.Popen(self.command, cwd=settings.BASE_DIR, env=os.environ.copy())
+        deadline = time.monotonic() + self.timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise CommandError(f"{' '.join(self.command)} exited with status {self.process.returncode}.")
+            try:
+                socket.create_connection(('127.0.0.1', self.port), timeout=1).close()
+                return self
+            except OSError:
+                time.sleep(0.2)
+        self.__exit__()
+        raise CommandError(f"{' '.join(self.command)} did not start within {self.timeout} seconds.")
+
+    def __exit__(self, *exc_info):
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
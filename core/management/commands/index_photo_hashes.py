@@ -0,0 +1,43 @@
+from io import BytesIO
+
+import requests
+from django.core.management.base import BaseCommand, CommandError
+
+from core.caching import bump_group_versions
+from core.downloads import open_photo
+from core.models import Photo, PhotoTag
+from core.similarity import index_phototags, record_perceptual_hashes
+
+
+class Command(BaseCommand):
+    help = (
+        "Computes the perceptual hash of the photos stored without one, from "
+        "their originals, and adds them to the near-duplicate index of their groups."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50, help="Photos downloaded and saved per batch.")
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size must be at least 1.")
+        photos = Photo.objects.filter(perceptual_hash='').order_by('pk')
+        last_pk, hashed_count, failed_count = 0, 0, 0
+        while batch := list(photos.filter(pk__gt=last_pk)[:options['batch_size']]):
+            last_pk = batch[-1].pk
+            sources = []
+            for photo in batch:
+                try:
+                    with open_photo(photo) as chunks:
+                        sources.append((photo, BytesIO(b''.join(chunks))))
+                except (requests.RequestException, OSError) as exc:
+                    self.stderr.write(f"Photo {photo.pk}: {exc}")
+            hashed = record_perceptual_hashes(sources)
+            phototags = PhotoTag.objects.filter(photo__in=hashed)
+            index_phototags(phototags)
+            bump_group_versions(phototags.values_list('group_id', flat=True)) # Cached duplicate clusters
+            hashed_count += len(hashed)
+            failed_count += len(batch) - len(hashed)
+            self.stdout.write(f"{hashed_count} photo(s) hashed, {failed_count} failed")
+
+        self.stdout.write(self.style.SUCCESS(f"Hashed and indexed {hashed_count} photo(s); {failed_count} could not be read."))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.counters import find_counter_drift, recount_group_counters
+
+
+class Command(BaseCommand):
+    help = "Verifies and rebuilds the denormalized member/photo/tag counters on Group."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help="Only report drifted counters; exit with an error if any are found.")
+
+    def handle(self, *args, **options):
+        drifted = find_counter_drift()
+        for group, wrong in drifted:
+            details = ", ".join(f"{field} {stored} != {actual}" for field, (stored, actual) in wrong.items())
+            self.stdout.write(f"Group {group.pk} '{group.name}': {details}")
+
+        if options['check']:
+            if drifted:
+                raise CommandError(f"{len(drifted)} group(s) have drifted counters.")
+            self.stdout.write(self.style.SUCCESS("All group counters are correct."))
+            return
+
+        updated = recount_group_counters()
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt counters for {updated} group(s); {len(drifted)} had drifted."
+        ))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.suggestions import find_cooccurrence_drift, rebuild_tag_cooccurrence
+
+
+class Command(BaseCommand):
+    help = "Verifies and rebuilds the tag co-occurrence counters behind tag suggestions from PhotoTag.tag_ids."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help="Only report drifted groups; exit with an error if any are found.")
+
+    def handle(self, *args, **options):
+        drifted = find_cooccurrence_drift()
+        for group_id in drifted:
+            self.stdout.write(f"Group {group_id}: tag co-occurrence counters differ from a recount")
+
+        if options['check']:
+            if drifted:
+                raise CommandError(f"{len(drifted)} group(s) have drifted tag co-occurrence counters.")
+            self.stdout.write(self.style.SUCCESS("All tag co-occurrence counters are correct."))
+            return
+
+        if drifted:
+            rebuild_tag_cooccurrence(drifted)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt tag co-occurrence counters for {len(drifted)} drifted group(s)."))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.tagging import find_tag_id_drift, sync_tag_ids
+
+
+class Command(BaseCommand):
+    help = "Verifies and rebuilds the denormalized PhotoTag.tag_ids from the PhotoTag.tags through table."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help="Only report drifted rows; exit with an error if any are found.")
+
+    def handle(self, *args, **options):
+        drifted = find_tag_id_drift()
+        for phototag_id, stored, actual in drifted:
+            self.stdout.write(f"PhotoTag {phototag_id}: stored {stored} != actual {actual}")
+
+        if options['check']:
+            if drifted:
+                raise CommandError(f"{len(drifted)} photo association(s) have drifted tag ids.")
+            self.stdout.write(self.style.SUCCESS("All tag id sets are correct."))
+            return
+
+        sync_tag_ids(phototag_id for phototag_id, _, _ in drifted)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt tag ids for {len(drifted)} drifted photo association(s)."))
@@ -0,0 +1,34 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from core.jobs import claim_next_job, requeue_stale_jobs, run_job
+
+
+class Command(BaseCommand):
+    help = "Runs queued background jobs (photo uploads, ...) from the database job queue."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Run every due job, then exit.")
+        parser.add_argument('--sleep', type=float, default=2.0, help="Seconds to wait when the queue is empty.")
+        parser.add_argument('--stale-after', type=int, default=600,
+                            help="Requeue jobs left running for this many seconds by a dead worker.")
+
+    def handle(self, *args, **options):
+        stale_after = timedelta(seconds=options['stale_after'])
+        try:
+            while True:
+                requeued = requeue_stale_jobs(stale_after)
+                if requeued:
+                    self.stdout.write(f"Requeued {requeued} stale job(s).")
+                job = claim_next_job()
+                if job is None:
+                    if options['once']:
+                        return
+                    time.sleep(options['sleep'])
+                    continue
+                job = run_job(job)
+                self.stdout.write(f"{job}: attempt {job.attempts}")
+        except KeyboardInterrupt:
+            self.stdout.write("Worker stopped.")
@@ -0,0 +1,111 @@
+import random
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from core.counters import recount_group_counters
+from core.models import Group, Photo, PhotoTag, Tag
+from core.tagging import sync_tag_ids
+
+BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = (
+        "Seeds a synthetic dataset (users, groups, tags, photos and tag "
+        "assignments) with bulk inserts, to reproduce production volumes "
+        "locally. Photos get placeholder image ids; nothing is sent to storage. "
+        "Every user's password is --password."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20)
+        parser.add_argument('--groups', type=int, default=10)
+        parser.add_argument('--members-per-group', type=int, default=8)
+        parser.add_argument('--photos', type=int, default=5000)
+        parser.add_argument('--groups-per-photo', type=int, default=2)
+        parser.add_argument('--tags-per-group', type=int, default=40)
+        parser.add_argument('--tags-per-photo', type=int, default=4)
+        parser.add_argument('--prefix', default='seed', help="Prefix of the seeded usernames and group names.")
+        parser.add_argument('--password', default='seed-password')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--clear', action='store_true',
+                            help="Delete the users and groups of a previous run with the same --prefix first.")
+
+    def handle(self, *args, **options):
+        prefix = options['prefix']
+        if options['users'] < 1 or options['groups'] < 1:
+            raise CommandError("--users and --groups must be at least 1.")
+        with transaction.atomic():
+            if options['clear']:
+                self.clear(prefix)
+            elif User.objects.filter(username__startswith=f"{prefix}_user_").exists():
+                raise CommandError(f"Users prefixed '{prefix}_user_' already exist; use --clear or another --prefix.")
+            self.seed(options)
+
+    def clear(self, prefix):
+        Group.objects.filter(name__startswith=f"{prefix} group ").delete()
+        # Cascades to their photos and, through them, the group assignments
+        User.objects.filter(username__startswith=f"{prefix}_user_").delete()
+
+    def seed(self, options):
+        rng = random.Random(options['seed'])
+        prefix = options['prefix']
+        password = make_password(options['password']) # Hashed once, shared by every user
+
+        users = User.objects.bulk_create([
+            User(username=f"{prefix}_user_{i}", email=f"{prefix}_user_{i}@example.com", password=password)
+            for i in range(options['users'])
+        ], batch_size=BATCH_SIZE)
+        groups = Group.objects.bulk_create([
+            Group(name=f"{prefix} group {i}", created_by=users[i % len(users)]) for i in range(options['groups'])
+        ], batch_size=BATCH_SIZE)
+
+        members_by_group = {}
+        memberships = []
+        for index, group in enumerate(groups):
+            others = [user for user in users if user != group.created_by]
+            members = [group.created_by, *rng.sample(others, min(len(others), options['members_per_group'] - 1))]
+            members_by_group[group.id] = members
+            memberships.extend(Group.members.through(group_id=group.id, user_id=user.id) for user in members)
+        Group.members.through.objects.bulk_create(memberships, batch_size=BATCH_SIZE)
+
+        tags_by_group = {}
+        for group in groups:
+            tags_by_group[group.id] = [
+                Tag(name=f"tag {i}", name_key=f"tag {i}", group=group) for i in range(options['tags_per_group'])
+            ]
+        Tag.objects.bulk_create([tag for tags in tags_by_group.values() for tag in tags], batch_size=BATCH_SIZE)
+
+        # Each photo is uploaded by a member of its first group
+        photo_groups = [rng.sample(groups, min(len(groups), options['groups_per_photo'])) for _ in range(options['photos'])]
+        photos = Photo.objects.bulk_create([
+            Photo(image=f"{prefix}/photo_{i}", uploaded_by=rng.choice(members_by_group[chosen[0].id]))
+            for i, chosen in enumerate(photo_groups)
+        ], batch_size=BATCH_SIZE)
+        phototags = PhotoTag.objects.bulk_create([
+            PhotoTag(photo=photo, group=group) for photo, chosen in zip(photos, photo_groups) for group in chosen
+        ], batch_size=BATCH_SIZE)
+
+        # Skewed towards the first tags of each group, like real vocabularies
+        weights = [1 / (rank + 1) for rank in range(options['tags_per_group'])]
+        links = []
+        for phototag in phototags:
+            tags = tags_by_group[phototag.group_id]
+            if not tags:
+                continue
+            chosen = set(rng.choices(range(len(tags)), weights=weights, k=options['tags_per_photo']))
+            links.extend(PhotoTag.tags.through(phototag_id=phototag.id, tag_id=tags[index].id) for index in chosen)
+        PhotoTag.tags.through.objects.bulk_create(links, batch_size=BATCH_SIZE)
+
+        # bulk_create sends no signals: fill in the denormalized columns
+        sync_tag_ids(phototag.id for phototag in phototags)
+        recount_group_counters([group.id for group in groups])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {len(users)} users, {len(groups)} groups, {len(photos)} photos, "
+            f"{len(phototags)} group assignments and {len(links)} tag assignments "
+            f"(log in as {users[0].username})."
+        ))
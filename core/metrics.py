@@ -0,0 +1,269 @@
+"""
+Process-safe application metrics, served in the Prometheus text format by
+the staff-only ``/metrics`` view.
+
+Each process (e.g. each gunicorn worker) accumulates its counters and
+histograms in memory, and a daemon thread writes them at most once per
+FLUSH_INTERVAL to its own JSON file in settings.METRICS_DIR, replacing the
+previous one atomically. ``/metrics`` sums the files of every process, so
+the figures cover all workers without an external service. When a worker
+starts, the files of exited workers are folded into AGGREGATE_FILE and
+deleted (see merge_exited_workers()): their totals stay part of the
+counters, and the directory does not grow with every worker restart.
+
+Record with inc() and observe(), or storage_timer() around storage calls.
+MetricsMiddleware records the per-request figures.
+"""
+import atexit
+import contextlib
+import fcntl
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+
+from django.conf import settings
+
+FLUSH_INTERVAL = 1.0 # Seconds
+
+AGGREGATE_FILE = 'exited-workers.json'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+
+# name: (type, help, histogram buckets)
+METRICS = {
+    'tagmi_http_requests_total': ('counter', "HTTP requests by URL name, method and status.", None),
+    'tagmi_http_request_duration_seconds': ('histogram', "Request latency by URL name.", LATENCY_BUCKETS),
+    'tagmi_http_request_bytes_total': ('counter', "Request body bytes by URL name.", None),
+    'tagmi_http_response_bytes_total': ('counter', "Response body bytes by URL name.", None),
+    'tagmi_db_queries_per_request': ('histogram', "SQL statements per request by URL name.", QUERY_COUNT_BUCKETS),
+    'tagmi_uploads_total': ('counter', "Uploaded files by outcome (created, reused, failed).", None),
+    'tagmi_upload_bytes_total': ('counter', "Bytes of uploaded files.", None),
+    'tagmi_storage_call_duration_seconds': ('histogram', "Storage call latency by operation.", LATENCY_BUCKETS),
+    'tagmi_fragment_cache_lookups_total': ('counter', "Fragment cache lookups by layer and outcome (hits, misses).", None),
+}
+
+
+class MetricsRegistry:
+    """The metrics of the current process."""
+    def __init__(self, directory=None):
+        # The start time keeps a recycled pid from overwriting an exited worker's totals
+        self.path = Path(directory or settings.METRICS_DIR) / f"{os.getpid()}-{time.time_ns()}.json"
+        self.lock = threading.Lock()
+        self.counters = defaultdict(float) # (name, labels): value
+        self.histograms = {} # (name, labels): [per-bucket counts..., +Inf count, sum]
+        self.dirty = False
+
+    def inc(self, name, labels, value=1):
+        with self.lock:
+            self.counters[name, labels] += value
+            self.dirty = True
+
+    def observe(self, name, labels, value):
+        buckets = METRICS[name][2]
+        with self.lock:
+            series = self.histograms.setdefault((name, labels), [0] * (len(buckets) + 2))
+            index = next((i for i, bound in enumerate(buckets) if value <= bound), len(buckets))
+            series[index] += 1
+            series[-1] += value
+            self.dirty = True
+
+    def snapshot(self):
+        with self.lock:
+            self.dirty = False
+            return {
+                'counters': [[name, list(labels), value] for (name, labels), value in self.counters.items()],
+                'histograms': [[name, list(labels), list(series)] for (name, labels), series in self.histograms.items()],
+            }
+
+    def flush(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temporary = self.path.with_suffix('.tmp')
+        temporary.write_text(json.dumps(self.snapshot()))
+        os.replace(temporary, self.path)
+
+
+_registry = None
+_registry_pid = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    """This process's registry; a forked worker starts a fresh one with its own flush thread."""
+    global _registry, _registry_pid
+    if _registry_pid != os.getpid():
+        with _registry_lock:
+            if _registry_pid != os.getpid():
+                _registry, _registry_pid = MetricsRegistry(), os.getpid()
+                try:
+                    merge_exited_workers()
+                except OSError:
+                    pass # Merged when the next worker starts
+                threading.Thread(target=_flush_loop, args=(_registry,), daemon=True).start()
+                atexit.register(_flush_if_dirty, _registry)
+    return _registry
+
+
+def _flush_if_dirty(registry):
+    if registry.dirty:
+        try:
+            registry.flush()
+        except OSError:
+            pass # Retried on the next flush; metrics must never break a request or an exit
+
+
+def _flush_loop(registry):
+    while True:
+        time.sleep(FLUSH_INTERVAL)
+        _flush_if_dirty(registry)
+
+
+def _labels(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def inc(name, value=1, **labels):
+    get_registry().inc(name, _labels(labels), value)
+
+
+def observe(name, value, **labels):
+    get_registry().observe(name, _labels(labels), value)
+
+
+@contextlib.contextmanager
+def storage_timer(operation):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe('tagmi_storage_call_duration_seconds', time.perf_counter() - start, operation=operation)
+
+
+def _add(counters, histograms, data):
+    for name, labels, value in data['counters']:
+        counters[name, tuple(map(tuple, labels))] += value
+    for name, labels, series in data['histograms']:
+        key = (name, tuple(map(tuple, labels)))
+        if key in histograms:
+            histograms[key] = [a + b for a, b in zip(histograms[key], series)]
+        else:
+            histograms[key] = list(series)
+
+
+def _read_files(directory):
+    """``{file name: data}`` of the metric files in ``directory``."""
+    files = {}
+    for path in Path(directory).glob('*.json'):
+        try:
+            files[path.name] = json.loads(path.read_text())
+        except (OSError, ValueError):
+            continue # Replaced or removed while reading
+    return files
+
+
+def _is_running(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass # Another user's process
+    return True
+
+
+@contextlib.contextmanager
+def _files_lock(directory, operation):
+    """Holds the directory's lock: LOCK_EX to merge files, LOCK_SH to read them."""
+    directory.mkdir(parents=True, exist_ok=True)
+    with open(directory / 'merge.lock', 'a') as lock_file:
+        fcntl.flock(lock_file, operation)
+        yield
+
+
+def merge_exited_workers(directory=None):
+    """
+    Adds the figures of the worker files whose process has exited to
+    AGGREGATE_FILE and deletes them. The aggregate lists the files it last
+    absorbed, so a merge interrupted before the deletions does not count them
+    twice. collect() reads under a shared lock, never halfway through a merge.
+    """
+    directory = Path(directory or settings.METRICS_DIR)
+    with _files_lock(directory, fcntl.LOCK_EX): # Workers starting together, and readers
+        files = _read_files(directory)
+        aggregate = files.pop(AGGREGATE_FILE, {'counters': [], 'histograms': [], 'merged': []})
+        exited = [
+            name for name in files
+            if name.partition('-')[0].isdigit() and not _is_running(int(name.partition('-')[0]))
+        ]
+        if not exited:
+            return []
+        counters, histograms = defaultdict(float), {}
+        _add(counters, histograms, aggregate)
+        for name in exited:
+            if name not in aggregate['merged']:
+                _add(counters, histograms, files[name])
+        temporary = directory / f"{AGGREGATE_FILE}.tmp"
+        temporary.write_text(json.dumps({
+            'counters': [[name, list(labels), value] for (name, labels), value in counters.items()],
+            'histograms': [[name, list(labels), series] for (name, labels), series in histograms.items()],
+            'merged': exited,
+        }))
+        os.replace(temporary, directory / AGGREGATE_FILE)
+        for name in exited:
+            (directory / name).unlink(missing_ok=True)
+    return exited
+
+
+def collect():
+    """Sums the metric files of every process; returns ``(counters, histograms)`` dicts."""
+    get_registry().flush() # Include this process's latest figures
+    counters = defaultdict(float)
+    histograms = {}
+    with _files_lock(Path(settings.METRICS_DIR), fcntl.LOCK_SH): # Not halfway through a merge
+        files = _read_files(settings.METRICS_DIR)
+    merged = files.get(AGGREGATE_FILE, {}).get('merged', [])
+    for name, data in files.items():
+        if name not in merged: # Already in the aggregate: left by an interrupted merge
+            _add(counters, histograms, data)
+    return counters, histograms
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels, **extra):
+    pairs = [*labels, *extra.items()]
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(str(value))}"' for key, value in pairs) + '}'
+
+
+def _format_number(value):
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def render_prometheus():
+    counters, histograms = collect()
+    lines = []
+    for name, (metric_type, help_text, buckets) in METRICS.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {metric_type}")
+        if metric_type == 'counter':
+            for (series_name, labels), value in sorted(counters.items()):
+                if series_name == name:
+                    lines.append(f"{name}{_format_labels(labels)} {_format_number(value)}")
+            continue
+        for (series_name, labels), series in sorted(histograms.items()):
+            if series_name != name:
+                continue
+            cumulative = 0
+            for bound, count in zip((*buckets, '+Inf'), series[:-1]):
+                cumulative += count
+                lines.append(f"{name}_bucket{_format_labels(labels, le=bound)} {_format_number(cumulative)}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {_format_number(series[-1])}")
+            lines.append(f"{name}_count{_format_labels(labels)} {_format_number(cumulative)}")
+    return '\n'.join(lines) + '\n'
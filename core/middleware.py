@@ -0,0 +1,186 @@
+import contextlib
+import json
+import logging
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connection
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+from . import metrics
+from .profiling import PROFILE_HEADER, RequestProfile, install_template_timer
+from .query_budgets import QueryBudgetExceeded, QueryRecorder, get_query_budget
+
+logger = logging.getLogger(__name__)
+
+
+class WatchingMiddleware:
+    """
+    Base for the middleware below, which run unchanged under WSGI and ASGI
+    (so the async views of core.async_views stay on the event loop).
+    watch(request) is held around the rest of the chain and yields a state
+    that finish() receives with the response.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with self.watch(request) as state:
+            response = self.get_response(request)
+        return self.finish(request, response, state)
+
+    async def __acall__(self, request):
+        # The (async) ORM runs queries on the request's thread-sensitive thread,
+        # whose connection is the one execute_wrapper() has to be installed on
+        watch = contextlib.ExitStack()
+        state = await sync_to_async(watch.enter_context)(self.watch(request))
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(watch.close)()
+        return await self.afinish(request, response, state)
+
+    def watch(self, request):
+        raise NotImplementedError
+
+    def finish(self, request, response, state):
+        return response
+
+    async def afinish(self, request, response, state):
+        return self.finish(request, response, state)
+
+
+class AsyncWhiteNoiseMiddleware(WhiteNoiseMiddleware):
+    """
+    WhiteNoise, which is sync-only, made usable in an async middleware chain.
+    A sync-only middleware would make Django run every request of the ASGI
+    profile in a thread, async views included.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, settings=settings):
+        super().__init__(get_response, settings)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = self.find_file(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return self.serve(static_file, request)
+        return await self.get_response(request)
+
+
+class QueryBudgetMiddleware(WatchingMiddleware):
+    """Checks every request against the query budget of its view (see core.query_budgets)."""
+    @contextlib.contextmanager
+    def watch(self, request):
+        recorder = QueryRecorder()
+        with connection.execute_wrapper(recorder):
+            yield recorder
+
+    def finish(self, request, response, recorder):
+        resolver_match = getattr(request, 'resolver_match', None)
+        budget = get_query_budget(resolver_match) if resolver_match is not None else None
+        if budget is not None and len(recorder.statements) > budget:
+            report = recorder.report(resolver_match.view_name, budget)
+            if getattr(settings, 'QUERY_BUDGET_STRICT', False):
+                raise QueryBudgetExceeded(report)
+            logger.warning(report)
+        return response
+
+
+class ProfilingMiddleware(WatchingMiddleware):
+    """
+    Adds a Server-Timing header to the responses of staff requests that carry
+    X-Tagmi-Profile (see core.profiling), and with PROFILING_LOG also logs the
+    profile as a JSON line. Requests without the header skip profiling.
+    """
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        install_template_timer()
+
+    def watch(self, request):
+        if PROFILE_HEADER not in request.META:
+            return contextlib.nullcontext()
+        request.profile = RequestProfile()
+        return request.profile.activate()
+
+    # Checked afterwards: request.user only exists once the auth middleware ran
+    def finish(self, request, response, profile):
+        user = getattr(request, 'user', None)
+        if profile is not None and user is not None and user.is_staff:
+            self.report(request, response, profile)
+        return response
+
+    async def afinish(self, request, response, profile):
+        if profile is not None and hasattr(request, 'auser') and (await request.auser()).is_staff:
+            self.report(request, response, profile)
+        return response
+
+    def report(self, request, response, profile):
+        response['Server-Timing'] = profile.server_timing()
+        if settings.PROFILING_LOG:
+            resolver_match = getattr(request, 'resolver_match', None)
+            logger.info(json.dumps({
+                'path': request.path,
+                'view': resolver_match.view_name if resolver_match else None,
+                'status': response.status_code,
+                **profile.as_dict(),
+            }))
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        profile = getattr(request, 'profile', None)
+        if profile is not None:
+            profile.mark_view_start()
+
+
+class MetricsMiddleware(WatchingMiddleware):
+    """Records latency, sizes, status and query count of every request (see core.metrics)."""
+    @contextlib.contextmanager
+    def watch(self, request):
+        state = {'queries': 0, 'start': time.perf_counter()}
+
+        def count_query(execute, sql, params, many, context):
+            state['queries'] += 1
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(count_query):
+            yield state
+
+    def finish(self, request, response, state):
+        elapsed = time.perf_counter() - state['start']
+        resolver_match = getattr(request, 'resolver_match', None)
+        # URL names, not paths, keep the number of series bounded
+        view = resolver_match.view_name if resolver_match else 'unresolved'
+        try:
+            request_bytes = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            request_bytes = 0
+        if response.streaming:
+            response_bytes = int(response.get('Content-Length') or 0)
+        else:
+            response_bytes = len(response.content)
+
+        metrics.inc('tagmi_http_requests_total', view=view, method=request.method, status=response.status_code)
+        metrics.observe('tagmi_http_request_duration_seconds', elapsed, view=view)
+        metrics.observe('tagmi_db_queries_per_request', state['queries'], view=view)
+        metrics.inc('tagmi_http_request_bytes_total', request_bytes, view=view)
+        metrics.inc('tagmi_http_response_bytes_total', response_bytes, view=view)
+        return response
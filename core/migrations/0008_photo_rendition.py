@@ -0,0 +1,31 @@
+# Generated by Django 5.2 on 2026-10-18 16:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_job_queue'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PhotoRendition',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('format', models.CharField(choices=[('webp', 'WebP'), ('jpeg', 'JPEG')], max_length=4, verbose_name='format')),
+                ('size', models.PositiveIntegerField(verbose_name='bounding box size')),
+                ('width', models.PositiveIntegerField(verbose_name='width')),
+                ('height', models.PositiveIntegerField(verbose_name='height')),
+                ('file', models.FileField(upload_to='renditions/%Y/%m/%d/', verbose_name='file')),
+                ('photo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='renditions', to='core.photo', verbose_name='photo')),
+            ],
+            options={
+                'verbose_name': 'photo rendition',
+                'verbose_name_plural': 'photo renditions',
+                'unique_together': {('photo', 'format', 'size')},
+            },
+        ),
+    ]
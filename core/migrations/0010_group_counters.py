@@ -0,0 +1,47 @@
+# Generated by Django 5.2 on 2026-10-18 16:12
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def populate_group_counters(apps, schema_editor):
+    Group = apps.get_model('core', 'Group')
+    PhotoTag = apps.get_model('core', 'PhotoTag')
+    Tag = apps.get_model('core', 'Tag')
+
+    def count_of(queryset):
+        counts = queryset.filter(group_id=OuterRef('pk')).order_by().values('group_id').annotate(n=Count('*')).values('n')
+        return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+    Group.objects.update(
+        member_count=count_of(Group.members.through.objects.all()),
+        photo_count=count_of(PhotoTag.objects.all()),
+        tag_count=count_of(Tag.objects.all()),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_photo_content_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='group',
+            name='member_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='member count'),
+        ),
+        migrations.AddField(
+            model_name='group',
+            name='photo_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='photo count'),
+        ),
+        migrations.AddField(
+            model_name='group',
+            name='tag_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='tag count'),
+        ),
+        migrations.RunPython(populate_group_counters, migrations.RunPython.noop),
+    ]
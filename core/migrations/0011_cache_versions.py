@@ -0,0 +1,23 @@
+# Generated by Django 5.2 on 2026-10-18 16:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_group_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='group',
+            name='cache_version',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='cache version'),
+        ),
+        migrations.AddField(
+            model_name='phototag',
+            name='cache_version',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='cache version'),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.2 on 2026-10-18 16:40
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def populate_name_keys(apps, schema_editor):
+    """
+    Fills Tag.name_key and merges tags of a group whose names only differed
+    by case or spacing (into the oldest one), as the new constraint forbids them.
+    """
+    Tag = apps.get_model('core', 'Tag')
+    Group = apps.get_model('core', 'Group')
+    TagLink = apps.get_model('core', 'PhotoTag').tags.through
+
+    keepers = {}
+    merged_group_ids = set()
+    for tag in Tag.objects.order_by('id'):
+        key = ' '.join(tag.name.split()).casefold()
+        keeper = keepers.setdefault((tag.group_id, key), tag)
+        if keeper is tag:
+            Tag.objects.filter(pk=tag.pk).update(name_key=key)
+            continue
+        linked = set(TagLink.objects.filter(tag_id=keeper.pk).values_list('phototag_id', flat=True))
+        TagLink.objects.bulk_create([
+            TagLink(phototag_id=phototag_id, tag_id=keeper.pk)
+            for phototag_id in TagLink.objects.filter(tag_id=tag.pk).values_list('phototag_id', flat=True)
+            if phototag_id not in linked
+        ])
+        tag.delete()
+        merged_group_ids.add(tag.group_id)
+
+    for group_id in merged_group_ids:
+        Group.objects.filter(pk=group_id).update(
+            tag_count=Tag.objects.filter(group_id=group_id).count(),
+            cache_version=F('cache_version') + 1,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_cache_versions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tag',
+            name='name_key',
+            field=models.CharField(default='', editable=False, max_length=50, verbose_name='normalized name'),
+            preserve_default=False,
+        ),
+        migrations.RunPython(populate_name_keys, migrations.RunPython.noop),
+    ]
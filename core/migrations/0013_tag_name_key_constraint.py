@@ -0,0 +1,23 @@
+# Generated by Django 5.2 on 2026-10-18 16:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Separate from 0012 so PostgreSQL does not alter core_tag in the
+    # transaction that merged duplicate tags (pending trigger events)
+
+    dependencies = [
+        ('core', '0012_tag_name_key'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='tag',
+            constraint=models.UniqueConstraint(fields=('group', 'name_key'), name='tag_group_name_key_uniq'),
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(fields=['group', 'name_key'], name='tag_group_name_key_prefix_idx', opclasses=['int8_ops', 'varchar_pattern_ops']),
+        ),
+    ]
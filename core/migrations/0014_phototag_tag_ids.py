@@ -0,0 +1,45 @@
+# Generated by Django 5.2 on 2026-10-18 16:31
+
+from collections import defaultdict
+
+import core.fields
+from django.db import migrations
+
+
+def populate_tag_ids(apps, schema_editor):
+    PhotoTag = apps.get_model('core', 'PhotoTag')
+    tag_ids = defaultdict(list)
+    for phototag_id, tag_id in PhotoTag.tags.through.objects.values_list('phototag_id', 'tag_id'):
+        tag_ids[phototag_id].append(tag_id)
+    PhotoTag.objects.bulk_update(
+        [PhotoTag(pk=phototag_id, tag_ids=ids) for phototag_id, ids in tag_ids.items()],
+        ['tag_ids'], batch_size=500,
+    )
+
+
+def create_gin_index(apps, schema_editor):
+    # Containment (@>) lookups use a GIN index; other databases scan the group's rows
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('CREATE INDEX phototag_tag_ids_gin ON core_phototag USING gin (tag_ids)')
+
+
+def drop_gin_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS phototag_tag_ids_gin')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_tag_name_key_constraint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='phototag',
+            name='tag_ids',
+            field=core.fields.TagIdSetField(blank=True, default=list, editable=False, verbose_name='tag ids'),
+        ),
+        migrations.RunPython(populate_tag_ids, migrations.RunPython.noop),
+        migrations.RunPython(create_gin_index, drop_gin_index),
+    ]
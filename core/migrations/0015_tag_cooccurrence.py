@@ -0,0 +1,70 @@
+# Generated by Django 5.2 on 2026-10-18 17:11
+
+from collections import Counter
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def count_tags(apps, schema_editor):
+    PhotoTag = apps.get_model('core', 'PhotoTag')
+    TagCooccurrence = apps.get_model('core', 'TagCooccurrence')
+    UploaderTagCount = apps.get_model('core', 'UploaderTagCount')
+    pair_counts, uploader_counts = Counter(), Counter()
+    rows = PhotoTag.objects.exclude(tag_ids=[]).values_list('group_id', 'photo__uploaded_by_id', 'tag_ids')
+    for group_id, uploader_id, tag_ids in rows.iterator(chunk_size=500):
+        for tag_id in tag_ids:
+            uploader_counts[group_id, uploader_id, tag_id] += 1
+            for other_id in tag_ids:
+                pair_counts[group_id, tag_id, other_id] += 1
+    TagCooccurrence.objects.bulk_create([
+        TagCooccurrence(group_id=group_id, tag_id=tag_id, other_id=other_id, count=count)
+        for (group_id, tag_id, other_id), count in pair_counts.items()
+    ], batch_size=500)
+    UploaderTagCount.objects.bulk_create([
+        UploaderTagCount(group_id=group_id, user_id=user_id, tag_id=tag_id, count=count)
+        for (group_id, user_id, tag_id), count in uploader_counts.items()
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_phototag_tag_ids'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TagCooccurrence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.IntegerField(default=0, verbose_name='count')),
+                ('group', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.group', verbose_name='group')),
+                ('other', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.tag', verbose_name='other tag')),
+                ('tag', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.tag', verbose_name='tag')),
+            ],
+            options={
+                'verbose_name': 'tag co-occurrence',
+                'verbose_name_plural': 'tag co-occurrences',
+                'constraints': [models.UniqueConstraint(fields=('tag', 'other'), name='tag_cooccurrence_uniq')],
+            },
+        ),
+        migrations.CreateModel(
+            name='UploaderTagCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.IntegerField(default=0, verbose_name='count')),
+                ('group', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.group', verbose_name='group')),
+                ('tag', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.tag', verbose_name='tag')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='uploader')),
+            ],
+            options={
+                'verbose_name': 'uploader tag count',
+                'verbose_name_plural': 'uploader tag counts',
+                'constraints': [models.UniqueConstraint(fields=('user', 'tag'), name='uploader_tag_count_uniq')],
+            },
+        ),
+        migrations.RunPython(count_tags, migrations.RunPython.noop),
+    ]
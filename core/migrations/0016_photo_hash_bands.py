@@ -0,0 +1,35 @@
+# Generated by Django 5.2 on 2026-10-18 17:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_tag_cooccurrence'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='photo',
+            name='perceptual_hash',
+            field=models.CharField(blank=True, max_length=16, verbose_name='perceptual hash'),
+        ),
+        migrations.CreateModel(
+            name='PhotoHashBand',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('band', models.PositiveSmallIntegerField(verbose_name='band')),
+                ('value', models.IntegerField(verbose_name='value')),
+                ('group', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.group', verbose_name='group')),
+                ('phototag', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='hash_bands', to='core.phototag', verbose_name='photo-group assignment')),
+            ],
+            options={
+                'verbose_name': 'photo hash band',
+                'verbose_name_plural': 'photo hash bands',
+                'indexes': [models.Index(fields=['group', 'band', 'value'], name='photo_hash_band_lookup_idx')],
+                'constraints': [models.UniqueConstraint(fields=('phototag', 'band'), name='photo_hash_band_uniq')],
+            },
+        ),
+    ]
@@ -1,8 +1,12 @@
 from django.contrib.auth.models import User
 from django.db import models
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from cloudinary.models import CloudinaryField
 
+from .fields import TagIdSetField
+from .profiling import timed
+
 class Group(models.Model):
     name = models.CharField(_("group name"), max_length=255)
     members = models.ManyToManyField(
@@ -17,6 +21,14 @@ class Group(models.Model):
         null=True,
         related_name="created_photo_groups"
     )
+    # Denormalized counters, kept up to date by core.signals and rebuilt by
+    # the rebuild_group_counters management command.
+    member_count = models.PositiveIntegerField(_("member count"), default=0, editable=False)
+    photo_count = models.PositiveIntegerField(_("photo count"), default=0, editable=False)
+    tag_count = models.PositiveIntegerField(_("tag count"), default=0, editable=False)
+    # Bumped whenever the group's photos, tags, assignments or members change
+    # (see core.caching); cached fragments of the group are keyed on it.
+    cache_version = models.PositiveIntegerField(_("cache version"), default=0, editable=False)
 
     def __str__(self):
         return self.name
@@ -36,17 +48,87 @@ class Photo(models.Model):
         related_name="uploaded_photos"
     )
     uploaded_at = models.DateTimeField(_("upload time"), auto_now_add=True)
+    # SHA-256 of the uploaded bytes, used to reuse a photo its uploader sends again
+    content_hash = models.CharField(_("content hash"), max_length=64, blank=True)
+    # 64-bit dHash of the image as hex, close for visually similar photos (see core.similarity)
+    perceptual_hash = models.CharField(_("perceptual hash"), max_length=16, blank=True)
 
     def __str__(self):
         return f"Photo by {self.uploaded_by.username} on {self.uploaded_at.strftime('%Y-%m-%d')}"
 
+    # Renditions are read through renditions.all() so that a
+    # prefetch_related('renditions') covers every card of a page.
+    def rendition_srcset(self, image_format):
+        renditions = [r for r in self.renditions.all() if r.format == image_format]
+        with timed('storage'):
+            return ", ".join(f"{r.file.url} {r.width}w" for r in sorted(renditions, key=lambda r: r.width))
+
+    @property
+    def webp_srcset(self):
+        return self.rendition_srcset(PhotoRendition.Format.WEBP)
+
+    @property
+    def jpeg_srcset(self):
+        return self.rendition_srcset(PhotoRendition.Format.JPEG)
+
+    @property
+    def thumbnail_url(self):
+        """Smallest JPEG rendition, falling back to the original image."""
+        jpegs = [r for r in self.renditions.all() if r.format == PhotoRendition.Format.JPEG]
+        with timed('storage'):
+            if jpegs:
+                return min(jpegs, key=lambda r: r.width).file.url
+            return self.image.url if self.image else ''
+
     class Meta:
         verbose_name = _("photo")
         verbose_name_plural = _("photos")
         ordering = ['-uploaded_at']
+        indexes = [
+            # Keyset pagination cursor for group photo grids (see core.pagination)
+            models.Index(fields=['-uploaded_at', '-id'], name='photo_uploaded_at_id_idx'),
+            models.Index(fields=['uploaded_by', 'content_hash'], name='photo_uploader_hash_idx'),
+        ]
+
+class PhotoRendition(models.Model):
+    """
+    A resized copy of a Photo generated at upload time (see core.renditions),
+    kept in the default file storage (MEDIA_ROOT locally).
+    """
+    class Format(models.TextChoices):
+        WEBP = 'webp', "WebP"
+        JPEG = 'jpeg', "JPEG"
+
+    photo = models.ForeignKey(
+        Photo,
+        verbose_name=_("photo"),
+        on_delete=models.CASCADE,
+        related_name='renditions'
+    )
+    format = models.CharField(_("format"), max_length=4, choices=Format.choices)
+    size = models.PositiveIntegerField(_("bounding box size"))
+    width = models.PositiveIntegerField(_("width"))
+    height = models.PositiveIntegerField(_("height"))
+    file = models.FileField(_("file"), upload_to='renditions/%Y/%m/%d/')
+
+    class Meta:
+        unique_together = ('photo', 'format', 'size')
+        verbose_name = _("photo rendition")
+        verbose_name_plural = _("photo renditions")
+
+    def __str__(self):
+        return f"{self.get_format_display()} {self.width}x{self.height} of photo {self.photo_id}"
+
+def normalize_tag_name(name):
+    """Case- and whitespace-insensitive form of a tag name, stored in Tag.name_key."""
+    return ' '.join(name.split()).casefold()
+
 
 class Tag(models.Model):
     name = models.CharField(_("tag name"), max_length=50)
+    # normalize_tag_name(name), kept in sync by save(); duplicate checks and
+    # autocomplete prefix lookups are index lookups on it
+    name_key = models.CharField(_("normalized name"), max_length=50, editable=False)
     group = models.ForeignKey(
         Group,
         verbose_name=_("group"),
@@ -56,6 +138,14 @@ class Tag(models.Model):
 
     class Meta:
         unique_together = ('name', 'group') # Ensures tag names are unique within a group
+        constraints = [
+            models.UniqueConstraint(fields=['group', 'name_key'], name='tag_group_name_key_uniq'),
+        ]
+        indexes = [
+            # LIKE 'prefix%' on PostgreSQL needs the pattern operator class
+            models.Index(fields=['group', 'name_key'], name='tag_group_name_key_prefix_idx',
+                         opclasses=['int8_ops', 'varchar_pattern_ops']),
+        ]
         verbose_name = _("tag")
         verbose_name_plural = _("tags")
         ordering = ['name']
@@ -63,6 +153,13 @@ class Tag(models.Model):
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        self.name_key = normalize_tag_name(self.name)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'name' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'name_key'}
+        super().save(*args, **kwargs)
+
 class PhotoTag(models.Model):
     """
     Links a Photo to a Group and assigns specific Tags to that photo
@@ -85,6 +182,11 @@ class PhotoTag(models.Model):
         verbose_name=_("tags"),
         blank=True # A photo can be in a group without specific tags initially
     )
+    # Denormalized copy of the ids in ``tags`` (kept in sync by core.signals
+    # and core.tagging), so tag filters are an indexed containment check
+    tag_ids = TagIdSetField(_("tag ids"), editable=False)
+    # Bumped whenever this photo's card changes (see core.caching)
+    cache_version = models.PositiveIntegerField(_("cache version"), default=0, editable=False)
 
     class Meta:
         unique_together = ('photo', 'group') # A photo can only be associated with a group once
@@ -92,4 +194,126 @@ class PhotoTag(models.Model):
         verbose_name_plural = _("photo-group tag assignments")
 
     def __str__(self):
-        return f"Photo {self.photo.id} in Group '{self.group.name}'"
\ No newline at end of file
+        return f"Photo {self.photo.id} in Group '{self.group.name}'"
+
+class PhotoHashBand(models.Model):
+    """
+    One 16-bit band of the perceptual hash of a photo in a group. The bands of
+    a group form a multi-index hash table of its photos (see core.similarity);
+    they are added when a photo with a hash joins the group and go with its
+    PhotoTag.
+    """
+    phototag = models.ForeignKey(PhotoTag, verbose_name=_("photo-group assignment"), on_delete=models.CASCADE, related_name='hash_bands')
+    group = models.ForeignKey(Group, verbose_name=_("group"), on_delete=models.CASCADE, related_name='+')
+    band = models.PositiveSmallIntegerField(_("band"))
+    value = models.IntegerField(_("value"))
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['phototag', 'band'], name='photo_hash_band_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['group', 'band', 'value'], name='photo_hash_band_lookup_idx'),
+        ]
+        verbose_name = _("photo hash band")
+        verbose_name_plural = _("photo hash bands")
+
+class TagCooccurrence(models.Model):
+    """
+    One cell of a group's tag co-occurrence matrix: the number of the group's
+    photos carrying both ``tag`` and ``other`` (both directions are stored;
+    ``tag == other`` counts the photos carrying ``tag``). Maintained
+    incrementally by core.suggestions.
+    """
+    group = models.ForeignKey(Group, verbose_name=_("group"), on_delete=models.CASCADE, related_name='+')
+    tag = models.ForeignKey(Tag, verbose_name=_("tag"), on_delete=models.CASCADE, related_name='+')
+    other = models.ForeignKey(Tag, verbose_name=_("other tag"), on_delete=models.CASCADE, related_name='+')
+    count = models.IntegerField(_("count"), default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['tag', 'other'], name='tag_cooccurrence_uniq'),
+        ]
+        verbose_name = _("tag co-occurrence")
+        verbose_name_plural = _("tag co-occurrences")
+
+class UploaderTagCount(models.Model):
+    """The number of ``user``'s photos in the tag's group carrying ``tag`` (see core.suggestions)."""
+    group = models.ForeignKey(Group, verbose_name=_("group"), on_delete=models.CASCADE, related_name='+')
+    user = models.ForeignKey(User, verbose_name=_("uploader"), on_delete=models.CASCADE, related_name='+')
+    tag = models.ForeignKey(Tag, verbose_name=_("tag"), on_delete=models.CASCADE, related_name='+')
+    count = models.IntegerField(_("count"), default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'tag'], name='uploader_tag_count_uniq'),
+        ]
+        verbose_name = _("uploader tag count")
+        verbose_name_plural = _("uploader tag counts")
+
+class Job(models.Model):
+    """
+    A unit of background work, queued in the database and run by the
+    ``run_worker`` management command (see core.jobs).
+    """
+    class Status(models.TextChoices):
+        PENDING = 'pending', _("pending")
+        RUNNING = 'running', _("running")
+        DONE = 'done', _("done")
+        FAILED = 'failed', _("failed")
+
+    kind = models.CharField(_("kind"), max_length=50)
+    status = models.CharField(_("status"), max_length=10, choices=Status.choices, default=Status.PENDING)
+    payload = models.JSONField(_("payload"), default=dict, blank=True)
+    result = models.JSONField(_("result"), default=dict, blank=True)
+    attempts = models.PositiveIntegerField(_("attempts"), default=0)
+    max_attempts = models.PositiveIntegerField(_("max attempts"), default=3)
+    last_error = models.TextField(_("last error"), blank=True)
+    created_by = models.ForeignKey(
+        User,
+        verbose_name=_("created by"),
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name="jobs"
+    )
+    created_at = models.DateTimeField(_("created at"), auto_now_add=True)
+    updated_at = models.DateTimeField(_("updated at"), auto_now=True)
+    run_after = models.DateTimeField(_("run after"), default=timezone.now)
+    started_at = models.DateTimeField(_("started at"), null=True, blank=True)
+    finished_at = models.DateTimeField(_("finished at"), null=True, blank=True)
+
+    class Meta:
+        verbose_name = _("job")
+        verbose_name_plural = _("jobs")
+        ordering = ['-created_at']
+        indexes = [
+            # Worker polling: next pending job that is due
+            models.Index(fields=['status', 'run_after'], name='job_status_run_after_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} job {self.id} ({self.status})"
+
+    @property
+    def is_finished(self):
+        return self.status in (self.Status.DONE, self.Status.FAILED)
+
+
+class JobFile(models.Model):
+    """Uploaded file bytes held in the database until a Job processes them."""
+    job = models.ForeignKey(
+        Job,
+        verbose_name=_("job"),
+        on_delete=models.CASCADE,
+        related_name='files'
+    )
+    name = models.CharField(_("file name"), max_length=255)
+    content_type = models.CharField(_("content type"), max_length=100, blank=True)
+    content = models.BinaryField(_("content"))
+
+    class Meta:
+        verbose_name = _("job file")
+        verbose_name_plural = _("job files")
+
+    def __str__(self):
+        return self.name
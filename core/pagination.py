@@ -0,0 +1,55 @@
+"""
+Keyset (cursor) pagination for the group photo grid.
+
+Pages are ordered newest first on the photo's ``(uploaded_at, id)`` pair and
+the cursor is that pair for the last card of the previous page, so fetching
+any page is a range scan on the index instead of an ever-growing OFFSET.
+"""
+import base64
+import binascii
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+PHOTO_GRID_ORDERING = ('-photo__uploaded_at', '-photo_id')
+
+
+def encode_cursor(uploaded_at, photo_id):
+    raw = f"{uploaded_at.isoformat()}|{photo_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(value):
+    """Returns the ``(uploaded_at, photo_id)`` pair, or None if the cursor is malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(value + '=' * (-len(value) % 4)).decode()
+        stamp, photo_id = raw.rsplit('|', 1)
+        uploaded_at = parse_datetime(stamp)
+        photo_id = int(photo_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+    if uploaded_at is None:
+        return None
+    return uploaded_at, photo_id
+
+
+def paginate_photo_associations(queryset, cursor=None, page_size=24):
+    """
+    Returns one page of PhotoTag rows and the cursor of the next page
+    (None on the last page). ``cursor`` is a decoded cursor or None for
+    the first page.
+    """
+    queryset = queryset.order_by(*PHOTO_GRID_ORDERING)
+    if cursor:
+        uploaded_at, photo_id = cursor
+        queryset = queryset.filter(
+            Q(photo__uploaded_at__lt=uploaded_at) |
+            Q(photo__uploaded_at=uploaded_at, photo_id__lt=photo_id)
+        )
+    # One extra row tells us whether there is a next page without a COUNT query
+    rows = list(queryset[:page_size + 1])
+    if len(rows) <= page_size:
+        return rows, None
+    rows = rows[:page_size]
+    last_photo = rows[-1].photo
+    return rows, encode_cursor(last_photo.uploaded_at, last_photo.id)
@@ -0,0 +1,128 @@
+"""
+Per-request profiles, reported as a ``Server-Timing`` header.
+
+core.middleware.ProfilingMiddleware profiles a request when a staff user
+sends the PROFILE_HEADER header (``X-Tagmi-Profile: 1``), so it can stay
+installed in production. Other requests do none of the bookkeeping below.
+
+While a profile is active (see RequestProfile.activate), it collects:
+- ``db``: SQL statements and their time, through connection.execute_wrapper;
+- ``tpl``: time in Template.render, outermost renders only (install_template_timer);
+- ``storage``: time building storage URLs (the timed() blocks in core.models);
+- ``cache``: fragment cache hits and misses per layer (core.caching.record_cache_stats).
+"""
+import contextlib
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+
+from django.db import connection
+from django.template import base as template_base
+
+PROFILE_HEADER = 'HTTP_X_TAGMI_PROFILE'
+
+_current_profile = ContextVar('tagmi_request_profile', default=None)
+
+
+class RequestProfile:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.view_started = None
+        self.finished = None
+        self.durations = defaultdict(float, db=0.0) # Seconds per timing name
+        self.query_count = 0
+        self.cache = defaultdict(lambda: {'hits': 0, 'misses': 0})
+        self.template_depth = 0
+
+    @contextlib.contextmanager
+    def activate(self):
+        # Not reset with a token: under ASGI this is entered and exited from
+        # two different sync_to_async() contexts
+        previous = _current_profile.get()
+        _current_profile.set(self)
+        try:
+            with connection.execute_wrapper(self.time_query):
+                yield self
+        finally:
+            _current_profile.set(previous)
+            self.finished = time.perf_counter()
+
+    def mark_view_start(self):
+        self.view_started = time.perf_counter()
+
+    def time_query(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.durations['db'] += time.perf_counter() - start
+            self.query_count += 1
+
+    def as_dict(self):
+        """Durations in milliseconds, with the query count and cache outcomes."""
+        total = (self.finished or time.perf_counter()) - self.started
+        timings = {name: seconds * 1000 for name, seconds in self.durations.items()}
+        if self.view_started is not None:
+            timings['mw'] = (self.view_started - self.started) * 1000
+            timings['view'] = total * 1000 - timings['mw']
+        timings['total'] = total * 1000
+        return {
+            'timings_ms': {name: round(ms, 2) for name, ms in timings.items()},
+            'queries': self.query_count,
+            'cache': {layer: dict(outcomes) for layer, outcomes in self.cache.items()},
+        }
+
+    def server_timing(self):
+        data = self.as_dict()
+        entries = []
+        for name, ms in data['timings_ms'].items():
+            description = f'{data["queries"]} queries' if name == 'db' else None
+            entries.append(f'{name};dur={ms}' + (f';desc="{description}"' if description else ''))
+        for layer, outcomes in data['cache'].items():
+            entries.append(f'cache-{layer};desc="{outcomes["hits"]} hits {outcomes["misses"]} misses"')
+        return ', '.join(entries)
+
+
+@contextlib.contextmanager
+def timed(name):
+    """Adds the time spent in the block to ``name`` in the active profile, if any."""
+    profile = _current_profile.get()
+    if profile is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.durations[name] += time.perf_counter() - start
+
+
+def record_cache(layer, hits, misses):
+    profile = _current_profile.get()
+    if profile is not None:
+        profile.cache[layer]['hits'] += hits
+        profile.cache[layer]['misses'] += misses
+
+
+def install_template_timer():
+    """Wraps Template.render (once) so active profiles get the ``tpl`` timing."""
+    render = template_base.Template.render
+    if getattr(render, 'profiled', False):
+        return
+
+    def profiled_render(self, context):
+        profile = _current_profile.get()
+        if profile is None:
+            return render(self, context)
+        # {% include %} renders nested templates; only time the outermost one
+        profile.template_depth += 1
+        start = time.perf_counter()
+        try:
+            return render(self, context)
+        finally:
+            profile.template_depth -= 1
+            if not profile.template_depth:
+                profile.durations['tpl'] += time.perf_counter() - start
+
+    profiled_render.profiled = True
+    template_base.Template.render = profiled_render
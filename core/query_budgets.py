@@ -0,0 +1,55 @@
+"""
+Query budgets: the most SQL statements one request to a view may run.
+
+Views declare theirs with @query_budget(n) (on the function or the class of
+a class-based view); ModelAdmins set ``changelist_query_budget`` for their
+changelist. core.middleware.QueryBudgetMiddleware counts the statements of
+every request and, over budget, logs them with repeated statements grouped,
+which is how an N+1 shows up. With QUERY_BUDGET_STRICT (on in the tests) it
+raises QueryBudgetExceeded instead, so a regression fails the suite.
+"""
+from collections import Counter
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def query_budget(max_queries):
+    """Declares the most queries one request to the decorated view may run."""
+    def decorator(view):
+        view.query_budget = max_queries
+        return view
+    return decorator
+
+
+def get_query_budget(resolver_match):
+    """The budget of the view ``resolver_match`` points to, or None."""
+    func = resolver_match.func
+    for owner in (func, getattr(func, 'view_class', None)):
+        budget = getattr(owner, 'query_budget', None)
+        if budget is not None:
+            return budget
+    model_admin = getattr(func, 'model_admin', None) # Set on the views of ModelAdmin.get_urls()
+    if model_admin is not None and resolver_match.url_name.endswith('_changelist'):
+        return getattr(model_admin, 'changelist_query_budget', None)
+    return None
+
+
+class QueryRecorder:
+    """A connection.execute_wrapper() that keeps the SQL of every statement run."""
+    def __init__(self):
+        self.statements = []
+
+    def __call__(self, execute, sql, params, many, context):
+        self.statements.append(sql)
+        return execute(sql, params, many, context)
+
+    def duplicates(self):
+        """``[(count, sql)]`` of the statements run more than once, most repeated first."""
+        return [(count, sql) for sql, count in Counter(self.statements).most_common() if count > 1]
+
+    def report(self, view_name, budget, limit=5):
+        lines = [f"{view_name} ran {len(self.statements)} queries (budget {budget})"]
+        lines.extend(f"  {count}x {sql}" for count, sql in self.duplicates()[:limit])
+        return "\n".join(lines)
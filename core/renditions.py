@@ -0,0 +1,86 @@
+"""
+Thumbnail renditions for photo cards and the admin.
+
+When a photo is uploaded, Pillow resizes it into every size in
+RENDITION_SIZES, in both WebP and JPEG. The files go to the default file
+storage: MEDIA_ROOT when DEBUG is on, the configured media storage
+otherwise. Templates then serve them through ``srcset`` instead of the
+full-resolution original.
+"""
+import logging
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+from .caching import bump_card_versions
+from .metrics import storage_timer
+from .models import PhotoRendition, PhotoTag
+
+logger = logging.getLogger(__name__)
+
+# Bounding boxes in pixels; 400 fits a card of the 3-column grid, 800 its 2x density.
+RENDITION_SIZES = (400, 800)
+
+RENDITION_ENCODERS = {
+    PhotoRendition.Format.WEBP: ('WEBP', 'webp', {'quality': 80, 'method': 4}),
+    PhotoRendition.Format.JPEG: ('JPEG', 'jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+# Pillow raises SyntaxError for some truncated or corrupt files
+IMAGE_ERRORS = (OSError, SyntaxError, ValueError, Image.DecompressionBombError)
+
+
+def _flatten(image):
+    """Returns an RGB copy of ``image``, compositing any transparency on white."""
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def build_renditions(photo, source_file):
+    """
+    Returns unsaved PhotoRendition instances (files already written to
+    storage) for ``photo``, or an empty list if the source cannot be decoded.
+    """
+    if hasattr(source_file, 'seekable') and source_file.seekable():
+        source_file.seek(0)
+    try:
+        with Image.open(source_file) as source:
+            source = _flatten(ImageOps.exif_transpose(source))
+    except IMAGE_ERRORS:
+        logger.warning("Could not generate renditions for photo %s", photo.id, exc_info=True)
+        return []
+
+    renditions = []
+    for size in RENDITION_SIZES:
+        resized = source.copy()
+        resized.thumbnail((size, size), Image.Resampling.LANCZOS)
+        for image_format, (pil_format, extension, save_options) in RENDITION_ENCODERS.items():
+            buffer = BytesIO()
+            resized.save(buffer, pil_format, **save_options)
+            rendition = PhotoRendition(
+                photo=photo, format=image_format, size=size,
+                width=resized.width, height=resized.height
+            )
+            with storage_timer('rendition'):
+                rendition.file.save(f"photo_{photo.id}_{size}.{extension}", ContentFile(buffer.getvalue()), save=False)
+            renditions.append(rendition)
+    return renditions
+
+
+def create_renditions(photos_and_sources):
+    """
+    Generates and records renditions for ``(photo, source_file)`` pairs with a
+    single bulk insert. Photos whose source cannot be decoded are skipped.
+    """
+    renditions = []
+    for photo, source_file in photos_and_sources:
+        renditions.extend(build_renditions(photo, source_file))
+    renditions = PhotoRendition.objects.bulk_create(renditions)
+    if renditions: # Cards cached before the renditions existed still point at the original
+        bump_card_versions(PhotoTag.objects.filter(photo_id__in={rendition.photo_id for rendition in renditions}))
+    return renditions
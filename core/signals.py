@@ -0,0 +1,147 @@
+from django.contrib.auth.models import User
+from django.db.models import F
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .caching import bump_card_versions, bump_group_versions
+from .counters import adjust_group_counter, recount_group_counters
+from .similarity import index_phototags
+from .suggestions import record_tag_changes
+from .tagging import sync_tag_ids
+from .models import Group, PhotoTag, Tag
+
+
+@receiver(m2m_changed, sender=Group.members.through)
+def update_member_count(sender, instance, action, reverse, pk_set, **kwargs):
+    # post_remove's pk_set may name users who were not members, so recount
+    # rather than trusting its size.
+    if action not in ('post_add', 'post_remove', 'post_clear', 'pre_clear'):
+        return
+    if not reverse:
+        if action != 'pre_clear':
+            recount_group_counters([instance.pk], fields=['member_count'])
+            bump_group_versions([instance.pk])
+        return
+    # user.photo_groups.<action>(...): instance is the user, pk_set holds group ids
+    if action == 'pre_clear':
+        instance._cleared_group_ids = list(instance.photo_groups.values_list('pk', flat=True))
+        return
+    group_ids = instance.__dict__.pop('_cleared_group_ids', []) if action == 'post_clear' else pk_set
+    if group_ids:
+        recount_group_counters(group_ids, fields=['member_count'])
+        bump_group_versions(group_ids)
+
+
+@receiver([post_save, post_delete], sender=Group.members.through)
+def update_member_count_for_membership_row(sender, instance, **kwargs):
+    # Membership rows saved or deleted one by one (e.g. the admin MemberInline)
+    recount_group_counters([instance.group_id], fields=['member_count'])
+    bump_group_versions([instance.group_id])
+
+
+@receiver(post_save, sender=PhotoTag)
+def increment_photo_count(sender, instance, created, **kwargs):
+    if created:
+        adjust_group_counter(instance.group_id, 'photo_count', 1)
+
+
+@receiver(post_delete, sender=PhotoTag)
+def decrement_photo_count(sender, instance, **kwargs):
+    adjust_group_counter(instance.group_id, 'photo_count', -1)
+
+
+@receiver(post_save, sender=Tag)
+def increment_tag_count(sender, instance, created, **kwargs):
+    if created:
+        adjust_group_counter(instance.group_id, 'tag_count', 1)
+
+
+@receiver(post_delete, sender=Tag)
+def decrement_tag_count(sender, instance, **kwargs):
+    adjust_group_counter(instance.group_id, 'tag_count', -1)
+
+
+@receiver(pre_delete, sender=User)
+def remember_groups_of_deleted_user(sender, instance, **kwargs):
+    # Deleting a user drops its membership rows without an m2m_changed signal
+    instance._member_group_ids = list(instance.photo_groups.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=User)
+def update_member_count_after_user_delete(sender, instance, **kwargs):
+    group_ids = instance.__dict__.pop('_member_group_ids', None)
+    if group_ids:
+        recount_group_counters(group_ids, fields=['member_count'])
+        bump_group_versions(group_ids)
+
+
+# Cache versions (see core.caching)
+
+@receiver(m2m_changed, sender=PhotoTag.tags.through)
+def sync_phototag_on_tag_assignment(sender, instance, action, reverse, pk_set, **kwargs):
+    # Keeps PhotoTag.tag_ids in step with the through table and bumps cache versions
+    if action not in ('post_add', 'post_remove', 'post_clear', 'pre_clear'):
+        return
+    if not reverse:
+        if action != 'pre_clear':
+            sync_tag_ids([instance.pk])
+            PhotoTag.objects.filter(pk=instance.pk).update(cache_version=F('cache_version') + 1)
+            bump_group_versions([instance.group_id])
+        return
+    # tag.phototag_set.<action>(...): instance is the tag, pk_set holds PhotoTag ids
+    if action == 'pre_clear':
+        instance._cleared_phototag_ids = list(instance.phototag_set.values_list('pk', flat=True))
+        return
+    phototag_ids = instance.__dict__.pop('_cleared_phototag_ids', []) if action == 'post_clear' else pk_set
+    if phototag_ids:
+        sync_tag_ids(phototag_ids)
+        bump_card_versions(PhotoTag.objects.filter(pk__in=phototag_ids))
+
+
+@receiver([post_save, post_delete], sender=PhotoTag)
+def bump_group_version_for_photo(sender, instance, **kwargs):
+    if kwargs.get('created', True):
+        bump_group_versions([instance.group_id])
+
+
+@receiver(pre_delete, sender=PhotoTag)
+def remember_deleted_phototag_tags(sender, instance, **kwargs):
+    # Read from the row: sync_tag_ids() updates tag_ids without refreshing loaded instances
+    instance._stored_tags = PhotoTag.objects.filter(pk=instance.pk).values_list(
+        'photo__uploaded_by_id', 'tag_ids').first()
+
+
+@receiver(post_delete, sender=PhotoTag)
+def subtract_deleted_phototag_tags(sender, instance, **kwargs):
+    # Tag co-occurrence counters (core.suggestions); the through rows go without an m2m_changed signal
+    stored = instance.__dict__.pop('_stored_tags', None)
+    if stored and stored[1]:
+        record_tag_changes([(instance.group_id, *stored, ())])
+
+
+@receiver(post_save, sender=PhotoTag)
+def index_photo_hash_in_group(sender, instance, created, **kwargs):
+    # Near-duplicate index (core.similarity); bulk-created links are indexed by core.uploads
+    if created:
+        index_phototags(PhotoTag.objects.filter(pk=instance.pk))
+
+
+@receiver(post_save, sender=Tag)
+def bump_versions_on_tag_save(sender, instance, created, **kwargs):
+    if not created: # A rename shows on every card carrying the tag
+        bump_card_versions(PhotoTag.objects.filter(tags=instance))
+    bump_group_versions([instance.group_id])
+
+
+@receiver(pre_delete, sender=Tag)
+def bump_versions_on_tag_delete(sender, instance, **kwargs):
+    # Before the delete cascades, while the cards carrying the tag can still be found
+    instance._phototag_ids = list(PhotoTag.objects.filter(tags=instance).values_list('pk', flat=True))
+    bump_card_versions(PhotoTag.objects.filter(pk__in=instance._phototag_ids))
+    bump_group_versions([instance.group_id])
+
+
+@receiver(post_delete, sender=Tag)
+def sync_tag_ids_after_tag_delete(sender, instance, **kwargs):
+    # The cascade removed the through rows without an m2m_changed signal
+    sync_tag_ids(instance.__dict__.pop('_phototag_ids', []))
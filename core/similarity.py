@@ -0,0 +1,185 @@
+"""
+Near-duplicate detection from perceptual hashes.
+
+Every photo gets a 64-bit dHash when it is uploaded (or later, by the
+index_photo_hashes command): the image is shrunk to 9x8 grayscale pixels and
+each bit records whether a pixel is brighter than its right neighbour.
+Re-encoded, resized or slightly edited copies, and most burst shots, end up
+a few bits apart, so "similar" means a small Hamming distance.
+
+To find those without comparing a photo with every other one in its group,
+each group keeps a multi-index hash table in PhotoHashBand: the hash is cut
+into BANDS bands of 16 bits, indexed by (group, band, value). Two hashes at
+most ``d`` bits apart differ by at most ``d // BANDS`` bits in one of their
+bands (pigeonhole), so a lookup only probes, in each band, the values that
+close to the photo's own, and checks the exact distance of the few matches.
+Bands are written when a photo with a hash joins a group and cascade away
+with its PhotoTag, so the index follows uploads and removals.
+"""
+import itertools
+import logging
+from collections import defaultdict
+
+from django.core.cache import cache
+from django.db.models import Q
+from PIL import Image, ImageOps
+
+from .models import Photo, PhotoHashBand, PhotoTag
+from .renditions import IMAGE_ERRORS
+
+logger = logging.getLogger(__name__)
+
+HASH_WIDTH = 8 # Pixel comparisons per row and rows: 64 bits
+BANDS = 4
+BAND_BITS = 16
+BAND_MASK = (1 << BAND_BITS) - 1
+
+# Hamming distances: 7 probes 1 bit around each band; MAX_DISTANCE (2 bits) bounds a query's IN lists
+SIMILAR_DISTANCE = 7
+MAX_DISTANCE = 11
+
+CLUSTERS_TIMEOUT = 60 * 60
+
+
+def dhash(image):
+    """The 64-bit difference hash of a PIL image."""
+    pixels = list(image.convert('L').resize((HASH_WIDTH + 1, HASH_WIDTH), Image.Resampling.LANCZOS).getdata())
+    value = 0
+    for row in range(HASH_WIDTH):
+        for column in range(HASH_WIDTH):
+            left = pixels[row * (HASH_WIDTH + 1) + column]
+            value = (value << 1) | (left > pixels[row * (HASH_WIDTH + 1) + column + 1])
+    return value
+
+
+def compute_perceptual_hash(source_file):
+    """The dHash of an image file as 16 hex digits, or '' if it cannot be decoded."""
+    if hasattr(source_file, 'seekable') and source_file.seekable():
+        source_file.seek(0)
+    try:
+        with Image.open(source_file) as image:
+            image.draft('L', (HASH_WIDTH * 8, HASH_WIDTH * 8)) # JPEG: decode at a fraction of the size
+            return f"{dhash(ImageOps.exif_transpose(image)):016x}"
+    except IMAGE_ERRORS:
+        logger.warning("Could not compute the perceptual hash of %s", getattr(source_file, 'name', source_file), exc_info=True)
+        return ''
+
+
+def hash_distance(hash_a, hash_b):
+    return (int(hash_a, 16) ^ int(hash_b, 16)).bit_count()
+
+
+def hash_bands(perceptual_hash):
+    value = int(perceptual_hash, 16)
+    return [(value >> (BAND_BITS * band)) & BAND_MASK for band in range(BANDS)]
+
+
+def band_probes(band_value, radius):
+    """Every band value at most ``radius`` bits from ``band_value``."""
+    probes = [band_value]
+    for bits in range(1, radius + 1):
+        for positions in itertools.combinations(range(BAND_BITS), bits):
+            flipped = band_value
+            for position in positions:
+                flipped ^= 1 << position
+            probes.append(flipped)
+    return probes
+
+
+def probe_radius(max_distance):
+    return max_distance // BANDS
+
+
+# Index maintenance
+
+def record_perceptual_hashes(photos_and_sources):
+    """Computes and saves the hash of ``(photo, source_file)`` pairs, with a single bulk update."""
+    hashed = []
+    for photo, source_file in photos_and_sources:
+        photo.perceptual_hash = compute_perceptual_hash(source_file)
+        if photo.perceptual_hash:
+            hashed.append(photo)
+    Photo.objects.bulk_update(hashed, ['perceptual_hash'], batch_size=500)
+    return hashed
+
+
+def index_phototags(phototags):
+    """Adds the hash bands of the ``phototags`` queryset rows whose photo has a hash (existing ones are kept)."""
+    rows = phototags.exclude(photo__perceptual_hash='').values_list('pk', 'group_id', 'photo__perceptual_hash')
+    PhotoHashBand.objects.bulk_create([
+        PhotoHashBand(phototag_id=phototag_id, group_id=group_id, band=band, value=value)
+        for phototag_id, group_id, perceptual_hash in rows
+        for band, value in enumerate(hash_bands(perceptual_hash))
+    ], ignore_conflicts=True, batch_size=500)
+
+
+# Lookups
+
+def similar_photos(phototag, max_distance=SIMILAR_DISTANCE):
+    """
+    ``[(phototag, distance)]`` of the other photos of the group at most
+    ``max_distance`` bits from ``phototag``'s photo, closest first.
+    """
+    perceptual_hash = phototag.photo.perceptual_hash
+    if not perceptual_hash:
+        return []
+    radius = probe_radius(max_distance)
+    match = Q.create([
+        Q(band=band, value__in=band_probes(value, radius)) for band, value in enumerate(hash_bands(perceptual_hash))
+    ], connector=Q.OR)
+    candidates = (
+        PhotoHashBand.objects.filter(match, group_id=phototag.group_id).exclude(phototag_id=phototag.pk)
+        .values_list('phototag_id', 'phototag__photo__perceptual_hash').distinct()
+    )
+    distances = {
+        other_id: distance for other_id, other_hash in candidates
+        if (distance := hash_distance(perceptual_hash, other_hash)) <= max_distance
+    }
+    matches = PhotoTag.objects.filter(pk__in=distances).select_related('photo__uploaded_by').prefetch_related('photo__renditions')
+    return sorted(((match, distances[match.pk]) for match in matches), key=lambda pair: (pair[1], pair[0].pk))
+
+
+def duplicate_cluster_ids(group, max_distance=SIMILAR_DISTANCE):
+    """
+    The group's clusters of similar photos, as lists of PhotoTag ids: photos
+    are linked to those at most ``max_distance`` bits away, and clusters are
+    the connected sets of two or more. The group's hashes are read once and
+    every photo's neighbours are found through an in-memory multi-index
+    table. Cached per Group.cache_version.
+    """
+    key = f"duplicate-clusters:{group.id}:{group.cache_version}:{max_distance}"
+    clusters = cache.get(key)
+    if clusters is not None:
+        return clusters
+
+    hashes = dict(
+        PhotoTag.objects.filter(group=group).exclude(photo__perceptual_hash='')
+        .order_by('photo__uploaded_at', 'pk').values_list('pk', 'photo__perceptual_hash')
+    )
+    tables = [defaultdict(list) for _ in range(BANDS)]
+    for phototag_id, perceptual_hash in hashes.items():
+        for band, value in enumerate(hash_bands(perceptual_hash)):
+            tables[band][value].append(phototag_id)
+
+    parents = {phototag_id: phototag_id for phototag_id in hashes}
+
+    def root(phototag_id):
+        while parents[phototag_id] != phototag_id:
+            parents[phototag_id] = parents[parents[phototag_id]]
+            phototag_id = parents[phototag_id]
+        return phototag_id
+
+    radius = probe_radius(max_distance)
+    for phototag_id, perceptual_hash in hashes.items():
+        for band, value in enumerate(hash_bands(perceptual_hash)):
+            for probe in band_probes(value, radius):
+                for other_id in tables[band].get(probe, ()):
+                    if other_id != phototag_id and hash_distance(perceptual_hash, hashes[other_id]) <= max_distance:
+                        parents[root(other_id)] = root(phototag_id)
+
+    members = defaultdict(list)
+    for phototag_id in hashes: # Oldest upload first in every cluster
+        members[root(phototag_id)].append(phototag_id)
+    clusters = sorted((ids for ids in members.values() if len(ids) > 1), key=lambda ids: (-len(ids), ids[0]))
+    cache.set(key, clusters, CLUSTERS_TIMEOUT)
+    return clusters
@@ -18,12 +18,11 @@ function initializeTagSearchForCard(cardElement) {
     const tagListContainer = cardElement.querySelector(tagListContainerSelector);
     if (!searchInput || !tagListContainer) return;
 
-    const tagItems = tagListContainer.querySelectorAll('.tag-item');
-
-    // Define the filter handler
+    // Define the filter handler (tag items are looked up on each input, as
+    // compact cards only build their checkbox list once expanded)
     const filterTagsHandler = function(event) {
         const searchTerm = event.target.value.toLowerCase().trim();
-        tagItems.forEach(item => {
+        tagListContainer.querySelectorAll('.tag-item').forEach(item => {
             const label = item.querySelector('.tag-label');
             if (label) {
                 const labelText = label.textContent.toLowerCase();
@@ -42,6 +41,137 @@ function initializeTagSearchForCard(cardElement) {
     searchInput.addEventListener('input', filterTagsHandler);
 }
 
+/**
+ * Returns the group's tag vocabulary ([{id, name}, ...]) emitted once per page
+ * by _group_photos.html for compact photo cards.
+ * @returns {Array<{id: number, name: string}>}
+ */
+function getGroupTagVocabulary() {
+    const vocabularyElement = document.getElementById('group-tag-vocabulary');
+    return vocabularyElement ? JSON.parse(vocabularyElement.textContent) : [];
+}
+
+/**
+ * Builds the tag checkbox list of a compact photo card from the shared vocabulary.
+ * The hidden inputs carrying the current selection are replaced by checkboxes,
+ * selected tags first, mirroring PhotoTagAssignmentForm's ordering.
+ * @param {HTMLElement} tagListContainer - The <div data-compact-tag-list> element.
+ * @param {string} photoId
+ */
+function buildCompactTagList(tagListContainer, photoId) {
+    if (tagListContainer.dataset.built === 'true') return;
+
+    const inputName = tagListContainer.dataset.inputName;
+    const selectedIds = new Set(
+        (tagListContainer.dataset.selectedTagIds || '').split(',').filter(Boolean)
+    );
+    const vocabulary = getGroupTagVocabulary();
+    const orderedTags = vocabulary.filter(tag => selectedIds.has(String(tag.id)))
+        .concat(vocabulary.filter(tag => !selectedIds.has(String(tag.id))));
+
+    tagListContainer.replaceChildren();
+    if (orderedTags.length === 0) {
+        const emptyMessage = document.createElement('p');
+        emptyMessage.className = 'text-xs text-gray-500 col-span-full p-1';
+        emptyMessage.textContent = 'No tags available for this group.';
+        tagListContainer.appendChild(emptyMessage);
+    }
+    orderedTags.forEach(tag => {
+        const inputId = `tag-${photoId}-${tag.id}`;
+        const item = document.createElement('div');
+        item.className = 'flex items-center space-x-1 px-1 py-0.5 rounded hover:bg-gray-50 tag-item';
+
+        const checkbox = document.createElement('input');
+        checkbox.type = 'checkbox';
+        checkbox.name = inputName;
+        checkbox.value = tag.id;
+        checkbox.id = inputId;
+        checkbox.checked = selectedIds.has(String(tag.id));
+
+        const label = document.createElement('label');
+        label.htmlFor = inputId;
+        label.className = 'text-xs text-gray-700 cursor-pointer tag-label select-none w-full';
+        label.textContent = tag.name;
+
+        item.append(checkbox, label);
+        tagListContainer.appendChild(item);
+    });
+    tagListContainer.dataset.built = 'true';
+}
+
+/**
+ * Wires the "Edit tags" button of a compact photo card.
+ * @param {HTMLElement} cardElement - The main <div id="photo-card-XYZ"> element.
+ */
+function initializeCompactCard(cardElement) {
+    const expandButton = cardElement.querySelector('.compact-tag-expand');
+    if (!expandButton || expandButton._expandHandler) return;
+
+    const photoId = expandButton.dataset.photoId;
+    expandButton._expandHandler = function() {
+        const editor = cardElement.querySelector(`#tag-editor-${photoId}`);
+        const tagListContainer = cardElement.querySelector(`#tag-list-${photoId}`);
+        if (!editor || !tagListContainer) return;
+        buildCompactTagList(tagListContainer, photoId);
+        editor.classList.remove('hidden');
+        expandButton.classList.add('hidden');
+    };
+    expandButton.addEventListener('click', expandButton._expandHandler);
+}
+
+// A picked autocomplete suggestion (_tag_suggestions.html) ticks that tag on its card
+document.addEventListener('click', function(event) {
+    const suggestion = event.target.closest('.tag-suggestion');
+    if (!suggestion) return;
+    const cardElement = suggestion.closest('div[id^="photo-card-"]:not([id*="-body-"])');
+    if (!cardElement) return;
+    const photoId = cardElement.id.split('-').pop();
+    const tagListContainer = cardElement.querySelector(`#tag-list-${photoId}`);
+    if (!tagListContainer) return;
+    buildCompactTagList(tagListContainer, photoId);
+    const checkbox = cardElement.querySelector(`#tag-${photoId}-${suggestion.dataset.tagId}`);
+    if (checkbox) {
+        checkbox.checked = true;
+        checkbox.closest('.tag-item').scrollIntoView({block: 'nearest'});
+    }
+});
+
+/**
+ * Shows or hides the multi-select checkboxes of every card according to the
+ * state of #bulk-tag-form, and refreshes its selection counter. Cards added
+ * by infinite scroll pick up the current mode when this runs after the swap.
+ */
+function refreshBulkSelection() {
+    const bulkForm = document.getElementById('bulk-tag-form');
+    if (!bulkForm) return;
+    const active = bulkForm.dataset.bulkMode === 'true';
+    const checkboxes = document.querySelectorAll('.bulk-select-checkbox');
+    checkboxes.forEach(checkbox => checkbox.classList.toggle('hidden', !active));
+
+    const panel = document.getElementById('bulk-tag-panel');
+    if (panel) panel.classList.toggle('hidden', !active);
+    const counter = document.getElementById('bulk-selected-count');
+    if (counter) {
+        counter.textContent = Array.from(checkboxes).filter(checkbox => checkbox.checked).length;
+    }
+}
+
+// Delegated, so the handlers survive HTMX swaps of the photo section
+document.addEventListener('click', function(event) {
+    const toggle = event.target.closest('#bulk-select-toggle');
+    if (!toggle) return;
+    const bulkForm = document.getElementById('bulk-tag-form');
+    bulkForm.dataset.bulkMode = bulkForm.dataset.bulkMode === 'true' ? 'false' : 'true';
+    if (bulkForm.dataset.bulkMode !== 'true') {
+        document.querySelectorAll('.bulk-select-checkbox').forEach(checkbox => { checkbox.checked = false; });
+    }
+    refreshBulkSelection();
+});
+
+document.addEventListener('change', function(event) {
+    if (event.target.classList.contains('bulk-select-checkbox')) refreshBulkSelection();
+});
+
 /**
  * Initializes tag search for all photo cards within a given root element.
  * @param {HTMLElement} [rootElement=document] - The element to search within for photo cards.
@@ -50,6 +180,7 @@ function setupPhotoCards(rootElement = document) {
     const photoCards = rootElement.querySelectorAll('div[id^="photo-card-"]:not([id*="-body-"])');
     photoCards.forEach(card => {
         initializeTagSearchForCard(card);
+        initializeCompactCard(card);
     });
 }
 
@@ -67,8 +198,10 @@ document.body.addEventListener('htmx:afterSwap', function(event) {
         const newElement = document.querySelector(`#${oldElement.id}`);
         if (newElement && newElement.id.startsWith('photo-card-') && !newElement.id.includes('-body-')) {
             initializeTagSearchForCard(newElement);
+            initializeCompactCard(newElement);
         } else {
             setupPhotoCards(document);
         }
+        refreshBulkSelection();
     }, 0);
 });
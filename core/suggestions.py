@@ -0,0 +1,232 @@
+"""
+Tag suggestions from a per-group tag co-occurrence model.
+
+The model is two sets of counters kept in the database, mirroring
+PhotoTag.tag_ids:
+- TagCooccurrence: for every pair of tags, the number of the group's photos
+  carrying both (the diagonal holds each tag's usage);
+- UploaderTagCount: for every uploader, the number of their photos in the
+  group carrying each tag.
+
+sync_tag_ids() (core.tagging) calls record_tag_changes() with the old and
+new tag ids of the rows it rewrites, and deleted PhotoTags are subtracted by
+core.signals, so the counters follow every tag change with a few statements
+instead of a scan of the through table. rebuild_tag_cooccurrence() recounts
+them from PhotoTag.tag_ids.
+
+Suggestions read the group's counters once per Group.cache_version, which
+every tag change bumps, and keep them in the cache as plain dicts; ranking a
+photo's suggestions is then a few dict lookups.
+"""
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, F, Q, Value, When
+
+from .caching import bump_group_versions
+from .models import PhotoTag, Tag, TagCooccurrence, UploaderTagCount, normalize_tag_name
+from .profiling import record_cache
+
+MODEL_TIMEOUT = 60 * 60 * 24
+UPDATE_BATCH_SIZE = 100
+
+# Weights of the ranking terms, next to the mean co-occurrence rate with the photo's tags
+UPLOADER_WEIGHT = 0.5
+USAGE_WEIGHT = 0.1
+
+
+@dataclass(frozen=True)
+class Suggestion:
+    id: int
+    name: str
+    usage: int
+    score: float
+
+
+# Counter updates
+
+def tag_count_deltas(group_id, uploader_id, old_ids, new_ids):
+    """
+    ``(pair_deltas, uploader_deltas)`` for one photo whose tags go from
+    ``old_ids`` to ``new_ids``, keyed ``(group_id, tag_id, other_id)`` and
+    ``(group_id, uploader_id, tag_id)``.
+    """
+    old_ids, new_ids = set(old_ids), set(new_ids)
+    pair_deltas, uploader_deltas = Counter(), Counter()
+    for sign, ids, unchanged in ((1, new_ids, old_ids), (-1, old_ids, new_ids)):
+        for tag_id in ids:
+            for other_id in ids:
+                if tag_id not in unchanged or other_id not in unchanged:
+                    pair_deltas[group_id, tag_id, other_id] += sign
+            if uploader_id is not None and tag_id not in unchanged:
+                uploader_deltas[group_id, uploader_id, tag_id] += sign
+    return pair_deltas, uploader_deltas
+
+
+def record_tag_changes(changes):
+    """
+    Applies ``(group_id, uploader_id, old_ids, new_ids)`` tag changes to the
+    counters: one INSERT of the missing rows and one UPDATE per table (per
+    UPDATE_BATCH_SIZE rows).
+    """
+    pair_deltas, uploader_deltas = Counter(), Counter()
+    for change in changes:
+        pairs, uploaders = tag_count_deltas(*change)
+        pair_deltas.update(pairs)
+        uploader_deltas.update(uploaders)
+    _apply_deltas(TagCooccurrence, ('group_id', 'tag_id', 'other_id'), pair_deltas)
+    _apply_deltas(UploaderTagCount, ('group_id', 'user_id', 'tag_id'), uploader_deltas)
+
+
+def _apply_deltas(model, fields, deltas):
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    # Rows a positive delta needs; ignore_conflicts keeps existing (and concurrently created) ones
+    model.objects.bulk_create(
+        [model(**dict(zip(fields, key)), count=0) for key, delta in deltas.items() if delta > 0],
+        ignore_conflicts=True,
+    )
+    keys = list(deltas)
+    for offset in range(0, len(keys), UPDATE_BATCH_SIZE):
+        batch = keys[offset:offset + UPDATE_BATCH_SIZE]
+        # The group is implied by the tags, so only the unique fields are matched
+        matches = [Q(**dict(zip(fields[1:], key[1:]))) for key in batch]
+        model.objects.filter(Q.create(matches, connector=Q.OR)).update(count=F('count') + Case(
+            *[When(match, then=Value(deltas[key])) for match, key in zip(matches, batch)],
+            default=Value(0),
+        ))
+
+
+# Rebuild
+
+def count_tags(group_ids=None):
+    """``(pair_counts, uploader_counts)`` recounted from PhotoTag.tag_ids, keyed as in tag_count_deltas()."""
+    pair_counts, uploader_counts = Counter(), Counter()
+    phototags = PhotoTag.objects.exclude(tag_ids=[])
+    if group_ids is not None:
+        phototags = phototags.filter(group_id__in=group_ids)
+    rows = phototags.order_by('pk').values_list('group_id', 'photo__uploaded_by_id', 'tag_ids')
+    for group_id, uploader_id, tag_ids in rows.iterator(chunk_size=500):
+        pairs, uploaders = tag_count_deltas(group_id, uploader_id, (), tag_ids)
+        pair_counts.update(pairs)
+        uploader_counts.update(uploaders)
+    return pair_counts, uploader_counts
+
+
+def stored_tag_counts(group_ids=None):
+    """The stored counters, keyed as count_tags() (rows at zero are left out)."""
+    pairs = TagCooccurrence.objects.filter(count__gt=0)
+    uploaders = UploaderTagCount.objects.filter(count__gt=0)
+    if group_ids is not None:
+        pairs = pairs.filter(group_id__in=group_ids)
+        uploaders = uploaders.filter(group_id__in=group_ids)
+    return (
+        Counter({row[:3]: row[3] for row in pairs.values_list('group_id', 'tag_id', 'other_id', 'count')}),
+        Counter({row[:3]: row[3] for row in uploaders.values_list('group_id', 'user_id', 'tag_id', 'count')}),
+    )
+
+
+def find_cooccurrence_drift(group_ids=None):
+    """Ids of the groups whose stored counters differ from a recount."""
+    drifted = set()
+    for expected, stored in zip(count_tags(group_ids), stored_tag_counts(group_ids)):
+        drifted.update(key[0] for key in expected.keys() | stored.keys() if expected[key] != stored[key])
+    return sorted(drifted)
+
+
+def rebuild_tag_cooccurrence(group_ids):
+    """Replaces the counters of ``group_ids`` with a recount."""
+    pair_counts, uploader_counts = count_tags(group_ids)
+    with transaction.atomic():
+        TagCooccurrence.objects.filter(group_id__in=group_ids).delete()
+        UploaderTagCount.objects.filter(group_id__in=group_ids).delete()
+        TagCooccurrence.objects.bulk_create([
+            TagCooccurrence(group_id=group_id, tag_id=tag_id, other_id=other_id, count=count)
+            for (group_id, tag_id, other_id), count in pair_counts.items()
+        ], batch_size=500)
+        UploaderTagCount.objects.bulk_create([
+            UploaderTagCount(group_id=group_id, user_id=user_id, tag_id=tag_id, count=count)
+            for (group_id, user_id, tag_id), count in uploader_counts.items()
+        ], batch_size=500)
+        bump_group_versions(group_ids)
+
+
+# Suggestions
+
+def model_cache_key(group):
+    return f"tag-cooccurrence:{group.id}:{group.cache_version}"
+
+
+def load_group_model(group):
+    """
+    The group's counters as ``{'tags': {id: (name, name_key)}, 'pairs': {tag:
+    {other: count}}, 'uploaders': {user: {tag: count}}}``, from the cache or
+    three queries.
+    """
+    key = model_cache_key(group)
+    model = cache.get(key)
+    record_cache('suggestions', hits=int(model is not None), misses=int(model is None))
+    if model is None:
+        pairs = defaultdict(dict)
+        for tag_id, other_id, count in TagCooccurrence.objects.filter(
+                group=group, count__gt=0).values_list('tag_id', 'other_id', 'count'):
+            pairs[tag_id][other_id] = count
+        uploaders = defaultdict(dict)
+        for user_id, tag_id, count in UploaderTagCount.objects.filter(
+                group=group, count__gt=0).values_list('user_id', 'tag_id', 'count'):
+            uploaders[user_id][tag_id] = count
+        model = {
+            'tags': {tag_id: (name, name_key) for tag_id, name, name_key in
+                     Tag.objects.filter(group=group).values_list('id', 'name', 'name_key')},
+            'pairs': dict(pairs),
+            'uploaders': dict(uploaders),
+        }
+        cache.set(key, model, MODEL_TIMEOUT)
+    return model
+
+
+def suggest_tags(model, current_tag_ids, uploader_id, query, limit):
+    """
+    The group's tags missing from ``current_tag_ids`` (and starting with
+    ``query``), most likely first. A tag scores its mean co-occurrence rate
+    with the current tags, plus its share of the uploader's tagging and of
+    the group's usage.
+    """
+    current_tag_ids = set(current_tag_ids)
+    pairs = model['pairs']
+    uploader_counts = model['uploaders'].get(uploader_id, {})
+    top_uploader_count = max(uploader_counts.values(), default=0) or 1
+    top_usage = max((pairs[tag_id].get(tag_id, 0) for tag_id in pairs), default=0) or 1
+    # Each current tag's co-occurrence row, with its usage to turn counts into rates
+    rows = [(pairs.get(tag_id, {}), pairs.get(tag_id, {}).get(tag_id, 0) or 1) for tag_id in current_tag_ids]
+    prefix = normalize_tag_name(query)
+
+    suggestions = []
+    for tag_id, (name, name_key) in model['tags'].items():
+        if tag_id in current_tag_ids or not name_key.startswith(prefix):
+            continue
+        usage = pairs.get(tag_id, {}).get(tag_id, 0)
+        score = (
+            (sum(row.get(tag_id, 0) / row_usage for row, row_usage in rows) / len(rows) if rows else 0)
+            + UPLOADER_WEIGHT * uploader_counts.get(tag_id, 0) / top_uploader_count
+            + USAGE_WEIGHT * usage / top_usage
+        )
+        suggestions.append(Suggestion(tag_id, name, usage, score))
+    suggestions.sort(key=lambda suggestion: (-suggestion.score, model['tags'][suggestion.id][1]))
+    return suggestions[:limit]
+
+
+def suggest_tags_for_photo(group, photo_id, query, limit):
+    """
+    Suggestions for the photo's card: one query for its tags and uploader,
+    the rest from the cached model. None when the photo is not in the group.
+    """
+    row = PhotoTag.objects.filter(group=group, photo_id=photo_id).values_list(
+        'tag_ids', 'photo__uploaded_by_id').first()
+    if row is None:
+        return None
+    tag_ids, uploader_id = row
+    return suggest_tags(load_group_model(group), tag_ids, uploader_id, query, limit)
@@ -0,0 +1,155 @@
+"""
+Boolean tag queries for the group photo grid, e.g.::
+
+    beach AND (2024 OR summer) NOT blurry
+
+Terms are tag names, matched like Tag.name_key (case-insensitive); names
+containing spaces or parentheses are quoted ("night sky"). AND, OR and NOT
+are case-insensitive, NOT binds tightest, then AND, then OR. Adjacent terms
+are ANDed, so ``beach NOT blurry`` means ``beach AND NOT blurry``.
+
+A parsed query is a tree of tuples: ``('tag', tag_id)``, ``('not', node)``,
+``('and', left, right)`` and ``('or', left, right)``. compile_tag_query()
+turns it into a Q object of containment checks on the denormalized
+PhotoTag.tag_ids, so a query costs one statement however many tags it names,
+with no joins and no DISTINCT.
+"""
+import re
+
+from django.db.models import Q
+
+from .models import normalize_tag_name
+
+TOKEN_RE = re.compile(r'\s*(?:(?P<paren>[()])|"(?P<quoted>[^"]*)"|(?P<word>[^\s()"]+))')
+OPERATORS = {'and', 'or', 'not'}
+MAX_DEPTH = 32 # Nested parentheses and NOTs; the parser and compiler recurse per level
+
+
+class TagQueryError(ValueError):
+    """Raised with a user-facing message for a malformed query or an unknown tag."""
+
+
+def tokenize(text):
+    tokens = []
+    position = 0
+    text = text.rstrip()
+    while position < len(text):
+        match = TOKEN_RE.match(text, position)
+        if match is None:
+            raise TagQueryError('Unbalanced quote in the tag query.')
+        position = match.end()
+        if match.group('paren'):
+            tokens.append(('paren', match.group('paren')))
+        elif match.group('quoted') is not None:
+            tokens.append(('name', match.group('quoted')))
+        elif match.group('word').lower() in OPERATORS:
+            tokens.append(('op', match.group('word').lower()))
+        else:
+            tokens.append(('name', match.group('word')))
+    return tokens
+
+
+class _Parser:
+    def __init__(self, tokens, tag_ids_by_key):
+        self.tokens = tokens
+        self.position = 0
+        self.depth = 0
+        self.tag_ids_by_key = tag_ids_by_key
+
+    def peek(self):
+        return self.tokens[self.position] if self.position < len(self.tokens) else (None, None)
+
+    def take(self):
+        token = self.peek()
+        self.position += 1
+        return token
+
+    def parse(self):
+        node = self.parse_or()
+        if self.peek() != (None, None):
+            raise TagQueryError(f"Unexpected '{self.peek()[1]}' in the tag query.")
+        return node
+
+    def parse_or(self):
+        node = self.parse_and()
+        while self.peek() == ('op', 'or'):
+            self.take()
+            node = ('or', node, self.parse_and())
+        return node
+
+    def parse_and(self):
+        node = self.parse_not()
+        while True:
+            kind, value = self.peek()
+            if (kind, value) == ('op', 'and'):
+                self.take()
+            elif not (kind == 'name' or (kind, value) in (('op', 'not'), ('paren', '('))):
+                return node
+            node = ('and', node, self.parse_not())
+
+    def nest(self):
+        self.depth += 1
+        if self.depth > MAX_DEPTH:
+            raise TagQueryError('Query is nested too deeply.')
+
+    def parse_not(self):
+        if self.peek() == ('op', 'not'):
+            self.take()
+            self.nest()
+            node = ('not', self.parse_not())
+            self.depth -= 1
+            return node
+        return self.parse_term()
+
+    def parse_term(self):
+        kind, value = self.take()
+        if (kind, value) == ('paren', '('):
+            self.nest()
+            node = self.parse_or()
+            if self.take() != ('paren', ')'):
+                raise TagQueryError('Missing closing parenthesis in the tag query.')
+            self.depth -= 1
+            return node
+        if kind != 'name':
+            raise TagQueryError('Incomplete tag query.' if kind is None else f"Unexpected '{value}' in the tag query.")
+        tag_id = self.tag_ids_by_key.get(normalize_tag_name(value))
+        if tag_id is None:
+            raise TagQueryError(f"Unknown tag '{value}' (quote names that contain spaces).")
+        return ('tag', tag_id)
+
+
+def parse_tag_query(text, tags):
+    """Parses ``text`` against ``tags`` (the group's tags); returns None for a blank query."""
+    tokens = tokenize(text)
+    if not tokens:
+        return None
+    return _Parser(tokens, {tag.name_key: tag.id for tag in tags}).parse()
+
+
+def all_tags_query(tag_ids):
+    """The tree matching photos that carry every tag of ``tag_ids`` (None if empty)."""
+    node = None
+    for tag_id in sorted(tag_ids):
+        node = ('tag', tag_id) if node is None else ('and', node, ('tag', tag_id))
+    return node
+
+
+def canonical_tag_query(node):
+    """Stable text form of a parsed query, used in cache keys."""
+    kind = node[0]
+    if kind == 'tag':
+        return str(node[1])
+    if kind == 'not':
+        return f"!{canonical_tag_query(node[1])}"
+    return f"({canonical_tag_query(node[1])} {kind} {canonical_tag_query(node[2])})"
+
+
+def compile_tag_query(node):
+    """Q object over PhotoTag matching the parsed query ``node``."""
+    kind = node[0]
+    if kind == 'tag':
+        return Q(tag_ids__has_tag=node[1])
+    if kind == 'not':
+        return ~compile_tag_query(node[1])
+    left, right = compile_tag_query(node[1]), compile_tag_query(node[2])
+    return left & right if kind == 'and' else left | right
@@ -0,0 +1,149 @@
+"""
+Group tag operations: lookups on the normalized Tag.name_key, and set-based
+assignments on the PhotoTag.tags through table.
+
+The bulk assignments write through rows with single INSERT/DELETE statements,
+which send no m2m_changed signals, so the cache versions and PhotoTag.tag_ids
+are refreshed here instead (see core.caching).
+"""
+from django.db import transaction
+from django.db.models import Count
+
+from .caching import bump_card_versions
+from .models import PhotoTag, Tag, normalize_tag_name
+from .suggestions import record_tag_changes
+
+BULK_ADD = 'add'
+BULK_REMOVE = 'remove'
+BULK_REPLACE = 'replace'
+
+AUTOCOMPLETE_LIMIT = 10
+TAG_ID_BATCH_SIZE = 500
+
+
+def actual_tag_ids(phototag_ids):
+    """``{phototag_id: sorted tag ids}`` read from the through table."""
+    tag_ids = {phototag_id: [] for phototag_id in phototag_ids}
+    links = PhotoTag.tags.through.objects.filter(phototag_id__in=list(tag_ids)).order_by('tag_id')
+    for phototag_id, tag_id in links.values_list('phototag_id', 'tag_id'):
+        tag_ids[phototag_id].append(tag_id)
+    return tag_ids
+
+
+def sync_tag_ids(phototag_ids):
+    """
+    Rewrites PhotoTag.tag_ids of ``phototag_ids`` from the through table, and
+    applies the changes to the tag co-occurrence counters (core.suggestions).
+    """
+    phototag_ids = set(phototag_ids)
+    if not phototag_ids:
+        return
+    stored = {
+        phototag_id: (group_id, uploader_id, tag_ids) for phototag_id, group_id, uploader_id, tag_ids in
+        PhotoTag.objects.filter(pk__in=phototag_ids).values_list('pk', 'group_id', 'photo__uploaded_by_id', 'tag_ids')
+    }
+    actual = actual_tag_ids(stored)
+    changed = {phototag_id: ids for phototag_id, ids in actual.items() if ids != stored[phototag_id][2]}
+    PhotoTag.objects.bulk_update(
+        [PhotoTag(pk=phototag_id, tag_ids=ids) for phototag_id, ids in changed.items()],
+        ['tag_ids'], batch_size=TAG_ID_BATCH_SIZE,
+    )
+    record_tag_changes((*stored[phototag_id], ids) for phototag_id, ids in changed.items())
+
+
+def find_tag_id_drift():
+    """Returns ``(phototag_id, stored, actual)`` for every PhotoTag whose tag_ids are wrong."""
+    drifted = []
+    stored_rows = PhotoTag.objects.order_by('pk').values_list('pk', 'tag_ids')
+    batch = []
+    for row in stored_rows.iterator(chunk_size=TAG_ID_BATCH_SIZE):
+        batch.append(row)
+        if len(batch) == TAG_ID_BATCH_SIZE:
+            drifted.extend(_drift_in_batch(batch))
+            batch = []
+    drifted.extend(_drift_in_batch(batch))
+    return drifted
+
+
+def _drift_in_batch(rows):
+    actual = actual_tag_ids(phototag_id for phototag_id, _ in rows)
+    return [
+        (phototag_id, stored, actual[phototag_id])
+        for phototag_id, stored in rows if stored != actual[phototag_id]
+    ]
+
+
+def tag_facet_counts(phototags):
+    """
+    ``{tag_id: count}`` of the ``phototags`` rows carrying each tag, from a
+    single GROUP BY over the through table. Tags carried by none are absent.
+    """
+    links = PhotoTag.tags.through.objects.filter(phototag_id__in=phototags.order_by().values('pk'))
+    return dict(links.order_by().values('tag_id').annotate(count=Count('*')).values_list('tag_id', 'count'))
+
+
+def get_or_create_tag(group, name):
+    """
+    Returns ``(tag, created)`` for ``name`` in ``group``, matching existing tags
+    case-insensitively. The unique (group, name_key) constraint settles races
+    between concurrent creations (get_or_create retries the lookup).
+    """
+    return Tag.objects.get_or_create(group=group, name_key=normalize_tag_name(name), defaults={'name': name})
+
+
+def _autocomplete_queryset(group, query, limit):
+    return (
+        Tag.objects.filter(group=group, name_key__startswith=normalize_tag_name(query))
+        .annotate(usage=Count('phototag'))
+        .order_by('-usage', 'name_key')[:limit]
+    )
+
+
+def autocomplete_tags(group, query, limit=AUTOCOMPLETE_LIMIT):
+    """The group's tags starting with ``query`` (case-insensitive), most used first."""
+    return list(_autocomplete_queryset(group, query, limit))
+
+
+async def aautocomplete_tags(group, query, limit=AUTOCOMPLETE_LIMIT):
+    return [tag async for tag in _autocomplete_queryset(group, query, limit)]
+
+
+def bulk_assign_tags(group, photo_ids, tag_ids, action):
+    """
+    Adds, removes or replaces (sets exactly) ``tag_ids`` on the photos of
+    ``photo_ids`` within ``group``. Photos outside the group are ignored, and
+    ``tag_ids`` must belong to the group. Returns a ``(photos, added, removed)``
+    tuple of counts.
+    """
+    through = PhotoTag.tags.through
+    tag_ids = set(tag_ids)
+    with transaction.atomic():
+        phototag_ids = list(
+            PhotoTag.objects.filter(group=group, photo_id__in=photo_ids).values_list('id', flat=True)
+        )
+        links = through.objects.filter(phototag_id__in=phototag_ids)
+
+        removed = 0
+        if action == BULK_REMOVE:
+            removed, _ = links.filter(tag_id__in=tag_ids).delete()
+        elif action == BULK_REPLACE:
+            removed, _ = links.exclude(tag_id__in=tag_ids).delete()
+
+        added = 0
+        if action in (BULK_ADD, BULK_REPLACE) and tag_ids:
+            existing = set(links.filter(tag_id__in=tag_ids).values_list('phototag_id', 'tag_id'))
+            rows = [
+                through(phototag_id=phototag_id, tag_id=tag_id)
+                for phototag_id in phototag_ids for tag_id in tag_ids
+                if (phototag_id, tag_id) not in existing
+            ]
+            if rows:
+                # ignore_conflicts covers a concurrent assignment of the same tag meanwhile,
+                # so only the links actually inserted are counted
+                through.objects.bulk_create(rows, ignore_conflicts=True)
+                added = links.filter(tag_id__in=tag_ids).count() - len(existing)
+
+        if added or removed:
+            sync_tag_ids(phototag_ids)
+            bump_card_versions(PhotoTag.objects.filter(pk__in=phototag_ids))
+    return len(phototag_ids), added, removed
@@ -1,16 +1,45 @@
+import contextlib
+import csv
+import fcntl
+import json
+import os
 import tempfile
 import shutil
+import threading
+import zipfile
+from io import BytesIO
+from pathlib import Path
+from unittest import mock
+import requests
+from PIL import Image as PILImage
 from django.test import TestCase, Client, override_settings
 from django.contrib.auth.models import User
-from django.urls import reverse
+from django.urls import resolve, reverse
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.conf import settings as django_settings
 from django.contrib.messages import get_messages
 from django import forms as django_forms # For forms.Media
 from django.db import utils as django_db_utils # For IntegrityError
-
-from .models import Group, Photo, Tag, PhotoTag
+from django.db import connection, DatabaseError
+from django.test.utils import CaptureQueriesContext
+from django.core.management import call_command, CommandError
+from django.core.cache import cache
+
+from .models import Group, Photo, Tag, PhotoTag, Job, PhotoHashBand, PhotoRendition, TagCooccurrence
+from .renditions import RENDITION_SIZES, create_renditions
+from .uploads import bulk_upload_photos
+from .counters import find_counter_drift
+from .caching import CSRF_PLACEHOLDER, get_cache_stats
+from .tag_query import canonical_tag_query, compile_tag_query, parse_tag_query
+from .tagging import BULK_ADD, bulk_assign_tags, find_tag_id_drift, tag_facet_counts
+from .similarity import similar_photos
+from .suggestions import count_tags, find_cooccurrence_drift, model_cache_key, stored_tag_counts
+from .jobs import claim_next_job, enqueue_photo_upload, run_job
 from .forms import GroupForm, PhotoTagAssignmentForm, TagFilterForm
+from .views import GroupDetailView, GroupListView
+from .query_budgets import QueryBudgetExceeded, QueryRecorder
+from . import async_views, metrics
+from .metrics import MetricsRegistry
 
 # Helper function to create a tiny valid PNG image for uploads
 def get_temporary_image(name="test_image.png"):
@@ -27,7 +56,13 @@ def get_another_temporary_image(name="test_image_2.png"):
         'image/png'
     )
 
-@override_settings(MEDIA_ROOT=tempfile.mkdtemp(prefix="photoshare_test_media_"))
+def get_pillow_image(name="real_image.jpg", size=(1200, 900)):
+    # Unlike the hand-made PNGs above, this one can be decoded and resized by Pillow
+    buffer = BytesIO()
+    PILImage.new('RGB', size, (200, 120, 40)).save(buffer, 'JPEG')
+    return SimpleUploadedFile(name, buffer.getvalue(), 'image/jpeg')
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(prefix="photoshare_test_media_"), QUERY_BUDGET_STRICT=True)
 class PhotoShareTestCase(TestCase):
 
     @classmethod
@@ -80,6 +115,12 @@ class PhotoShareTestCase(TestCase):
     def setUp(self):
         self.client = Client()
         self.login_url = reverse('account_login') # Assuming django-allauth
+        cache.clear() # Fragments cached by a previous test could outlive its rolled-back versions
+        # Metrics (and the cache stats they carry) start from zero in every test
+        metrics_dir = tempfile.mkdtemp(prefix="tagmi_test_metrics_")
+        self.addCleanup(shutil.rmtree, metrics_dir, ignore_errors=True)
+        self.enterContext(override_settings(METRICS_DIR=metrics_dir))
+        self.enterContext(mock.patch.multiple(metrics, _registry=MetricsRegistry(metrics_dir), _registry_pid=os.getpid()))
 
     # Model Tests
     def test_group_str(self):
@@ -132,6 +173,139 @@ class PhotoShareTestCase(TestCase):
         group_to_delete.delete()
         self.assertFalse(PhotoTag.objects.filter(id=pt_id).exists())
 
+    def test_group_counters_maintained(self):
+        self.group1.refresh_from_db()
+        self.assertEqual((self.group1.member_count, self.group1.photo_count, self.group1.tag_count), (2, 2, 2))
+
+        self.group1.members.add(self.user3)
+        Tag.objects.create(name="Sunset", group=self.group1)
+        PhotoTag.objects.create(photo=self.photo3_user2, group=self.group1)
+        self.group1.refresh_from_db()
+        self.assertEqual((self.group1.member_count, self.group1.photo_count, self.group1.tag_count), (3, 3, 3))
+
+        self.user3.photo_groups.clear()
+        self.group1.members.remove(self.user2, self.user3) # user3 is no longer a member
+        self.tag_g1_city.delete()
+        PhotoTag.objects.filter(photo=self.photo1_user1, group=self.group1).delete()
+        self.group1.refresh_from_db()
+        self.assertEqual((self.group1.member_count, self.group1.photo_count, self.group1.tag_count), (1, 2, 2))
+        self.assertEqual(find_counter_drift(), [])
+
+    def test_rebuild_group_counters_command(self):
+        Group.objects.filter(pk=self.group2.pk).update(photo_count=42)
+        with self.assertRaises(CommandError):
+            call_command('rebuild_group_counters', '--check', stdout=mock.MagicMock())
+        call_command('rebuild_group_counters', stdout=mock.MagicMock())
+        self.group2.refresh_from_db()
+        self.assertEqual(self.group2.photo_count, 2)
+        call_command('rebuild_group_counters', '--check', stdout=mock.MagicMock())
+
+    def test_phototag_tag_ids_kept_in_sync(self):
+        def tag_ids(phototag):
+            return PhotoTag.objects.get(pk=phototag.pk).tag_ids
+
+        self.assertEqual(tag_ids(self.pt_g1_p2), sorted([self.tag_g1_nature.id, self.tag_g1_city.id]))
+        self.pt_g1_p1.tags.add(self.tag_g1_city)
+        self.assertEqual(tag_ids(self.pt_g1_p1), sorted([self.tag_g1_nature.id, self.tag_g1_city.id]))
+        self.tag_g1_nature.phototag_set.clear()
+        self.assertEqual(tag_ids(self.pt_g1_p1), [self.tag_g1_city.id])
+        self.assertEqual(tag_ids(self.pt_g1_p2), [self.tag_g1_city.id])
+        self.tag_g1_city.delete()
+        self.assertEqual(tag_ids(self.pt_g1_p1), [])
+        self.assertEqual(find_tag_id_drift(), [])
+
+        self.assertEqual(list(PhotoTag.objects.filter(tag_ids__has_tag=self.tag_g2_animal.id)), [self.pt_g2_p3])
+
+    def test_rebuild_tag_ids_command(self):
+        PhotoTag.objects.filter(pk=self.pt_g1_p1.pk).update(tag_ids=[self.tag_g1_city.id])
+        with self.assertRaises(CommandError):
+            call_command('rebuild_tag_ids', '--check', stdout=mock.MagicMock())
+        call_command('rebuild_tag_ids', stdout=mock.MagicMock())
+        self.assertEqual(PhotoTag.objects.get(pk=self.pt_g1_p1.pk).tag_ids, [self.tag_g1_nature.id])
+        call_command('rebuild_tag_ids', '--check', stdout=mock.MagicMock())
+
+    def test_seed_data_and_benchmark_views_commands(self):
+        call_command('seed_data', '--users', 4, '--groups', 2, '--photos', 30, '--tags-per-group', 5,
+                     '--prefix', 'bench', stdout=mock.MagicMock())
+        seeded_group = Group.objects.get(name="bench group 0")
+        self.assertEqual(seeded_group.photo_count, seeded_group.photo_tag_associations.count())
+        self.assertEqual(seeded_group.tag_count, 5)
+        self.assertEqual(find_tag_id_drift(), [])
+        self.assertTrue(self.client.login(username='bench_user_0', password='seed-password'))
+        with self.assertRaises(CommandError): # Same prefix again
+            call_command('seed_data', '--prefix', 'bench', stdout=mock.MagicMock())
+
+        photo_count = Photo.objects.count()
+        with tempfile.NamedTemporaryFile(suffix='.json') as output:
+            call_command('benchmark_views', '--username', 'bench_user_0', '--requests', 2, '--warmup', 0,
+                         '--upload-batch', 1, '--output', output.name, stdout=mock.MagicMock())
+            report = json.load(output)
+        self.assertEqual(set(report['scenarios']), {
+            'group_list', 'group_detail', 'group_detail_tag_filter', 'group_detail_tag_query',
+            'assign_photo_tags', 'upload_photo',
+        })
+        self.assertEqual(report['scenarios']['group_detail']['status_codes'], {'200': 2})
+        self.assertEqual(report['scenarios']['upload_photo']['status_codes'], {'302': 2})
+        self.assertGreater(report['scenarios']['group_detail']['queries']['p50'], 0)
+        self.assertEqual(Photo.objects.count(), photo_count) # Rolled back
+
+    def test_import_photos_command_tags_folders_and_resumes(self):
+        source = tempfile.mkdtemp(prefix="photoshare_import_")
+        self.addCleanup(shutil.rmtree, source, ignore_errors=True)
+        for relative_path, colour in (('beach/a.jpg', 10), ('2024/beach/b.jpg', 20), ('misc/c.jpg', 30)):
+            os.makedirs(os.path.join(source, os.path.dirname(relative_path)), exist_ok=True)
+            PILImage.new('RGB', (64, 48), (colour, 0, 0)).save(os.path.join(source, relative_path), 'JPEG')
+        with open(os.path.join(source, 'misc', 'broken.jpg'), 'wb') as broken:
+            broken.write(b'not an image')
+        tag_map = os.path.join(source, 'tags.json')
+        with open(tag_map, 'w') as tag_map_file:
+            json.dump({'beach': 'Nature', '2024': ['Year 2024']}, tag_map_file)
+        state_file = os.path.join(source, 'import.state')
+        args = [source, '--group', self.group1.pk, '--user', 'user1', '--tag-map', tag_map,
+                '--state-file', state_file, '--batch-size', 2, '--workers', 2]
+
+        def stage_image(image_file):
+            if image_file.name == 'c.jpg' and not storage_back:
+                raise OSError("storage unavailable")
+            return f"test/{image_file.name}"
+
+        photo_count = Photo.objects.count()
+        storage_back = False
+        with mock.patch('core.uploads.stage_image', side_effect=stage_image) as stage:
+            call_command('import_photos', *args, stdout=mock.MagicMock(), stderr=mock.MagicMock())
+            self.assertEqual(Photo.objects.count(), photo_count + 2)
+            with open(state_file) as state:
+                self.assertEqual(len(state.read().splitlines()), 3) # The broken file is not retried either
+            # Resuming only retries the file storage failed on
+            storage_back = True
+            call_command('import_photos', *args, stdout=mock.MagicMock(), stderr=mock.MagicMock())
+        self.assertEqual(stage.call_count, 4)
+        self.assertEqual(Photo.objects.count(), photo_count + 3)
+        imported = {pt.photo.image.public_id: pt for pt in PhotoTag.objects.filter(
+            group=self.group1, photo__image__startswith='test/').exclude(pk__in=[self.pt_g1_p1.pk, self.pt_g1_p2.pk])}
+        year_tag = Tag.objects.get(group=self.group1, name='Year 2024')
+        self.assertEqual(imported['test/a'].tag_ids, [self.tag_g1_nature.id])
+        self.assertEqual(imported['test/b'].tag_ids, sorted([self.tag_g1_nature.id, year_tag.id]))
+        self.assertEqual(imported['test/c'].tag_ids, [])
+        self.assertEqual(find_tag_id_drift(), [])
+
+        # Everything is imported now; a restart recognises the stored files
+        with mock.patch('core.uploads.stage_image') as stage:
+            call_command('import_photos', *args, stdout=mock.MagicMock(), stderr=mock.MagicMock())
+            call_command('import_photos', *args, '--restart', stdout=mock.MagicMock(), stderr=mock.MagicMock())
+        stage.assert_not_called()
+        self.assertEqual(Photo.objects.count(), photo_count + 3)
+
+        archive_path = os.path.join(source, 'album.zip')
+        with zipfile.ZipFile(archive_path, 'w') as archive:
+            archive.write(os.path.join(source, 'beach', 'a.jpg'), 'summer/a.jpg')
+        with mock.patch('core.uploads.stage_image', return_value="test/zipped") as stage:
+            call_command('import_photos', archive_path, '--group', self.group2.pk, '--user', 'user2',
+                         '--state-file', state_file + '.zip', stdout=mock.MagicMock(), stderr=mock.MagicMock())
+        stage.assert_called_once()
+        with self.assertRaises(CommandError): # user1 is not in group2
+            call_command('import_photos', archive_path, '--group', self.group2.pk, '--user', 'user1')
+
     # Form Tests
     def test_group_form_valid(self):
         form_data = {'name': 'New Test Group', 'members': [self.user1.id, self.user2.id]}
@@ -166,6 +340,14 @@ class PhotoShareTestCase(TestCase):
         form = PhotoTagAssignmentForm(data=form_data, group=self.group1)
         self.assertTrue(form.is_valid(), form.errors)
 
+    def test_phototag_assignment_form_shared_group_tags(self):
+        group_tags = list(Tag.objects.filter(group=self.group1).order_by('name'))
+        with self.assertNumQueries(0):
+            form = PhotoTagAssignmentForm(group=self.group1, selected_tags=[self.tag_g1_nature], group_tags=group_tags)
+            choices = list(form.fields['tags_to_assign'].choices)
+        # Selected tags come first, then the rest in name order
+        self.assertEqual([label for _, label in choices], ['Nature', 'City'])
+
     def test_tagfilter_form_queryset(self):
         form_g1 = TagFilterForm(group=self.group1)
         self.assertIn(self.tag_g1_nature, form_g1.fields['tags_to_filter_by'].queryset)
@@ -241,6 +423,27 @@ class PhotoShareTestCase(TestCase):
         self.assertIn(self.group1, response.context['groups'])
         self.assertIn(self.group2, response.context['groups'])
 
+    def test_group_list_view_shows_counters(self):
+        self.client.login(username='user2', password='password123')
+        response = self.client.get(reverse('group_list'))
+        self.assertContains(response, "Members: 2") # group1
+        self.assertContains(response, "Members: 1") # group2
+        self.assertContains(response, "Photos: 2 · Tags: 2", count=2)
+
+    def test_group_list_view_conditional_get(self):
+        self.client.login(username='user2', password='password123')
+        response = self.client.get(reverse('group_list'))
+        etag = response.headers['ETag']
+        self.assertIn('no-cache', response.headers['Cache-Control'])
+
+        response = self.client.get(reverse('group_list'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        Tag.objects.create(name="Sunset", group=self.group2)
+        response = self.client.get(reverse('group_list'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers['ETag'], etag)
+
     # GroupDetailView Tests
     def test_group_detail_view_unauthenticated(self):
         response = self.client.get(reverse('group_detail', kwargs={'pk': self.group1.pk}))
@@ -287,6 +490,421 @@ class PhotoShareTestCase(TestCase):
         self.assertIn(self.photo1_user1.id, photo_ids_in_list)
         self.assertIn(self.photo2_user1.id, photo_ids_in_list)
 
+    def test_group_detail_view_tag_query(self):
+        self.client.login(username='user1', password='password123')
+        url = reverse('group_detail', kwargs={'pk': self.group1.pk})
+        Tag.objects.create(name="Night Sky", group=self.group1)
+        cases = {
+            'nature NOT city': {self.photo1_user1},
+            'CITY or nature': {self.photo1_user1, self.photo2_user1},
+            'nature AND (city OR "night sky")': {self.photo2_user1},
+            'NOT nature': set(),
+            '"Night Sky"': set(),
+        }
+        for tag_query, expected_photos in cases.items():
+            with self.subTest(tag_query=tag_query):
+                response = self.client.get(url, {'tag_query': tag_query})
+                self.assertEqual({item['photo'] for item in response.context['photo_details_list']}, expected_photos)
+
+        # Ticked tags are ANDed with the query
+        response = self.client.get(url, {'tag_query': 'nature', 'tags_to_filter_by': self.tag_g1_city.id})
+        self.assertEqual([item['photo'] for item in response.context['photo_details_list']], [self.photo2_user1])
+
+    def test_group_detail_view_tag_query_errors(self):
+        self.client.login(username='user1', password='password123')
+        url = reverse('group_detail', kwargs={'pk': self.group1.pk})
+        for tag_query, message in (('nature AND', "Incomplete tag query."),
+                                   ('(nature OR city', "Missing closing parenthesis in the tag query."),
+                                   ('animal', "Unknown tag &#x27;animal&#x27; (quote names that contain spaces)."),
+                                   ('(' * 240 + 'nature' + ')' * 240, "Query is nested too deeply."),
+                                   ('NOT ' * 120 + 'nature', "Query is nested too deeply.")):
+            with self.subTest(tag_query=tag_query):
+                response = self.client.get(url, {'tag_query': tag_query})
+                self.assertContains(response, message)
+                self.assertEqual(len(response.context['photo_cards']), 2) # Unfiltered
+
+    def test_group_detail_view_tag_facets(self):
+        self.client.login(username='user1', password='password123')
+        url = reverse('group_detail', kwargs={'pk': self.group1.pk})
+
+        def facet_counts(response):
+            return {facet['tag']: facet['count'] for facet in response.context['tag_facets']}
+
+        nature, city = self.tag_g1_nature, self.tag_g1_city
+        self.assertEqual(facet_counts(self.client.get(url)), {nature: 2, city: 1})
+        self.assertEqual(facet_counts(self.client.get(url, {'tags_to_filter_by': city.id})), {nature: 1, city: 1})
+
+        # Tags that would empty the result are greyed out and can't be ticked
+        response = self.client.get(url, {'tag_query': 'nature NOT city'})
+        self.assertEqual(facet_counts(response), {nature: 1, city: 0})
+        self.assertRegex(response.content.decode(), rf'value="{city.id}"\s+id="[^"]+"\s+disabled')
+
+        with self.assertNumQueries(1):
+            counts = tag_facet_counts(PhotoTag.objects.filter(group=self.group1))
+        self.assertEqual(counts, {nature.id: 2, city.id: 1})
+
+        # Counts come from the cache until the group's version changes
+        self.client.get(url, {'tag_query': 'nature NOT city'})
+        self.assertEqual(get_cache_stats()['facets']['hits'], 1)
+        self.pt_g1_p1.tags.add(city)
+        self.assertEqual(facet_counts(self.client.get(url, {'tag_query': 'nature NOT city'})), {nature: 0, city: 0})
+
+    def test_download_group_photos_streams_filtered_zip(self):
+        self.client.login(username='user1', password='password123')
+        url = reverse('download_group_photos', kwargs={'group_pk': self.group1.pk})
+        detail = self.client.get(reverse('group_detail', kwargs={'pk': self.group1.pk}), {'tag_query': 'city'})
+        self.assertEqual(detail.context['download_url'], f"{url}?tag_query=city")
+
+        @contextlib.contextmanager
+        def open_photo(photo):
+            if photo.id == self.photo1_user1.id:
+                raise requests.ConnectionError("storage unreachable")
+            yield iter([b'image-', str(photo.id).encode()])
+
+        with mock.patch('core.downloads.open_photo', side_effect=open_photo), \
+                mock.patch('core.downloads.DOWNLOAD_BATCH_SIZE', 1):
+            response = self.client.get(url)
+            self.assertTrue(response.streaming)
+            self.assertEqual(response['Content-Type'], 'application/zip')
+            self.assertIn('group-1-alpha-photos.zip', response['Content-Disposition'])
+            archive = zipfile.ZipFile(BytesIO(b''.join(response.streaming_content)))
+
+            filtered = self.client.get(url, {'tags_to_filter_by': self.tag_g1_city.id})
+            filtered_archive = zipfile.ZipFile(BytesIO(b''.join(filtered.streaming_content)))
+
+        photo2_name = f"{self.photo2_user1.uploaded_at:%Y-%m-%d}_{self.photo2_user1.id}.png"
+        self.assertEqual(archive.namelist(), [photo2_name, 'manifest.csv'])
+        self.assertEqual(archive.read(photo2_name), f"image-{self.photo2_user1.id}".encode())
+        manifest = {row['photo_id']: row for row in csv.DictReader(archive.read('manifest.csv').decode().splitlines())}
+        self.assertEqual(manifest[str(self.photo2_user1.id)]['tags'], "City; Nature")
+        self.assertEqual(manifest[str(self.photo2_user1.id)]['error'], "")
+        self.assertEqual(manifest[str(self.photo1_user1.id)]['error'], "storage unreachable")
+        self.assertEqual(filtered_archive.namelist(), [photo2_name, 'manifest.csv'])
+
+        response = self.client.get(url, {'tag_query': 'nature AND'})
+        self.assertRedirects(response, reverse('group_detail', kwargs={'pk': self.group1.pk}) + '?tag_query=nature+AND',
+                             fetch_redirect_response=False)
+        self.client.login(username='user3', password='password123')
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_tag_query_compiles_to_single_query_without_joins(self):
+        tags = [self.tag_g1_nature, self.tag_g1_city]
+        tree = parse_tag_query('nature AND NOT (city OR nature)', tags)
+        self.assertEqual(canonical_tag_query(tree),
+                         f"({self.tag_g1_nature.id} and !({self.tag_g1_city.id} or {self.tag_g1_nature.id}))")
+        queryset = PhotoTag.objects.filter(group=self.group1).filter(compile_tag_query(tree))
+        with self.assertNumQueries(1):
+            self.assertEqual(list(queryset), [])
+        self.assertNotIn('JOIN', str(queryset.query))
+
+    def test_group_detail_view_paginates_with_cursor(self):
+        self.client.login(username='user1', password='password123')
+        url = reverse('group_detail', kwargs={'pk': self.group1.pk})
+        with mock.patch.object(GroupDetailView, 'photos_per_page', 1):
+            response = self.client.get(url)
+            self.assertEqual(len(response.context['photo_details_list']), 1)
+            next_page_url = response.context['next_page_url']
+            self.assertIn('cursor=', next_page_url)
+
+            response_page2 = self.client.get(next_page_url, HTTP_HX_REQUEST='true')
+            self.assertTemplateUsed(response_page2, 'core/partials/_group_photos_page.html')
+            self.assertTemplateNotUsed(response_page2, 'core/group_detail.html')
+            self.assertIsNone(response_page2.context['next_page_url'])
+
+        seen_photos = [response.context['photo_details_list'][0]['photo'],
+                       response_page2.context['photo_details_list'][0]['photo']]
+        self.assertCountEqual(seen_photos, [self.photo1_user1, self.photo2_user1])
+
+    def test_group_detail_view_next_page_keeps_filter(self):
+        self.client.login(username='user1', password='password123')
+        url = reverse('group_detail', kwargs={'pk': self.group1.pk}) + f"?tags_to_filter_by={self.tag_g1_nature.id}"
+        with mock.patch.object(GroupDetailView, 'photos_per_page', 1):
+            response = self.client.get(url)
+        self.assertIn(f"tags_to_filter_by={self.tag_g1_nature.id}", response.context['next_page_url'])
+
+    def test_group_detail_view_invalid_cursor(self):
+        self.client.login(username='user1', password='password123')
+        response = self.client.get(reverse('group_detail', kwargs={'pk': self.group1.pk}) + "?cursor=not-a-cursor")
+        self.assertEqual(response.status_code, 404)
+
+    def test_group_detail_view_query_count_constant(self):
+        self.client.login(username='user1', password='password123')
+        url = reverse('group_detail', kwargs={'pk': self.group1.pk})
+        with CaptureQueriesContext(connection) as baseline:
+            self.client.get(url)
+
+        for i in range(5):
+            photo = Photo.objects.create(image=get_temporary_image(f"bulk_{i}.png"), uploaded_by=self.user2)
+            PhotoTag.objects.create(photo=photo, group=self.group1).tags.add(self.tag_g1_city, self.tag_g1_nature)
+
+        with CaptureQueriesContext(connection) as more_photos:
+            response = self.client.get(url)
+        self.assertEqual(len(response.context['photo_details_list']), 7)
+        self.assertEqual(len(more_photos.captured_queries), len(baseline.captured_queries))
+
+    def test_group_detail_view_compact_cards(self):
+        self.client.login(username='user1', password='password123')
+        response = self.client.get(reverse('group_detail', kwargs={'pk': self.group1.pk}))
+        content = response.content.decode()
+        self.assertEqual(content.count('id="group-tag-vocabulary"'), 1)
+        self.assertEqual(response.context['group_tag_vocabulary'],
+                         [{'id': self.tag_g1_city.id, 'name': 'City'}, {'id': self.tag_g1_nature.id, 'name': 'Nature'}])
+        # Cards carry their current selection as hidden inputs, not a checkbox per group tag
+        self.assertNotIn('type="checkbox" name="tags_to_assign"', content)
+        self.assertIn(f'type="hidden" name="tags_to_assign" value="{self.tag_g1_city.id}"', content)
+
+    def test_group_detail_view_full_cards(self):
+        self.client.login(username='user1', password='password123')
+        with mock.patch.object(GroupDetailView, 'compact_cards', False):
+            response = self.client.get(reverse('group_detail', kwargs={'pk': self.group1.pk}))
+        content = response.content.decode()
+        self.assertNotIn('id="group-tag-vocabulary"', content)
+        self.assertIn('type="checkbox" name="tags_to_assign"', content)
+
+    def test_group_detail_view_serves_cached_page(self):
+        self.client.login(username='user1', password='password123')
+        url = reverse('group_detail', kwargs={'pk': self.group1.pk})
+        with CaptureQueriesContext(connection) as first:
+            self.client.get(url)
+        with CaptureQueriesContext(connection) as second:
+            response = self.client.get(url)
+        self.assertNotIn('photo_details_list', response.context) # Page came from the cache
+        self.assertEqual(len(response.context['photo_cards']), 2)
+        self.assertLess(len(second.captured_queries), len(first.captured_queries))
+        self.assertEqual(get_cache_stats()['page'], {'hits': 1, 'misses': 1, 'hit_ratio': 0.5})
+
+    def test_group_detail_view_cached_cards_use_requester_csrf_token(self):
+        url = reverse('group_detail', kwargs={'pk': self.group1.pk})
+        self.client.login(username='user1', password='password123')
+        self.client.get(url)
+        other_client = Client()
+        other_client.login(username='user2', password='password123')
+        response = other_client.get(url)
+        content = response.content.decode()
+        self.assertNotIn(CSRF_PLACEHOLDER, content)
+        self.assertIn(f'name="csrfmiddlewaretoken" value="{response.context["csrf_token"]}"', content)
+
+    def test_group_detail_view_cache_invalidated_by_tag_assignment(self):
+        self.client.login(username='user1', password='password123')
+        url = reverse('group_detail', kwargs={'pk': self.group1.pk})
+        self.client.get(url)
+        self.pt_g1_p1.tags.add(self.tag_g1_city)
+
+        response = self.client.get(url)
+        self.assertIn('photo_details_list', response.context)
+        self.assertContains(response, f'type="hidden" name="tags_to_assign" value="{self.tag_g1_city.id}"', count=2)
+        # Only the changed card was rendered again
+        self.assertEqual(get_cache_stats()['card'], {'hits': 1, 'misses': 3, 'hit_ratio': 0.25})
+
+    def test_cache_versions_bumped_by_tag_and_membership_changes(self):
+        def versions():
+            self.group1.refresh_from_db()
+            self.pt_g1_p1.refresh_from_db()
+            self.pt_g1_p2.refresh_from_db()
+            return self.group1.cache_version, self.pt_g1_p1.cache_version, self.pt_g1_p2.cache_version
+
+        group_version, p1_version, p2_version = versions()
+        self.tag_g1_city.delete() # Only on photo 2
+        self.assertEqual(versions(), (group_version + 2, p1_version, p2_version + 1))
+
+        group_version, p1_version, p2_version = versions()
+        self.group1.members.add(self.user3)
+        self.assertEqual(versions(), (group_version + 1, p1_version, p2_version))
+
+        group_version, p1_version, p2_version = versions()
+        self.client.login(username='user1', password='password123')
+        self.client.post(reverse('remove_photo_from_group',
+                                 kwargs={'group_pk': self.group1.pk, 'photo_pk': self.photo1_user1.pk}))
+        self.group1.refresh_from_db()
+        self.assertEqual(self.group1.cache_version, group_version + 1)
+
+    def test_views_stay_within_query_budgets_as_rows_grow(self):
+        # QUERY_BUDGET_STRICT makes any over-budget request below raise
+        extra_tags = [Tag.objects.create(name=f"Extra {i}", group=self.group1) for i in range(6)]
+        for i in range(6):
+            photo = Photo.objects.create(image=f"test/extra_{i}.png", uploaded_by=self.user2)
+            PhotoTag.objects.create(photo=photo, group=self.group1).tags.add(self.tag_g1_nature, *extra_tags)
+        User.objects.filter(pk=self.user1.pk).update(is_staff=True, is_superuser=True)
+        self.client.login(username='user1', password='password123')
+        tag_ids = [tag.id for tag in extra_tags]
+        group_pk = self.group1.pk
+
+        for url, params in ((reverse('group_list'), {}),
+                            (reverse('group_detail', kwargs={'pk': group_pk}), {}),
+                            (reverse('group_detail', kwargs={'pk': group_pk}), {'tags_to_filter_by': tag_ids[:2]}),
+                            (reverse('tag_autocomplete', kwargs={'group_pk': group_pk}), {'q': 'ex'}),
+                            *((reverse(f'admin:core_{model}_changelist'), {})
+                              for model in ('group', 'photo', 'tag', 'phototag', 'job'))):
+            with self.subTest(url=url, params=params):
+                self.assertEqual(self.client.get(url, params).status_code, 200)
+
+        response = self.client.post(
+            reverse('assign_photo_tags', kwargs={'group_pk': group_pk, 'photo_pk': self.photo1_user1.pk}),
+            {'tags_to_assign': tag_ids}, HTTP_HX_REQUEST='true'
+        )
+        self.assertEqual(response.status_code, 200)
+        response = self.bulk_assign('remove', Photo.objects.filter(group_tag_associations__group=self.group1), extra_tags)
+        self.assertEqual(response.status_code, 302)
+
+    def test_query_budget_middleware_logs_or_raises(self):
+        self.client.login(username='user1', password='password123')
+        with mock.patch.object(GroupListView, 'query_budget', 1):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.client.get(reverse('group_list'))
+            with override_settings(QUERY_BUDGET_STRICT=False), self.assertLogs('core.middleware', 'WARNING') as logs:
+                self.assertEqual(self.client.get(reverse('group_list')).status_code, 200)
+        self.assertIn("group_list ran", logs.output[0])
+        self.assertIn("(budget 1)", logs.output[0])
+
+    def test_query_recorder_groups_repeated_statements(self):
+        recorder = QueryRecorder()
+        with connection.execute_wrapper(recorder):
+            for phototag in PhotoTag.objects.all():
+                phototag.tags.count() # N+1
+        self.assertEqual(len(recorder.statements), 5)
+        self.assertEqual(recorder.duplicates()[0][0], 4)
+        self.assertIn("4x SELECT COUNT(*)", recorder.report('photo list', 2))
+
+    def test_profiling_header_for_staff_requests(self):
+        self.client.login(username='user1', password='password123')
+        url = reverse('group_detail', kwargs={'pk': self.group1.pk})
+        self.assertNotIn('Server-Timing', self.client.get(url, HTTP_X_TAGMI_PROFILE='1').headers) # Not staff
+        User.objects.filter(pk=self.user1.pk).update(is_staff=True)
+        self.assertNotIn('Server-Timing', self.client.get(url).headers) # No header
+
+        cache.clear() # Render every card again
+        response = self.client.get(url, HTTP_X_TAGMI_PROFILE='1')
+        timing = dict(entry.split(';', 1) for entry in response.headers['Server-Timing'].split(', '))
+        self.assertEqual(set(timing), {'db', 'tpl', 'storage', 'mw', 'view', 'total', 'cache-facets',
+                                       'cache-page', 'cache-card'})
+        self.assertRegex(timing['db'], r'^dur=[\d.]+;desc="\d+ queries"$')
+        self.assertEqual(timing['cache-card'], 'desc="0 hits 2 misses"')
+
+        with override_settings(PROFILING_LOG=True), self.assertLogs('core.middleware', 'INFO') as logs:
+            self.client.get(url, HTTP_X_TAGMI_PROFILE='1')
+        logged = json.loads(logs.records[0].getMessage())
+        self.assertEqual((logged['view'], logged['status']), ('group_detail', 200))
+        self.assertEqual(logged['cache']['page'], {'hits': 1, 'misses': 0})
+
+    def test_metrics_endpoint_aggregates_worker_files(self):
+        metrics_dir = tempfile.mkdtemp(prefix="tagmi_test_metrics_")
+        self.addCleanup(shutil.rmtree, metrics_dir, ignore_errors=True)
+        with override_settings(METRICS_DIR=metrics_dir), \
+                mock.patch.object(metrics, '_registry', MetricsRegistry(metrics_dir)):
+            self.client.login(username='user1', password='password123')
+            self.assertEqual(self.client.get(reverse('metrics')).status_code, 302) # Staff only
+            self.client.get(reverse('group_list'))
+            # Another worker's flushed figures
+            with open(os.path.join(metrics_dir, '999-1.json'), 'w') as worker_file:
+                json.dump({
+                    'counters': [['tagmi_http_requests_total',
+                                  [['method', 'GET'], ['status', '200'], ['view', 'group_list']], 2]],
+                    'histograms': [['tagmi_db_queries_per_request', [['view', 'group_list']],
+                                    [0, 0, 1, 0, 0, 0, 0, 0, 0, 3]]],
+                }, worker_file)
+            User.objects.filter(pk=self.user1.pk).update(is_staff=True)
+            response = self.client.get(reverse('metrics'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        body = response.content.decode()
+        self.assertIn('# TYPE tagmi_http_request_duration_seconds histogram', body)
+        self.assertIn('tagmi_http_requests_total{method="GET",status="200",view="group_list"} 3', body)
+        self.assertIn('tagmi_http_requests_total{method="GET",status="302",view="metrics"} 1', body)
+        self.assertIn('tagmi_db_queries_per_request_bucket{view="group_list",le="5"} 2', body)
+        self.assertIn('tagmi_db_queries_per_request_bucket{view="group_list",le="+Inf"} 2', body)
+        self.assertIn('tagmi_db_queries_per_request_count{view="group_list"} 2', body)
+        self.assertRegex(body, r'tagmi_http_response_bytes_total\{view="group_list"\} [1-9]\d*')
+
+    def test_metrics_merge_exited_workers(self):
+        metrics_dir = tempfile.mkdtemp(prefix="tagmi_test_metrics_")
+        self.addCleanup(shutil.rmtree, metrics_dir, ignore_errors=True)
+
+        def write_worker_file(name, requests_total):
+            with open(os.path.join(metrics_dir, name), 'w') as worker_file:
+                json.dump({
+                    'counters': [['tagmi_uploads_total', [['outcome', 'created']], requests_total]],
+                    'histograms': [['tagmi_db_queries_per_request', [['view', 'group_list']],
+                                    [0, 0, requests_total, 0, 0, 0, 0, 0, 0, 3]]],
+                }, worker_file)
+
+        write_worker_file('998-1.json', 2) # Exited
+        write_worker_file('999-1.json', 1) # Running
+        write_worker_file('998-2.json', 4) # Exited, with the same pid
+        with mock.patch('core.metrics._is_running', side_effect=lambda pid: pid == 999):
+            self.assertEqual(sorted(metrics.merge_exited_workers(metrics_dir)), ['998-1.json', '998-2.json'])
+            write_worker_file('997-1.json', 8) # A later restart
+            self.assertEqual(metrics.merge_exited_workers(metrics_dir), ['997-1.json'])
+        self.assertEqual(
+            sorted(name for name in os.listdir(metrics_dir) if name.endswith('.json')),
+            ['999-1.json', metrics.AGGREGATE_FILE],
+        )
+        with override_settings(METRICS_DIR=metrics_dir), \
+                mock.patch.object(metrics, '_registry', MetricsRegistry(metrics_dir)):
+            counters, histograms = metrics.collect()
+            # Readers wait for a merge in progress
+            collected = []
+            with metrics._files_lock(Path(metrics_dir), fcntl.LOCK_EX):
+                reader = threading.Thread(target=lambda: collected.append(metrics.collect()))
+                reader.start()
+                reader.join(timeout=0.2)
+                self.assertEqual(collected, [])
+            reader.join(timeout=5)
+        self.assertEqual(counters['tagmi_uploads_total', (('outcome', 'created'),)], 15)
+        self.assertEqual(histograms['tagmi_db_queries_per_request', (('view', 'group_list'),)][2], 15)
+        self.assertEqual(collected[0][0], counters)
+
+    def test_upload_metrics(self):
+        registry = MetricsRegistry(tempfile.gettempdir()) # Never flushed here
+        image = get_pillow_image()
+        with mock.patch.object(metrics, '_registry', registry), \
+                mock.patch('core.uploads.stage_image', return_value="test/staged.jpg"):
+            bulk_upload_photos([image, get_pillow_image()], self.user1, [self.group1])
+        self.assertEqual(registry.counters['tagmi_uploads_total', (('outcome', 'created'),)], 1)
+        self.assertEqual(registry.counters['tagmi_uploads_total', (('outcome', 'reused'),)], 1)
+        self.assertEqual(registry.counters['tagmi_upload_bytes_total', ()], 2 * image.size)
+        renditions = registry.histograms['tagmi_storage_call_duration_seconds', (('operation', 'rendition'),)]
+        self.assertEqual(sum(renditions[:-1]), 4) # Two sizes in two formats
+
+    def test_cache_stats_view_staff_only(self):
+        self.client.login(username='user1', password='password123')
+        self.assertEqual(self.client.get(reverse('cache_stats')).status_code, 302)
+        User.objects.filter(pk=self.user1.pk).update(is_staff=True)
+        response = self.client.get(reverse('cache_stats'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.json()), {'card', 'page', 'facets'})
+
+    def test_group_detail_view_conditional_get(self):
+        self.client.login(username='user1', password='password123')
+        url = reverse('group_detail', kwargs={'pk': self.group1.pk})
+        etag = self.client.get(url).headers['ETag']
+
+        with self.assertNumQueries(3): # Session, user and the group's version
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        # Filter parameters are part of the validator
+        filter_url = f"{url}?tags_to_filter_by={self.tag_g1_city.id}"
+        self.assertEqual(self.client.get(filter_url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        for change in (lambda: self.pt_g1_p1.tags.add(self.tag_g1_city),
+                       lambda: PhotoTag.objects.create(photo=self.photo3_user2, group=self.group1),
+                       lambda: self.group1.members.add(self.user3)):
+            change()
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            etag = response.headers['ETag']
+
+    def test_group_detail_view_no_304_with_pending_messages(self):
+        self.client.login(username='user1', password='password123')
+        url = reverse('group_detail', kwargs={'pk': self.group1.pk})
+        etag = self.client.get(url).headers['ETag']
+        # Rejected without changing anything, but its error message must be shown
+        self.client.post(reverse('add_group_tag', kwargs={'group_pk': self.group1.pk}), {'tag_name': ''})
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Tag name cannot be empty.")
+
     def test_group_detail_view_non_existent_group(self):
         self.client.login(username='user1', password='password123')
         response = self.client.get(reverse('group_detail', kwargs={'pk': 9999}))
@@ -360,6 +978,194 @@ class PhotoShareTestCase(TestCase):
         self.assertEqual(str(messages[0]), "Invalid or no accessible groups selected.")
 
 
+    def test_handle_multiple_images_upload_reports_per_file_failures(self):
+        self.client.login(username='user1', password='password123')
+        initial_photo_count = Photo.objects.count()
+        images = [get_temporary_image("broken.png"), get_another_temporary_image("fine.png")]
+        with mock.patch('core.uploads.stage_image', side_effect=[ValueError("Storage unavailable"), "test/fine"]):
+            response = self.client.post(reverse('upload_photo'),
+                                        data={'groups': [self.group1.id, self.group2.id], 'images': images})
+        self.assertRedirects(response, reverse('group_list'))
+        self.assertEqual(Photo.objects.count(), initial_photo_count + 1)
+        new_photo = Photo.objects.latest('id')
+        self.assertEqual(new_photo.group_tag_associations.count(), 1) # user1 is not a member of group2
+        messages = [str(m) for m in get_messages(response.wsgi_request)]
+        self.assertEqual(messages, ["Could not upload 'broken.png': Storage unavailable",
+                                    "1 photo(s) uploaded and associated with 1 group entries."])
+
+    def test_handle_multiple_images_upload_is_atomic(self):
+        self.client.login(username='user1', password='password123')
+        initial_photo_count = Photo.objects.count()
+        images = [get_temporary_image("a.png"), get_another_temporary_image("b.png")]
+        with mock.patch('core.uploads.stage_image', side_effect=["test/a", "test/b"]), \
+             mock.patch('core.uploads.discard_staged_image') as discard, \
+             mock.patch.object(PhotoTag.objects, 'bulk_create', side_effect=DatabaseError):
+            response = self.client.post(reverse('upload_photo'), data={'groups': [self.group1.id], 'images': images})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Photo.objects.count(), initial_photo_count)
+        self.assertEqual(discard.call_count, 2)
+
+    def test_handle_multiple_images_upload_reuses_duplicate_photo(self):
+        self.client.login(username='user2', password='password123')
+        with mock.patch('core.uploads.stage_image', return_value="test/first") as stage:
+            self.client.post(reverse('upload_photo'),
+                             data={'groups': [self.group1.id], 'images': [get_pillow_image("first.jpg")]}, follow=True)
+        self.assertEqual(stage.call_count, 1)
+        photo = Photo.objects.latest('id')
+        self.assertEqual(len(photo.content_hash), 64)
+        initial_photo_count = Photo.objects.count()
+
+        # Same bytes again, twice in one batch, now for both groups
+        with mock.patch('core.uploads.stage_image') as stage:
+            response = self.client.post(reverse('upload_photo'), data={
+                'groups': [self.group1.id, self.group2.id],
+                'images': [get_pillow_image("again.jpg"), get_pillow_image("again_copy.jpg")],
+            })
+        self.assertRedirects(response, reverse('group_list'))
+        stage.assert_not_called()
+        self.assertEqual(Photo.objects.count(), initial_photo_count)
+        self.assertEqual(set(photo.group_tag_associations.values_list('group_id', flat=True)),
+                         {self.group1.id, self.group2.id})
+        messages = [str(m) for m in get_messages(response.wsgi_request)]
+        self.assertEqual(messages, ["2 photo(s) had already been uploaded; they were added to the selected groups where missing."])
+
+    def test_handle_multiple_images_upload_duplicate_from_other_uploader_not_reused(self):
+        self.client.login(username='user2', password='password123')
+        with mock.patch('core.uploads.stage_image', side_effect=["test/user2_copy"]):
+            self.client.post(reverse('upload_photo'), data={'groups': [self.group1.id], 'images': [get_pillow_image("mine.jpg")]})
+        self.client.login(username='user1', password='password123')
+        initial_photo_count = Photo.objects.count()
+        with mock.patch('core.uploads.stage_image', side_effect=["test/user1_copy"]):
+            self.client.post(reverse('upload_photo'), data={'groups': [self.group1.id], 'images': [get_pillow_image("mine.jpg")]})
+        self.assertEqual(Photo.objects.count(), initial_photo_count + 1)
+
+    def test_handle_multiple_images_upload_updates_photo_count(self):
+        self.client.login(username='user1', password='password123')
+        with mock.patch('core.uploads.stage_image', side_effect=["test/c1", "test/c2"]):
+            self.client.post(reverse('upload_photo'), data={
+                'groups': [self.group1.id],
+                'images': [get_temporary_image("c1.png"), get_another_temporary_image("c2.png")],
+            })
+        self.group1.refresh_from_db()
+        self.assertEqual(self.group1.photo_count, 4)
+
+    @override_settings(ASYNC_UPLOADS=True)
+    def test_handle_multiple_images_upload_async_queues_job(self):
+        self.client.login(username='user1', password='password123')
+        initial_photo_count = Photo.objects.count()
+        images = [get_temporary_image("queued1.png"), get_another_temporary_image("queued2.png")]
+        response = self.client.post(reverse('upload_photo'), data={'groups': [self.group1.id], 'images': images})
+
+        job = Job.objects.get(created_by=self.user1)
+        self.assertRedirects(response, reverse('upload_job_status', kwargs={'job_pk': job.pk}))
+        self.assertEqual(job.status, Job.Status.PENDING)
+        self.assertEqual(job.files.count(), 2)
+        self.assertEqual(Photo.objects.count(), initial_photo_count) # Nothing stored in the request
+
+        with mock.patch('core.uploads.stage_image', side_effect=["test/queued1", "test/queued2"]):
+            call_command('run_worker', '--once', stdout=mock.MagicMock())
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.Status.DONE)
+        self.assertEqual(job.result['uploaded'], 2)
+        self.assertEqual(job.files.count(), 0)
+        self.assertEqual(Photo.objects.count(), initial_photo_count + 2)
+
+        status_response = self.client.get(reverse('upload_job_status', kwargs={'job_pk': job.pk}), HTTP_HX_REQUEST='true')
+        self.assertTemplateUsed(status_response, 'core/partials/_upload_job_status.html')
+        self.assertNotContains(status_response, 'hx-trigger="every 2s"') # Polling stops once finished
+
+    def test_upload_job_reports_reused_photo(self):
+        with mock.patch('core.uploads.stage_image', return_value="test/first"):
+            photo = bulk_upload_photos([get_pillow_image("first.jpg")], self.user2, [self.group1])[0].photo
+        job = enqueue_photo_upload(self.user2, [get_pillow_image("again.jpg")], [self.group1, self.group2])
+        with mock.patch('core.uploads.stage_image') as stage:
+            run_job(claim_next_job())
+        stage.assert_not_called()
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.Status.DONE)
+        self.assertEqual(job.result['group_entries'], 1) # Only the missing group2 link
+        self.assertEqual(job.result['files'], [{
+            'name': "again.jpg", 'ok': True, 'error': '', 'photo_id': photo.id, 'duplicate': True, 'group_entries': 1,
+        }])
+
+        self.client.login(username='user2', password='password123')
+        response = self.client.get(reverse('upload_job_status', kwargs={'job_pk': job.pk}))
+        self.assertContains(response, "already uploaded")
+
+    def test_upload_job_status_view_other_user(self):
+        job = Job.objects.create(kind='upload_photos', created_by=self.user2)
+        self.client.login(username='user1', password='password123')
+        response = self.client.get(reverse('upload_job_status', kwargs={'job_pk': job.pk}))
+        self.assertEqual(response.status_code, 404)
+
+    def test_job_retries_then_fails(self):
+        job = Job.objects.create(kind='upload_photos', created_by=self.user1, max_attempts=2)
+        with mock.patch('core.jobs.bulk_upload_photos', side_effect=RuntimeError("boom")):
+            run_job(claim_next_job())
+            job.refresh_from_db()
+            self.assertEqual(job.status, Job.Status.PENDING)
+            self.assertGreater(job.run_after, job.started_at)
+            self.assertIsNone(claim_next_job()) # Backing off
+
+            Job.objects.filter(pk=job.pk).update(run_after=job.started_at)
+            run_job(claim_next_job())
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.Status.FAILED)
+        self.assertEqual(job.attempts, 2)
+        self.assertEqual(job.last_error, "RuntimeError: boom")
+
+    def test_upload_job_retries_files_storage_rejected(self):
+        job = enqueue_photo_upload(self.user1, [get_temporary_image("r1.png"), get_another_temporary_image("r2.png")], [self.group1])
+        with mock.patch('core.uploads.stage_image', side_effect=OSError("storage unavailable")):
+            run_job(claim_next_job())
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.Status.PENDING)
+        self.assertGreater(job.run_after, job.started_at)
+        self.assertIn("storage unavailable", job.last_error)
+        self.assertEqual(job.files.count(), 2)
+
+        # Only the file that failed again is kept for the next attempt
+        Job.objects.filter(pk=job.pk).update(run_after=job.started_at)
+        with mock.patch('core.uploads.stage_image', side_effect=[OSError("storage unavailable"), "test/r2"]):
+            run_job(claim_next_job())
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.Status.PENDING)
+        self.assertEqual(list(job.files.values_list('name', flat=True)), ["r1.png"])
+
+        Job.objects.filter(pk=job.pk).update(run_after=job.started_at)
+        with mock.patch('core.uploads.stage_image', return_value="test/r1") as stage:
+            run_job(claim_next_job())
+        self.assertEqual(stage.call_count, 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.Status.DONE)
+        self.assertEqual(job.result['uploaded'], 2)
+        self.assertEqual(sorted(entry['name'] for entry in job.result['files']), ["r1.png", "r2.png"])
+        self.assertEqual(job.files.count(), 0)
+
+    def test_create_renditions_local_storage(self):
+        create_renditions([(self.photo1_user1, get_pillow_image())])
+        renditions = self.photo1_user1.renditions.all()
+        self.assertEqual(renditions.count(), 2 * len(RENDITION_SIZES))
+        for rendition in renditions:
+            self.assertLessEqual(max(rendition.width, rendition.height), rendition.size)
+            self.assertTrue(rendition.file.storage.exists(rendition.file.name))
+        small_jpeg = renditions.get(format=PhotoRendition.Format.JPEG, size=400)
+        self.assertEqual((small_jpeg.width, small_jpeg.height), (400, 300))
+        self.assertEqual(self.photo1_user1.thumbnail_url, small_jpeg.file.url)
+        self.assertIn(f"{small_jpeg.file.url} 400w", self.photo1_user1.jpeg_srcset)
+
+    def test_create_renditions_skips_undecodable_images(self):
+        self.assertEqual(create_renditions([(self.photo1_user1, get_temporary_image("broken.png"))]), [])
+        photo = Photo.objects.get(pk=self.photo1_user1.pk)
+        self.assertEqual(photo.thumbnail_url, photo.image.url)
+
+    def test_group_detail_view_uses_rendition_srcset(self):
+        create_renditions([(self.photo2_user1, get_pillow_image())])
+        self.client.login(username='user1', password='password123')
+        response = self.client.get(reverse('group_detail', kwargs={'pk': self.group1.pk}))
+        self.assertContains(response, 'type="image/webp"', count=1)
+        self.assertContains(response, self.photo2_user1.webp_srcset)
+
     # Tag Management Views
     def test_add_group_tag_view_unauthenticated(self):
         response = self.client.post(reverse('add_group_tag', kwargs={'group_pk': self.group1.pk}), {'tag_name': 'Test'})
@@ -390,6 +1196,140 @@ class PhotoShareTestCase(TestCase):
         messages = list(get_messages(response.wsgi_request))
         self.assertEqual(str(messages[0]), "Tag name cannot be empty.")
 
+    def test_add_group_tag_view_existing_tag_spacing_and_case(self):
+        self.client.login(username='user1', password='password123')
+        Tag.objects.create(name="Night Sky", group=self.group1)
+        self.client.post(reverse('add_group_tag', kwargs={'group_pk': self.group1.pk}), {'tag_name': 'night   SKY'})
+        self.assertEqual(Tag.objects.filter(group=self.group1, name_key='night sky').count(), 1)
+
+    def test_tag_name_key_unique_within_group(self):
+        self.assertEqual(self.tag_g1_nature.name_key, 'nature')
+        with self.assertRaises(django_db_utils.IntegrityError):
+            Tag.objects.create(name="NATURE", group=self.group1)
+
+    def test_tag_autocomplete_view_ranked_by_usage(self):
+        self.client.login(username='user1', password='password123')
+        url = reverse('tag_autocomplete', kwargs={'group_pk': self.group1.pk})
+        Tag.objects.create(name="Cityscape", group=self.group1)
+        response = self.client.get(url)
+        self.assertEqual(response.json()['results'], [
+            {'id': self.tag_g1_nature.id, 'name': 'Nature', 'usage': 2},
+            {'id': self.tag_g1_city.id, 'name': 'City', 'usage': 1},
+            {'id': Tag.objects.get(name="Cityscape").id, 'name': 'Cityscape', 'usage': 0},
+        ])
+
+        response = self.client.get(url, {'q': 'CITYs'})
+        self.assertEqual([tag['name'] for tag in response.json()['results']], ['Cityscape'])
+
+        response = self.client.get(url, {'q': 'ci'}, HTTP_HX_REQUEST='true')
+        self.assertTemplateUsed(response, 'core/partials/_tag_suggestions.html')
+        self.assertContains(response, f'data-tag-id="{self.tag_g1_city.id}"')
+        self.assertNotContains(response, f'data-tag-id="{self.tag_g1_nature.id}"')
+
+    def test_tag_autocomplete_view_non_member(self):
+        self.client.login(username='user3', password='password123')
+        response = self.client.get(reverse('tag_autocomplete', kwargs={'group_pk': self.group1.pk}), {'q': 'n'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_tag_cooccurrence_counters_follow_tag_changes(self):
+        self.assertEqual(stored_tag_counts(), count_tags())
+        pairs, uploaders = stored_tag_counts([self.group1.pk])
+        self.assertEqual(pairs[self.group1.pk, self.tag_g1_nature.pk, self.tag_g1_nature.pk], 2)
+        self.assertEqual(pairs[self.group1.pk, self.tag_g1_city.pk, self.tag_g1_nature.pk], 1)
+        self.assertEqual(uploaders[self.group1.pk, self.user1.pk, self.tag_g1_nature.pk], 2)
+
+        self.client.login(username='user1', password='password123')
+        street = Tag.objects.create(name="Street", group=self.group1)
+        self.bulk_assign('add', [self.photo1_user1, self.photo2_user1], [street])
+        self.pt_g1_p1.tags.remove(self.tag_g1_nature)
+        self.pt_g1_p2.tags.set([self.tag_g1_city, street])
+        self.tag_g1_city.delete()
+        self.assertEqual(stored_tag_counts(), count_tags())
+        self.pt_g1_p2.delete()
+        self.assertEqual(stored_tag_counts(), count_tags())
+        self.assertEqual(stored_tag_counts([self.group1.pk])[0], {(self.group1.pk, street.pk, street.pk): 1})
+
+        call_command('rebuild_tag_cooccurrence', '--check', stdout=mock.MagicMock())
+        TagCooccurrence.objects.filter(tag=street).update(count=5)
+        with self.assertRaises(CommandError):
+            call_command('rebuild_tag_cooccurrence', '--check', stdout=mock.MagicMock())
+        call_command('rebuild_tag_cooccurrence', stdout=mock.MagicMock())
+        self.assertEqual(find_cooccurrence_drift(), [])
+
+    def test_tag_autocomplete_view_ranks_suggestions_for_photo(self):
+        self.client.login(username='user2', password='password123')
+        url = reverse('tag_autocomplete', kwargs={'group_pk': self.group1.pk})
+        street = Tag.objects.create(name="Street", group=self.group1)
+        cityscape = Tag.objects.create(name="Cityscape", group=self.group1)
+        self.pt_g1_p2.tags.add(street)
+        photo = Photo.objects.create(image=get_temporary_image("p4.png"), uploaded_by=self.user2)
+        PhotoTag.objects.create(photo=photo, group=self.group1).tags.add(self.tag_g1_city)
+
+        # Nature and Street each come with City on half of its photos; Nature is used more
+        response = self.client.get(url, {'photo': photo.pk})
+        self.assertEqual([tag['id'] for tag in response.json()['results']], [self.tag_g1_nature.pk, street.pk, cityscape.pk])
+        self.group1.refresh_from_db()
+        self.assertIsNotNone(cache.get(model_cache_key(self.group1)))
+
+        # On photo1, City and Street both follow Nature and user1's own tagging; City is used more
+        response = self.client.get(url, {'photo': self.photo1_user1.pk, 'q': 's'}, HTTP_HX_REQUEST='true')
+        self.assertContains(response, f'data-tag-id="{street.pk}"')
+        self.assertNotContains(response, f'data-tag-id="{cityscape.pk}"')
+        response = self.client.get(url, {'photo': self.photo1_user1.pk})
+        self.assertEqual([tag['name'] for tag in response.json()['results']], ['City', 'Street', 'Cityscape'])
+
+        # Photos outside the group fall back to the usage ranking of every tag
+        response = self.client.get(url, {'photo': self.photo3_user2.pk})
+        self.assertEqual([tag['name'] for tag in response.json()['results']], ['City', 'Nature', 'Street', 'Cityscape'])
+        # So do ids that are not ASCII digits
+        response = self.client.get(url, {'photo': '²'})
+        self.assertEqual([tag['name'] for tag in response.json()['results']], ['City', 'Nature', 'Street', 'Cityscape'])
+
+    def test_similar_photos_and_duplicate_review(self):
+        def png(image, name):
+            buffer = BytesIO()
+            image.save(buffer, 'PNG')
+            return SimpleUploadedFile(name, buffer.getvalue(), 'image/png')
+
+        base = PILImage.effect_mandelbrot((320, 240), (-2.2, -1.2, 1.0, 1.2), 60)
+        files = [
+            png(base, "base.png"),
+            png(base.crop((14, 0, 320, 240)), "burst.png"), # 6 bits away
+            png(base.crop((20, 0, 320, 240)), "shifted.png"), # 8 bits away
+            png(PILImage.radial_gradient('L'), "other.png"),
+        ]
+        with mock.patch('core.uploads.stage_image', side_effect=["test/base", "test/burst", "test/shifted", "test/other"]):
+            base_photo, burst, shifted, other = [result.photo for result in bulk_upload_photos(files, self.user1, [self.group1])]
+        self.assertEqual(PhotoHashBand.objects.filter(group=self.group1).count(), 16)
+
+        self.client.login(username='user1', password='password123')
+        url = reverse('similar_photos', kwargs={'group_pk': self.group1.pk, 'photo_pk': base_photo.pk})
+        response = self.client.get(url)
+        self.assertEqual([(match['photo_id'], match['distance']) for match in response.json()['results']], [(burst.pk, 6)])
+        response = self.client.get(url, {'distance': '8'})
+        self.assertEqual([match['photo_id'] for match in response.json()['results']], [burst.pk, shifted.pk])
+        response = self.client.get(url, {'distance': '²'}) # Not ASCII digits: the default distance
+        self.assertEqual([match['photo_id'] for match in response.json()['results']], [burst.pk])
+
+        # Links created one by one are indexed too
+        PhotoTag.objects.create(photo=base_photo, group=self.group2)
+        PhotoTag.objects.create(photo=burst, group=self.group2)
+        self.assertEqual([(phototag.photo, distance) for phototag, distance in similar_photos(
+            PhotoTag.objects.get(photo=burst, group=self.group2))], [(base_photo, 6)])
+
+        response = self.client.get(reverse('group_duplicates', kwargs={'group_pk': self.group1.pk}))
+        # Clusters chain similar photos: shifted is close to burst
+        self.assertEqual([[phototag.photo for phototag in cluster] for cluster in response.context['clusters']], [[base_photo, burst, shifted]])
+        response = self.client.post(reverse('bulk_remove_photos_from_group', kwargs={'group_pk': self.group1.pk}),
+                                    {'photos': [burst.pk, shifted.pk]}, follow=True)
+        self.assertRedirects(response, reverse('group_duplicates', kwargs={'group_pk': self.group1.pk}))
+        self.assertEqual(response.context['clusters'], [])
+        self.assertFalse(PhotoHashBand.objects.filter(group=self.group1, phototag__photo=burst).exists())
+        self.assertEqual(self.client.get(url).json()['results'], [])
+
+        self.client.login(username='user3', password='password123')
+        self.assertEqual(self.client.get(url).status_code, 404)
+
     def test_add_group_tag_view_non_member(self):
         self.client.login(username='user3', password='password123')
         response = self.client.post(reverse('add_group_tag', kwargs={'group_pk': self.group1.pk}), {'tag_name': 'Test'})
@@ -453,6 +1393,22 @@ class PhotoShareTestCase(TestCase):
         self.assertIn(self.tag_g1_nature, self.pt_g1_p1.tags.all())
 
 
+    def test_assign_photo_tags_view_htmx_returns_card_fragment(self):
+        self.client.login(username='user1', password='password123')
+        response = self.client.post(reverse('assign_photo_tags',
+                                            kwargs={'group_pk': self.group1.pk, 'photo_pk': self.photo1_user1.pk}),
+                                    data={'tags_to_assign': [self.tag_g1_city.id]},
+                                    HTTP_HX_REQUEST='true')
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, 'core/partials/_photo_card_fragment.html')
+        self.assertTemplateNotUsed(response, 'core/group_detail.html')
+        content = response.content.decode()
+        self.assertIn(f'id="photo-card-{self.photo1_user1.id}"', content)
+        self.assertNotIn(f'id="photo-card-{self.photo2_user1.id}"', content)
+        self.assertIn('id="messages-container"', content)
+        self.assertIn(f"Tags updated for photo in group &#x27;{self.group1.name}&#x27;.", content)
+        self.assertEqual(list(response.context['detail_item']['current_tags_on_photo']), [self.tag_g1_city])
+
     def test_assign_photo_tags_view_non_member(self):
         self.client.login(username='user3', password='password123')
         response = self.client.post(reverse('assign_photo_tags', 
@@ -494,6 +1450,88 @@ class PhotoShareTestCase(TestCase):
                                                     'tag_pk': self.tag_g1_nature.pk}))
         self.assertEqual(response.status_code, 404)
 
+    # Bulk Tag Assignment View
+    def bulk_assign(self, action, photos, tags, **extra):
+        return self.client.post(reverse('bulk_assign_photo_tags', kwargs={'group_pk': self.group1.pk}), {
+            'action': action,
+            'photos': [photo.pk for photo in photos],
+            'tags': [tag.pk for tag in tags],
+            **extra,
+        })
+
+    def test_bulk_assign_photo_tags_add_remove_replace(self):
+        self.client.login(username='user1', password='password123')
+        photos = [self.photo1_user1, self.photo2_user1]
+
+        response = self.bulk_assign('add', photos, [self.tag_g1_city])
+        self.assertRedirects(response, reverse('group_detail', kwargs={'pk': self.group1.pk}))
+        self.assertEqual(set(self.pt_g1_p1.tags.all()), {self.tag_g1_nature, self.tag_g1_city})
+        self.assertEqual(set(self.pt_g1_p2.tags.all()), {self.tag_g1_nature, self.tag_g1_city})
+
+        self.bulk_assign('remove', photos, [self.tag_g1_nature])
+        self.assertEqual(set(self.pt_g1_p1.tags.all()), {self.tag_g1_city})
+        self.assertEqual(set(self.pt_g1_p2.tags.all()), {self.tag_g1_city})
+
+        response = self.bulk_assign('replace', [self.photo1_user1], [self.tag_g1_nature], tags_to_filter_by=[self.tag_g1_city.pk])
+        self.assertRedirects(response, reverse('group_detail', kwargs={'pk': self.group1.pk}) + f"?tags_to_filter_by={self.tag_g1_city.pk}",
+                             fetch_redirect_response=False)
+        self.assertEqual(set(self.pt_g1_p1.tags.all()), {self.tag_g1_nature})
+        self.assertEqual(set(self.pt_g1_p2.tags.all()), {self.tag_g1_city})
+        messages = list(get_messages(response.wsgi_request))
+        self.assertEqual(str(messages[-1]), "Tags updated on 1 photo(s): 1 added, 1 removed.")
+        self.assertEqual(find_tag_id_drift(), [])
+
+    def test_bulk_assign_tags_counts_only_inserted_links(self):
+        through = PhotoTag.tags.through
+        bulk_create = through.objects.bulk_create
+
+        def concurrent_bulk_create(rows, **kwargs):
+            through.objects.create(phototag=self.pt_g1_p1, tag=self.tag_g1_city) # Assigned meanwhile
+            return bulk_create(rows, **kwargs)
+
+        with mock.patch.object(through.objects, 'bulk_create', side_effect=concurrent_bulk_create):
+            counts = bulk_assign_tags(self.group1, [self.photo1_user1.pk, self.photo2_user1.pk],
+                                      [self.tag_g1_city.pk, self.tag_g1_nature.pk], BULK_ADD)
+        self.assertEqual(counts, (2, 1, 0))
+        self.assertEqual(set(self.pt_g1_p2.tags.all()), {self.tag_g1_nature, self.tag_g1_city})
+
+    def test_bulk_assign_photo_tags_scoped_to_group(self):
+        self.client.login(username='user1', password='password123')
+        # photo3 is not in group1, and the Animal tag belongs to group2
+        self.bulk_assign('add', [self.photo1_user1, self.photo3_user2], [self.tag_g1_city])
+        self.assertFalse(PhotoTag.objects.filter(photo=self.photo3_user2, group=self.group1).exists())
+        self.assertEqual(set(self.pt_g1_p1.tags.all()), {self.tag_g1_nature})
+
+        self.bulk_assign('add', [self.photo1_user1], [self.tag_g2_animal])
+        self.assertEqual(set(self.pt_g1_p1.tags.all()), {self.tag_g1_nature})
+
+        self.client.login(username='user3', password='password123')
+        response = self.bulk_assign('add', [self.photo1_user1], [self.tag_g1_city])
+        self.assertEqual(response.status_code, 404)
+
+    def test_bulk_assign_photo_tags_query_count_constant(self):
+        self.client.login(username='user1', password='password123')
+        with CaptureQueriesContext(connection) as two_photos:
+            self.bulk_assign('add', [self.photo1_user1, self.photo2_user1], [self.tag_g1_city])
+
+        photos = [self.photo1_user1, self.photo2_user1]
+        for i in range(10):
+            photo = Photo.objects.create(image=get_temporary_image(f"bulk_{i}.png"), uploaded_by=self.user1)
+            PhotoTag.objects.create(photo=photo, group=self.group1)
+            photos.append(photo)
+        with CaptureQueriesContext(connection) as twelve_photos:
+            self.bulk_assign('replace', photos, [self.tag_g1_nature, self.tag_g1_city])
+        self.assertEqual(len(twelve_photos.captured_queries), len(two_photos.captured_queries) + 1) # replace's DELETE
+        self.assertEqual(PhotoTag.tags.through.objects.filter(phototag__group=self.group1).count(), 24)
+
+    def test_bulk_assign_photo_tags_invalidates_cards(self):
+        self.client.login(username='user1', password='password123')
+        self.pt_g1_p1.refresh_from_db()
+        version = self.pt_g1_p1.cache_version
+        self.bulk_assign('add', [self.photo1_user1], [self.tag_g1_city])
+        self.pt_g1_p1.refresh_from_db()
+        self.assertEqual(self.pt_g1_p1.cache_version, version + 1)
+
     # Remove Photo From Group View
     def test_remove_photo_from_group_view_success(self):
         self.client.login(username='user1', password='password123')
@@ -511,6 +1549,17 @@ class PhotoShareTestCase(TestCase):
         self.assertTrue(PhotoTag.objects.filter(photo=self.photo1_user1, group=self.group2).exists())
 
 
+    def test_remove_photo_from_group_view_htmx_returns_messages_only(self):
+        self.client.login(username='user1', password='password123')
+        response = self.client.post(reverse('remove_photo_from_group',
+                                            kwargs={'group_pk': self.group1.pk, 'photo_pk': self.photo1_user1.pk}),
+                                    HTTP_HX_REQUEST='true')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(PhotoTag.objects.filter(photo=self.photo1_user1, group=self.group1).exists())
+        content = response.content.decode()
+        self.assertNotIn('id="photo-card-', content)
+        self.assertIn('id="messages-container"', content)
+
     def test_remove_photo_from_group_view_non_member(self):
         self.client.login(username='user3', password='password123')
         response = self.client.post(reverse('remove_photo_from_group', 
@@ -524,4 +1573,58 @@ class PhotoShareTestCase(TestCase):
                                     follow=True)
         self.assertFalse(PhotoTag.objects.filter(photo=self.photo3_user2, group=self.group1).exists())
         messages = list(get_messages(response.wsgi_request))
-        self.assertEqual(str(messages[0]), f"Photo removed from group '{self.group1.name}'.")
\ No newline at end of file
+        self.assertEqual(str(messages[0]), f"Photo removed from group '{self.group1.name}'.")
+
+    # Async views (tagmi.urls_async, the ASGI deployment profile)
+    @override_settings(ROOT_URLCONF='tagmi.urls_async')
+    async def test_async_group_detail_and_tag_views(self):
+        self.assertEqual(resolve(reverse('group_detail', kwargs={'pk': self.group1.pk})).func,
+                         async_views.group_detail_view)
+        await self.async_client.aforce_login(self.user1)
+        response = await self.async_client.get(reverse('group_detail', kwargs={'pk': self.group1.pk}))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'id="photo-card-')
+        response = await self.async_client.get(reverse('group_detail', kwargs={'pk': self.group2.pk}))
+        self.assertEqual(response.status_code, 404)
+
+        response = await self.async_client.get(
+            reverse('tag_autocomplete', kwargs={'group_pk': self.group1.pk}), {'q': 'na'}
+        )
+        self.assertEqual([result['name'] for result in response.json()['results']], ['Nature'])
+        response = await self.async_client.get(
+            reverse('tag_autocomplete', kwargs={'group_pk': self.group1.pk}), {'q': 'na', 'photo': '²'}
+        )
+        self.assertEqual([result['name'] for result in response.json()['results']], ['Nature'])
+
+        response = await self.async_client.post(
+            reverse('add_group_tag', kwargs={'group_pk': self.group1.pk}), {'tag_name': 'Sunset'}
+        )
+        self.assertRedirects(response, reverse('group_detail', kwargs={'pk': self.group1.pk}), fetch_redirect_response=False)
+        self.assertTrue(await Tag.objects.filter(group=self.group1, name='Sunset').aexists())
+
+        response = await self.async_client.post(
+            reverse('assign_photo_tags', kwargs={'group_pk': self.group1.pk, 'photo_pk': self.photo1_user1.pk}),
+            {'tags_to_assign': [self.tag_g1_city.id]}, headers={'HX-Request': 'true'},
+        )
+        self.assertContains(response, f'id="photo-card-{self.photo1_user1.pk}"')
+        self.assertEqual([tag.id async for tag in self.pt_g1_p1.tags.all()], [self.tag_g1_city.id])
+
+    @override_settings(ROOT_URLCONF='tagmi.urls_async')
+    async def test_async_upload_stages_files_concurrently(self):
+        # Both files have to be in stage_image() at once to get past the barrier
+        barrier = threading.Barrier(2, timeout=5)
+
+        def stage_image(image_file):
+            barrier.wait()
+            return f"test/{image_file.name}"
+
+        await self.async_client.aforce_login(self.user1)
+        initial_photo_count = await Photo.objects.acount()
+        with mock.patch('core.uploads.stage_image', side_effect=stage_image):
+            response = await self.async_client.post(reverse('upload_photo'), {
+                'groups': [self.group1.id],
+                'images': [get_temporary_image("a1.png"), get_another_temporary_image("a2.png")],
+            })
+        self.assertRedirects(response, reverse('group_list'), fetch_redirect_response=False)
+        self.assertEqual(await Photo.objects.acount(), initial_photo_count + 2)
+        self.assertEqual(await PhotoTag.objects.filter(group=self.group1, photo__image__startswith='test/a').acount(), 2)
@@ -0,0 +1,283 @@
+"""
+Batch upload pipeline used by handleMultipleImagesUpload.
+
+Every image is pushed to the Photo.image storage first, with failures
+recorded per file. All Photo and PhotoTag rows are then written with two
+bulk inserts in one transaction. If that transaction fails, the staged
+assets are deleted again, so an upload never leaves half-written data.
+Perceptual hashes (core.similarity) and thumbnail renditions of the saved
+photos are generated afterwards.
+
+Files are identified by a SHA-256 content hash. When the uploader already
+has a photo with the same content, that Photo is reused and only the
+missing group links are added, without another storage write.
+"""
+import asyncio
+import hashlib
+import logging
+from dataclasses import dataclass
+
+from asgiref.sync import sync_to_async
+from cloudinary import uploader
+from cloudinary.exceptions import Error as CloudinaryError
+from django.core.files.uploadhandler import FileUploadHandler
+from django.db import DatabaseError, transaction
+
+from .caching import bump_group_versions
+from .counters import recount_group_counters
+from .metrics import inc, storage_timer
+from .models import Photo, PhotoTag
+from .renditions import create_renditions
+from .similarity import index_phototags, record_perceptual_hashes
+
+logger = logging.getLogger(__name__)
+
+STAGING_ERRORS = (CloudinaryError, OSError, ValueError)
+
+# Files abulk_upload_photos() sends to storage at the same time
+UPLOAD_CONCURRENCY = 4
+
+
+@dataclass
+class UploadResult:
+    name: str
+    content_hash: str = ''
+    staged_image: object = None  # Storage value ready to be saved on Photo.image
+    photo: Photo = None
+    duplicate: bool = False  # The uploader already had this content; its Photo was reused
+    group_entries: int = 0  # PhotoTag rows created for this file
+    error: str = ''
+
+    @property
+    def ok(self):
+        return self.photo is not None
+
+
+class ContentHashUploadHandler(FileUploadHandler):
+    """
+    Hashes every uploaded file while its chunks stream in, ahead of the
+    handlers that store it. The digests are collected, in upload order, in
+    ``request.upload_content_hashes[field_name]``.
+    """
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        if self.request is not None:
+            self.request.upload_content_hashes = {}
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.hasher = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.hasher.update(raw_data)
+        return raw_data
+
+    def file_complete(self, file_size):
+        if self.request is not None:
+            self.request.upload_content_hashes.setdefault(self.field_name, []).append(self.hasher.hexdigest())
+        return None # Let the next handler build the file object
+
+
+def compute_content_hash(image_file):
+    hasher = hashlib.sha256()
+    if hasattr(image_file, 'seekable') and image_file.seekable():
+        image_file.seek(0)
+    for chunk in image_file.chunks():
+        hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def stage_image(image_file):
+    """Uploads one file to the Photo.image storage and returns the value to save on the field."""
+    image_field = Photo._meta.get_field('image')
+    options = {'type': image_field.type, 'resource_type': image_field.resource_type}
+    options.update(image_field.options)
+    if hasattr(image_file, 'seekable') and image_file.seekable():
+        image_file.seek(0)
+    with storage_timer('stage'):
+        return uploader.upload_resource(image_file, **options)
+
+
+def discard_staged_image(staged_image):
+    """Best-effort removal of a staged asset whose rows were never committed."""
+    public_id = getattr(staged_image, 'public_id', None)
+    if not public_id:
+        return
+    try:
+        with storage_timer('discard'):
+            uploader.destroy(public_id, type=staged_image.type, resource_type=staged_image.resource_type)
+    except STAGING_ERRORS:
+        logger.warning("Could not discard staged image %s", public_id, exc_info=True)
+
+
+def save_staged_uploads(results, user, groups):
+    """
+    In one transaction, creates a Photo row for every staged result and links
+    it to every group. Results that reuse an existing photo (``duplicate``
+    with ``photo`` set) only get the links they are missing. Returns the
+    created photos in the order of the staged results.
+    """
+    staged = [result for result in results if result.staged_image is not None and not result.error]
+    reused = [result for result in results if result.duplicate and result.photo is not None]
+    with transaction.atomic():
+        photos = Photo.objects.bulk_create([
+            Photo(image=result.staged_image, uploaded_by=user, content_hash=result.content_hash)
+            for result in staged
+        ])
+        existing_links = set()
+        if reused:
+            existing_links = set(PhotoTag.objects.filter(
+                photo__in=[result.photo for result in reused], group__in=groups
+            ).values_list('photo_id', 'group_id'))
+
+        group_entries = {}
+        links = []
+        for result, photo in list(zip(staged, photos)) + [(result, result.photo) for result in reused]:
+            missing = [group for group in groups if (photo.id, group.id) not in existing_links]
+            group_entries[id(result)] = len(missing)
+            links.extend(PhotoTag(photo=photo, group=group) for group in missing)
+        # ignore_conflicts covers a concurrent upload linking the same photo meanwhile
+        PhotoTag.objects.bulk_create(links, ignore_conflicts=bool(reused))
+        # bulk_create sends no signals, so refresh the denormalized counters
+        # and cache versions here
+        if links:
+            recount_group_counters([group.id for group in groups], fields=['photo_count'])
+            bump_group_versions(group.id for group in groups)
+
+    for result, photo in zip(staged, photos):
+        result.photo = photo
+    for result in staged + reused:
+        result.group_entries = group_entries[id(result)]
+    return photos
+
+
+def bulk_upload_photos(image_files, user, groups, content_hashes=None, executor=None):
+    """
+    Uploads ``image_files`` for ``user`` into every group of ``groups``.
+    ``content_hashes`` are the files' SHA-256 digests when already known
+    (see ContentHashUploadHandler). Files whose content the user uploaded
+    before reuse that Photo instead of being stored again. With an
+    ``executor`` (a concurrent.futures pool), files are sent to storage in
+    parallel. Returns one UploadResult per file, in upload order.
+    """
+    image_files = list(image_files)
+    groups = list(groups)
+    content_hashes = _content_hashes(image_files, content_hashes)
+    known_photos = {}
+    for photo in _known_photos_queryset(user, content_hashes):
+        known_photos[photo.content_hash] = photo # Oldest photo wins
+    results, first_upload_of = _plan_uploads(image_files, content_hashes, known_photos)
+    to_stage = [
+        (result, image_file) for result, image_file in zip(results, image_files)
+        if result is first_upload_of.get(result.content_hash)
+    ]
+    if executor is None:
+        for result, image_file in to_stage:
+            _stage(result, image_file)
+    else:
+        list(executor.map(lambda pair: _stage(*pair), to_stage))
+    return _finish_uploads(results, image_files, user, groups, first_upload_of)
+
+
+async def abulk_upload_photos(image_files, user, groups, content_hashes=None):
+    """
+    bulk_upload_photos() for async views: the duplicate lookup uses the async
+    ORM, and up to UPLOAD_CONCURRENCY files are sent to storage at once, each
+    from a worker thread, so the event loop never waits on storage.
+    """
+    image_files = list(image_files)
+    groups = list(groups)
+    content_hashes = _content_hashes(image_files, content_hashes)
+    known_photos = {}
+    async for photo in _known_photos_queryset(user, content_hashes):
+        known_photos[photo.content_hash] = photo
+    results, first_upload_of = _plan_uploads(image_files, content_hashes, known_photos)
+
+    semaphore = asyncio.Semaphore(UPLOAD_CONCURRENCY)
+
+    async def stage(result, image_file):
+        async with semaphore:
+            await sync_to_async(_stage, thread_sensitive=False)(result, image_file)
+
+    await asyncio.gather(*(
+        stage(result, image_file) for result, image_file in zip(results, image_files)
+        if result is first_upload_of.get(result.content_hash)
+    ))
+    return await sync_to_async(_finish_uploads)(results, image_files, user, groups, first_upload_of)
+
+
+def _content_hashes(image_files, content_hashes):
+    if not content_hashes or len(content_hashes) != len(image_files):
+        return [compute_content_hash(image_file) for image_file in image_files]
+    return content_hashes
+
+
+def _known_photos_queryset(user, content_hashes):
+    return Photo.objects.filter(uploaded_by=user, content_hash__in=content_hashes).order_by('-id')
+
+
+def _plan_uploads(image_files, content_hashes, known_photos):
+    """
+    One UploadResult per file, with those whose content is in ``known_photos``
+    or earlier in the batch marked as duplicates. Returns the results and the
+    first result of each content hash (the files that must be stored).
+    """
+    results = []
+    first_upload_of = {}
+    for image_file, content_hash in zip(image_files, content_hashes):
+        result = UploadResult(name=image_file.name, content_hash=content_hash)
+        results.append(result)
+        if content_hash in known_photos:
+            result.photo = known_photos[content_hash]
+            result.duplicate = True
+        elif content_hash in first_upload_of:
+            result.duplicate = True # Same file twice in this batch, resolved after saving
+        else:
+            first_upload_of[content_hash] = result
+    return results, first_upload_of
+
+
+def _stage(result, image_file):
+    try:
+        result.staged_image = stage_image(image_file)
+    except STAGING_ERRORS as exc:
+        logger.warning("Upload of %s failed", image_file.name, exc_info=True)
+        result.error = str(exc) or exc.__class__.__name__
+
+
+def _finish_uploads(results, image_files, user, groups, first_upload_of):
+    """Saves the staged results, or discards them if that fails, then hashes them and builds renditions."""
+    try:
+        save_staged_uploads(results, user, groups)
+    except DatabaseError:
+        logger.exception("Saving %d uploaded photo(s) failed, discarding staged images", len(results))
+        for result in results:
+            if result.staged_image is not None:
+                discard_staged_image(result.staged_image)
+            result.photo = None
+            if not result.error:
+                result.error = "The photo could not be saved."
+        record_upload_metrics(results, image_files)
+        return results
+
+    for result in results:
+        if result.duplicate and result.photo is None:
+            first = first_upload_of[result.content_hash]
+            result.photo, result.error = first.photo, first.error
+
+    stored = [
+        (result.photo, image_file) for result, image_file in zip(results, image_files)
+        if result.ok and not result.duplicate
+    ]
+    record_perceptual_hashes(stored)
+    # Reused photos may have joined new groups too
+    index_phototags(PhotoTag.objects.filter(photo_id__in={result.photo.id for result in results if result.ok}))
+    create_renditions(stored)
+    record_upload_metrics(results, image_files)
+    return results
+
+
+def record_upload_metrics(results, image_files):
+    for result, image_file in zip(results, image_files):
+        outcome = 'failed' if not result.ok else 'reused' if result.duplicate else 'created'
+        inc('tagmi_uploads_total', outcome=outcome)
+        inc('tagmi_upload_bytes_total', image_file.size or 0)
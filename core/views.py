@@ -1,3 +1,5 @@
+import hashlib
+
 from django.shortcuts import render, redirect, get_object_or_404
 from django.urls import reverse_lazy, reverse
 from django.views.generic import CreateView, ListView, DetailView
@@ -5,15 +7,123 @@ from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.http import require_POST
 from django.contrib import messages
+from django.conf import settings
+from django.http import Http404, HttpResponse, JsonResponse, QueryDict, StreamingHttpResponse
+from django.core.cache import cache
+from django.contrib.admin.views.decorators import staff_member_required
+from django.utils.safestring import mark_safe
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import content_disposition_header, quote_etag
+from django.utils.text import slugify
+from django.middleware.csrf import get_token
 from django import forms as django_forms # For forms.Media
 
-from .models import Group, Photo, Tag, PhotoTag
+from .models import Group, Photo, Tag, PhotoTag, Job
 # MultiplePhotoUploadForm is removed from imports
-from .forms import GroupForm, PhotoTagAssignmentForm, TagFilterForm
+from .forms import BulkPhotoRemovalForm, BulkTagAssignmentForm, GroupForm, PhotoTagAssignmentForm, TagFilterForm
+from .pagination import decode_cursor, paginate_photo_associations
+from .caching import (
+    PAGE_TIMEOUT, facet_cache_key, fill_csrf_token, get_cache_stats, page_cache_key, record_cache_stats,
+    render_photo_cards
+)
+from .uploads import bulk_upload_photos
+from .downloads import stream_photo_archive
+from .tag_query import canonical_tag_query, compile_tag_query
+from .tagging import AUTOCOMPLETE_LIMIT, autocomplete_tags, bulk_assign_tags, get_or_create_tag, tag_facet_counts
+from .suggestions import suggest_tags_for_photo
+from .similarity import MAX_DISTANCE, SIMILAR_DISTANCE, duplicate_cluster_ids, similar_photos
+from .jobs import UPLOAD_PHOTOS_JOB, enqueue_photo_upload
+from .query_budgets import query_budget
+from .metrics import render_prometheus
 
 def home(request):
     return render(request, 'core/home.html')
 
+def is_htmx_request(request):
+    return request.headers.get('HX-Request') == 'true'
+
+def get_int_param(request, name):
+    """The non-negative integer GET parameter ``name``, or None if missing or not ASCII digits."""
+    value = request.GET.get(name, '')
+    return int(value) if value.isascii() and value.isdigit() else None
+
+
+def build_photo_detail_item(pt_assoc, group, group_tags):
+    """Context for one _photo_card.html card (see GroupDetailView)."""
+    selected_tags = pt_assoc.tags.all()
+    tag_assignment_form = PhotoTagAssignmentForm(
+        group=group,
+        selected_tags=selected_tags,
+        group_tags=group_tags,
+        initial={'tags_to_assign': selected_tags}
+    )
+    return {
+        'photo_tag_association': pt_assoc,
+        'photo': pt_assoc.photo,
+        'current_tags_on_photo': selected_tags,
+        'tag_assignment_form': tag_assignment_form
+    }
+
+
+def render_photo_card_fragment(request, group, photo_tag_association=None):
+    """
+    HTMX response for card-level actions: the affected card (omitted when the
+    photo left the group) plus #messages-container, which the card forms pick
+    up with hx-select-oob.
+    """
+    context = {'group': group, 'compact_cards': GroupDetailView.compact_cards}
+    if photo_tag_association is not None:
+        context['detail_item'] = build_photo_detail_item(
+            photo_tag_association, group, list(group.tags.all())
+        )
+    return render(request, 'core/partials/_photo_card_fragment.html', context)
+
+
+class ConditionalGetMixin:
+    """
+    Answers a GET with 304 Not Modified, before any context is built, when
+    its If-None-Match header carries the validator from get_etag_parts().
+    """
+    def get_etag_parts(self):
+        """Values the page depends on; None disables the validator."""
+        return None
+
+    def get_etag(self):
+        parts = self.get_etag_parts()
+        # Pending flash messages are shown once, so such a page is never "not modified"
+        if parts is None or len(messages.get_messages(self.request)):
+            return None
+        request = self.request
+        parts = [
+            *parts,
+            settings.RELEASE_VERSION,
+            request.user.pk,
+            # The page embeds a CSRF token, whose secret changes on login
+            self.get_csrf_secret(),
+            is_htmx_request(request),
+            sorted(request.GET.lists()),
+        ]
+        return hashlib.md5(repr(parts).encode(), usedforsecurity=False).hexdigest()
+
+    def get_csrf_secret(self):
+        get_token(self.request) # Sets the secret the response's cookie will carry, if there is none yet
+        return self.request.META['CSRF_COOKIE']
+
+    def get(self, request, *args, **kwargs):
+        etag = self.get_etag()
+        if etag is None:
+            return super().get(request, *args, **kwargs)
+        etag = quote_etag(etag)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = super().get(request, *args, **kwargs)
+        response.headers['ETag'] = etag
+        # Browsers may keep the page but must revalidate it on every visit
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+
+@query_budget(16)
 class GroupCreateView(LoginRequiredMixin, CreateView):
     model = Group
     form_class = GroupForm
@@ -30,76 +140,159 @@ class GroupCreateView(LoginRequiredMixin, CreateView):
         messages.success(self.request, f"Group '{self.object.name}' created successfully.")
         return response
 
-class GroupListView(LoginRequiredMixin, ListView):
+@query_budget(6)
+class GroupListView(LoginRequiredMixin, ConditionalGetMixin, ListView):
     model = Group
     template_name = 'core/group_list.html'
     context_object_name = 'groups'
 
+    def get_etag_parts(self):
+        # Counters and membership changes bump cache_version; renames do not
+        return list(Group.objects.filter(members=self.request.user).values_list('id', 'name', 'cache_version'))
+
     def get_queryset(self):
+        # Member/photo/tag counts come from Group's denormalized counter columns
         return Group.objects.filter(members=self.request.user)\
             .select_related('created_by')\
-            .prefetch_related('members')\
             .order_by('-id')
 
-class GroupDetailView(LoginRequiredMixin, DetailView):
+@query_budget(15)
+class GroupDetailView(LoginRequiredMixin, ConditionalGetMixin, DetailView):
     model = Group
     template_name = 'core/group_detail.html'
     context_object_name = 'group'
+    photos_per_page = 24
+    # Compact cards carry only their selected tag ids; the tag checkbox list
+    # is built client-side from a vocabulary emitted once per page.
+    compact_cards = True
 
     def get_queryset(self):
+        # Photo associations are paginated in get_context_data, so only the
+        # sidebar relations are prefetched here.
         return super().get_queryset().filter(members=self.request.user).prefetch_related(
             'members',
             'tags',
-            'photo_tag_associations__photo__uploaded_by',
-            'photo_tag_associations__tags'
         )
 
+    def get_etag_parts(self):
+        group = Group.objects.filter(pk=self.kwargs['pk'], members=self.request.user)\
+            .values_list('name', 'cache_version').first()
+        if group is None:
+            return None # Let the view answer 404
+        return [self.kwargs['pk'], *group, self.compact_cards, self.photos_per_page]
+
+    def get_template_names(self):
+        # Infinite scroll: HTMX requests for a later page only need the next
+        # batch of cards (plus the sentinel that loads the one after).
+        if is_htmx_request(self.request) and self.request.GET.get('cursor'):
+            return ['core/partials/_group_photos_page.html']
+        return super().get_template_names()
+
+    def get_next_page_url(self, next_cursor):
+        if not next_cursor:
+            return None
+        query = self.request.GET.copy()
+        query['cursor'] = next_cursor
+        return f"{self.request.path}?{query.urlencode()}"
+
+    def get_tag_facets(self, group, group_tags, phototag_associations, filter_key, selected_filter_tags):
+        """
+        One entry per group tag with the number of photos of the current
+        filtered set carrying it (cached per group version and filter).
+        """
+        facet_key = facet_cache_key(group, filter_key)
+        facet_counts = cache.get(facet_key)
+        if facet_counts is None:
+            record_cache_stats('facets', misses=1)
+            facet_counts = tag_facet_counts(phototag_associations)
+            cache.set(facet_key, facet_counts, PAGE_TIMEOUT)
+        else:
+            record_cache_stats('facets', hits=1)
+        checked_ids = {tag.id for tag in selected_filter_tags}
+        return [
+            {'tag': tag, 'count': facet_counts.get(tag.id, 0), 'checked': tag.id in checked_ids}
+            for tag in group_tags
+        ]
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         group = self.object
 
+        # Loaded once (via the prefetch in get_queryset) and shared by the
+        # filter form and every card form
+        group_tags = list(group.tags.all())
+
         # Formulaire de filtrage
-        filter_form = TagFilterForm(self.request.GET or None, group=group)
+        filter_form = TagFilterForm(self.request.GET or None, group=group, group_tags=group_tags)
         context['filter_form'] = filter_form
 
         # Associations photo <-> tags
-        phototag_associations = group.photo_tag_associations.all()
-
+        phototag_associations = group.photo_tag_associations.select_related(
+            'photo__uploaded_by'
+        ).prefetch_related('tags', 'photo__renditions')
+
+        # Ticked tags and the boolean tag query compile to containment checks
+        # on PhotoTag.tag_ids: one statement, no per-tag join, no DISTINCT
+        selected_filter_tags = []
+        filter_tree = None
         if filter_form.is_valid():
-            selected_filter_tags = filter_form.cleaned_data.get('tags_to_filter_by')
-            if selected_filter_tags:
-                for tag in selected_filter_tags:
-                    phototag_associations = phototag_associations.filter(tags=tag)
-                phototag_associations = phototag_associations.distinct()
-
-        # Construction des formulaires individuels par photo
-        photo_details_list = []
-        media_collector = django_forms.Media()
-
-        for pt_assoc in phototag_associations:
-            selected_tags = pt_assoc.tags.all()
-
-            tag_assignment_form = PhotoTagAssignmentForm(
-                group=group,
-                selected_tags=selected_tags,
-                initial={'tags_to_assign': selected_tags}
+            selected_filter_tags = filter_form.cleaned_data.get('tags_to_filter_by') or []
+            filter_tree = filter_form.get_filter_tree()
+            if filter_tree:
+                phototag_associations = phototag_associations.filter(compile_tag_query(filter_tree))
+
+        cursor = None
+        raw_cursor = self.request.GET.get('cursor')
+        if raw_cursor:
+            cursor = decode_cursor(raw_cursor)
+            if cursor is None:
+                raise Http404("Invalid page cursor.")
+
+        filter_key = canonical_tag_query(filter_tree) if filter_tree else ''
+        context['compact_cards'] = self.compact_cards
+        context['selected_filter_tags'] = selected_filter_tags
+        if not raw_cursor: # Infinite-scroll pages don't render the filter sidebar
+            context['tag_facets'] = self.get_tag_facets(
+                group, group_tags, phototag_associations, filter_key, selected_filter_tags
+            )
+        context['bulk_tag_form'] = BulkTagAssignmentForm(group=group)
+        context['download_url'] = filtered_group_url('download_group_photos', group.pk, self.request.GET)
+        context['group_tag_vocabulary'] = [{'id': tag.id, 'name': tag.name} for tag in group_tags]
+
+        # The rendered page is cached on the group's version stamp; on a miss,
+        # cards are still reused individually (see core.caching).
+        page_key = page_cache_key(group, filter_key, raw_cursor, self.compact_cards, self.photos_per_page)
+        cached_page = cache.get(page_key)
+        if cached_page is not None:
+            record_cache_stats('page', hits=1)
+            photo_cards, next_cursor = cached_page
+            context['media'] = django_forms.Media()
+        else:
+            record_cache_stats('page', misses=1)
+            page_associations, next_cursor = paginate_photo_associations(
+                phototag_associations, cursor, self.photos_per_page
             )
 
-            media_collector += tag_assignment_form.media
-
-            photo_details_list.append({
-                'photo_tag_association': pt_assoc,
-                'photo': pt_assoc.photo,
-                'current_tags_on_photo': selected_tags,
-                'tag_assignment_form': tag_assignment_form
-            })
-
-        context['photo_details_list'] = photo_details_list
-        context['media'] = media_collector
+            # Construction des formulaires individuels par photo
+            photo_details_list = []
+            media_collector = django_forms.Media()
+            for pt_assoc in page_associations:
+                detail_item = build_photo_detail_item(pt_assoc, group, group_tags)
+                media_collector += detail_item['tag_assignment_form'].media
+                photo_details_list.append(detail_item)
+
+            photo_cards = render_photo_cards(photo_details_list, group, group_tags, self.compact_cards)
+            cache.set(page_key, (photo_cards, next_cursor), PAGE_TIMEOUT)
+            context['photo_details_list'] = photo_details_list
+            context['media'] = media_collector
+
+        context['photo_cards'] = [mark_safe(fill_csrf_token(html, self.request)) for html in photo_cards]
+        context['next_page_url'] = self.get_next_page_url(next_cursor)
         return context
 
 
 # Reverted to your original handleMultipleImagesUpload, with improvements
+@query_budget(19)
 @login_required
 def handleMultipleImagesUpload(request): # Ensure this matches your URL conf name
     user_groups = Group.objects.filter(members=request.user).order_by('name')
@@ -118,31 +311,71 @@ def handleMultipleImagesUpload(request): # Ensure this matches your URL conf nam
 
         # Filter selected groups to ensure user is a member (security measure)
         # and that the groups actually exist.
-        selected_groups = Group.objects.filter(id__in=group_ids, members=request.user)
+        selected_groups = list(Group.objects.filter(id__in=group_ids, members=request.user))
 
-        if not selected_groups.exists():
+        if not selected_groups:
             messages.error(request, "Invalid or no accessible groups selected.")
             return render(request, "core/upload_photos.html", {'groups': user_groups})
-        
-        photos_created_count = 0
-        phototags_created_count = 0
-
-        for image_file in images:
-            # Create one Photo object per uploaded image file
-            photo_instance = Photo.objects.create(image=image_file, uploaded_by=request.user)
-            photos_created_count += 1
-            # Associate this new photo with each selected group
-            for group_instance in selected_groups:
-                PhotoTag.objects.create(photo=photo_instance, group=group_instance)
-                phototags_created_count += 1
-        
-        messages.success(request, f"{photos_created_count} photo(s) uploaded and associated with {phototags_created_count} group entries.")
+
+        if settings.ASYNC_UPLOADS:
+            # Accept the files now and let the run_worker process do the storage work
+            job = enqueue_photo_upload(request.user, images, selected_groups)
+            messages.info(request, f"{len(images)} photo(s) received and queued for processing.")
+            return redirect('upload_job_status', job_pk=job.pk)
+
+        # Storage uploads happen first; all rows are then bulk-inserted in one transaction
+        content_hashes = getattr(request, 'upload_content_hashes', {}).get('images')
+        results = bulk_upload_photos(images, request.user, selected_groups, content_hashes=content_hashes)
+        if not report_upload_results(request, results):
+            return render(request, "core/upload_photos.html", {'groups': user_groups})
         return redirect('group_list') # Or a more relevant success page, e.g., last group detail
 
     # GET request
     return render(request, "core/upload_photos.html", {'groups': user_groups})
 
 
+def report_upload_results(request, results):
+    """Flashes the outcome of an upload; returns whether any photo was saved."""
+    photos_created_count = sum(1 for result in results if result.ok and not result.duplicate)
+    photos_reused_count = sum(1 for result in results if result.ok and result.duplicate)
+    phototags_created_count = sum(result.group_entries for result in results)
+
+    for result in results:
+        if not result.ok:
+            messages.error(request, f"Could not upload '{result.name}': {result.error}")
+
+    if photos_created_count:
+        messages.success(request, f"{photos_created_count} photo(s) uploaded and associated with {phototags_created_count} group entries.")
+    if photos_reused_count:
+        messages.info(request, f"{photos_reused_count} photo(s) had already been uploaded; they were added to the selected groups where missing.")
+    return bool(photos_created_count or photos_reused_count)
+
+
+@query_budget(5)
+@login_required
+def upload_job_status_view(request, job_pk):
+    job = get_object_or_404(Job, pk=job_pk, kind=UPLOAD_PHOTOS_JOB, created_by=request.user)
+    if is_htmx_request(request):
+        # Polled by the status panel until the job is finished
+        return render(request, 'core/partials/_upload_job_status.html', {'job': job})
+    return render(request, 'core/upload_job_status.html', {'job': job})
+
+
+@query_budget(4)
+@staff_member_required
+def cache_stats_view(request):
+    """Fragment cache hit/miss counters, for checking its effectiveness under load."""
+    return JsonResponse(get_cache_stats())
+
+
+@query_budget(4)
+@staff_member_required
+def metrics_view(request):
+    """Application metrics of every worker, in the Prometheus text format."""
+    return HttpResponse(render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+@query_budget(11)
 @login_required
 @require_POST
 def add_group_tag_view(request, group_pk):
@@ -152,17 +385,30 @@ def add_group_tag_view(request, group_pk):
     if not tag_name:
         messages.error(request, "Tag name cannot be empty.")
     else:
-        tag, created = Tag.objects.get_or_create(
-            name__iexact=tag_name,
-            group=group,
-            defaults={'name': tag_name}
-        )
+        tag, created = get_or_create_tag(group, tag_name)
         if created:
             messages.success(request, f"Tag '{tag.name}' added to group '{group.name}'.")
         else:
             messages.info(request, f"Tag '{tag.name}' already exists in group '{group.name}'.")
     return redirect('group_detail', pk=group_pk)
 
+@query_budget(8)
+@login_required
+def tag_autocomplete_view(request, group_pk):
+    """
+    Tag suggestions for a prefix: JSON, or a list fragment for HTMX inputs.
+    With ``photo``, the tags the photo lacks, ranked for it (core.suggestions).
+    """
+    group = get_object_or_404(Group, pk=group_pk, members=request.user)
+    query, photo_id = request.GET.get('q', ''), get_int_param(request, 'photo')
+    tags = suggest_tags_for_photo(group, photo_id, query, AUTOCOMPLETE_LIMIT) if photo_id is not None else None
+    if tags is None:
+        tags = autocomplete_tags(group, query)
+    if is_htmx_request(request):
+        return render(request, 'core/partials/_tag_suggestions.html', {'tags': tags})
+    return JsonResponse({'results': [{'id': tag.id, 'name': tag.name, 'usage': tag.usage} for tag in tags]})
+
+@query_budget(19)
 @login_required
 @require_POST
 def remove_group_tag_view(request, group_pk, tag_pk):
@@ -174,6 +420,7 @@ def remove_group_tag_view(request, group_pk, tag_pk):
     messages.success(request, f"Tag '{tag_name}' and its associations within this group have been removed.")
     return redirect('group_detail', pk=group_pk)
 
+@query_budget(34)
 @login_required
 @require_POST
 def assign_photo_tags_view(request, group_pk, photo_pk):
@@ -191,8 +438,75 @@ def assign_photo_tags_view(request, group_pk, photo_pk):
         for field, errors in form.errors.items():
             for error in errors:
                 messages.error(request, f"Error assigning tags: {field} - {error}")
+    if is_htmx_request(request):
+        return render_photo_card_fragment(request, group, photo_tag_association)
     return redirect('group_detail', pk=group_pk)
 
+@query_budget(22)
+@login_required
+@require_POST
+def bulk_assign_photo_tags_view(request, group_pk):
+    group = get_object_or_404(Group, pk=group_pk, members=request.user)
+    form = BulkTagAssignmentForm(request.POST, group=group)
+    if form.is_valid():
+        photos_count, added, removed = bulk_assign_tags(
+            group,
+            [photo.id for photo in form.cleaned_data['photos']],
+            [tag.id for tag in form.cleaned_data['tags']],
+            form.cleaned_data['action'],
+        )
+        messages.success(request, f"Tags updated on {photos_count} photo(s): {added} added, {removed} removed.")
+    else:
+        for field, errors in form.errors.items():
+            for error in errors:
+                messages.error(request, f"Error updating tags: {error}")
+
+    return redirect(filtered_group_detail_url(request, group_pk))
+
+
+def filtered_group_detail_url(request, group_pk):
+    """The grid a bulk selection was made in, with the filter it was posted with."""
+    return filtered_group_url('group_detail', group_pk, request.POST)
+
+
+def filtered_group_url(url_name, group_pk, data):
+    """The URL of a group page keeping only the TagFilterForm fields of ``data``."""
+    url = reverse(url_name, args=[group_pk])
+    query = QueryDict(mutable=True)
+    query.setlist('tags_to_filter_by', data.getlist('tags_to_filter_by'))
+    if data.get('tag_query'):
+        query['tag_query'] = data['tag_query']
+    if query:
+        url = f"{url}?{query.urlencode()}"
+    return url
+
+
+@query_budget(5)
+@login_required
+def download_group_photos_view(request, group_pk):
+    """The group's photos matching the current filter, as a streamed ZIP with a tag manifest."""
+    group = get_object_or_404(Group, pk=group_pk, members=request.user)
+    group_tags = list(group.tags.all())
+    filter_form = TagFilterForm(request.GET or None, group=group, group_tags=group_tags)
+    phototags = group.photo_tag_associations.select_related('photo__uploaded_by')
+    if filter_form.is_bound and not filter_form.is_valid():
+        for errors in filter_form.errors.values():
+            for error in errors:
+                messages.error(request, f"Cannot download: {error}")
+        return redirect(filtered_group_url('group_detail', group.pk, request.GET))
+    filter_tree = filter_form.get_filter_tree() if filter_form.is_bound else None
+    if filter_tree:
+        phototags = phototags.filter(compile_tag_query(filter_tree))
+
+    # Photos are read and fetched while the response streams, after this view returned
+    response = StreamingHttpResponse(
+        stream_photo_archive(phototags, {tag.id: tag.name for tag in group_tags}),
+        content_type='application/zip',
+    )
+    response['Content-Disposition'] = content_disposition_header(True, f"{slugify(group.name) or 'group'}-photos.zip")
+    return response
+
+@query_budget(13)
 @login_required
 @require_POST
 def remove_photo_from_group_view(request, group_pk, photo_pk):
@@ -203,4 +517,59 @@ def remove_photo_from_group_view(request, group_pk, photo_pk):
     PhotoTag.objects.filter(photo=photo, group=group).delete()
     
     messages.success(request, f"Photo removed from group '{group.name}'.")
-    return redirect('group_detail', pk=group_pk)
\ No newline at end of file
+    if is_htmx_request(request):
+        return render_photo_card_fragment(request, group)
+    return redirect('group_detail', pk=group_pk)
+
+# Clusters listed at once on the review page, largest first
+DUPLICATE_CLUSTER_LIMIT = 50
+
+@query_budget(8)
+@login_required
+def similar_photos_view(request, group_pk, photo_pk):
+    """The group's photos that look like the photo (core.similarity), closest first, as JSON."""
+    group = get_object_or_404(Group, pk=group_pk, members=request.user)
+    phototag = get_object_or_404(PhotoTag.objects.select_related('photo'), group=group, photo_id=photo_pk)
+    distance = get_int_param(request, 'distance')
+    max_distance = min(distance, MAX_DISTANCE) if distance is not None else SIMILAR_DISTANCE
+    return JsonResponse({'results': [
+        {
+            'photo_id': match.photo_id,
+            'distance': match_distance,
+            'thumbnail_url': match.photo.thumbnail_url,
+            'uploaded_by': match.photo.uploaded_by.username,
+        }
+        for match, match_distance in similar_photos(phototag, max_distance)
+    ]})
+
+@query_budget(8)
+@login_required
+def group_duplicates_view(request, group_pk):
+    """Clusters of near-duplicate photos in the group, oldest upload first, to remove the extras in bulk."""
+    group = get_object_or_404(Group, pk=group_pk, members=request.user)
+    cluster_ids = duplicate_cluster_ids(group)
+    shown = cluster_ids[:DUPLICATE_CLUSTER_LIMIT]
+    phototags = PhotoTag.objects.filter(pk__in=[pk for ids in shown for pk in ids]).select_related(
+        'photo__uploaded_by').prefetch_related('photo__renditions').in_bulk()
+    return render(request, 'core/group_duplicates.html', {
+        'group': group,
+        'clusters': [[phototags[pk] for pk in ids if pk in phototags] for ids in shown],
+        'cluster_count': len(cluster_ids),
+    })
+
+# No query budget: each removed photo runs the PhotoTag delete signals
+# (group counters, tag suggestion counters)
+@login_required
+@require_POST
+def bulk_remove_photos_from_group_view(request, group_pk):
+    group = get_object_or_404(Group, pk=group_pk, members=request.user)
+    form = BulkPhotoRemovalForm(request.POST, group=group)
+    if form.is_valid():
+        photos = list(form.cleaned_data['photos'])
+        PhotoTag.objects.filter(group=group, photo__in=photos).delete()
+        messages.success(request, f"{len(photos)} photo(s) removed from group '{group.name}'.")
+    else:
+        for errors in form.errors.values():
+            for error in errors:
+                messages.error(request, f"Error removing photos: {error}")
+    return redirect('group_duplicates', group_pk=group_pk)
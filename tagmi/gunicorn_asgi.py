@@ -0,0 +1,20 @@
+"""
+Gunicorn settings of the ASGI deployment profile: uvicorn workers serving
+tagmi.asgi, with the async views of core.async_views (TAGMI_ASYNC_VIEWS).
+Use it in place of the ``web`` line of the Procfile:
+
+    web: gunicorn -c python:tagmi.gunicorn_asgi tagmi.asgi
+
+WEB_CONCURRENCY sets the number of workers, as for the default sync profile
+(``gunicorn tagmi.wsgi``), so the two compare at equal worker counts; see
+``manage.py compare_deployments``.
+
+Each worker keeps serving other requests while one waits on storage or the
+database. Persistent database connections are off in this profile (see
+tagmi.settings).
+"""
+import os
+
+worker_class = 'uvicorn_worker.UvicornWorker'
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+raw_env = ['TAGMI_ASYNC_VIEWS=True']
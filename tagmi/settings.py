@@ -35,8 +35,11 @@ LOGIN_REDIRECT_URL = '/'
 ACCOUNT_LOGOUT_REDIRECT_URL = '/'
 
 MIDDLEWARE = [
+    'core.middleware.ProfilingMiddleware',  # First, so its total covers every other middleware
+    'core.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',  # Whitenoise early
+    'core.middleware.AsyncWhiteNoiseMiddleware',  # Whitenoise early
+    'core.middleware.QueryBudgetMiddleware',  # Counts the queries of everything below
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -46,7 +49,11 @@ MIDDLEWARE = [
     'allauth.account.middleware.AccountMiddleware', 
 ]
 
-ROOT_URLCONF = 'tagmi.urls'
+# The ASGI deployment profile (tagmi/gunicorn_asgi.py) turns this on to serve
+# the async views of core.async_views
+ASYNC_VIEWS = os.environ.get('TAGMI_ASYNC_VIEWS', '') == 'True'
+
+ROOT_URLCONF = 'tagmi.urls_async' if ASYNC_VIEWS else 'tagmi.urls'
 
 TEMPLATES = [
     {
@@ -77,10 +84,31 @@ else:
     DATABASES = {
         'default': dj_database_url.config(
             default=os.environ.get('DATABASE_URL'),
-            conn_max_age=600,
+            # Persistent connections are per thread, and under ASGI the ORM
+            # runs in a new thread for each request
+            conn_max_age=0 if ASYNC_VIEWS else 600,
         )
     }
 
+# Cache (rendered photo-grid fragments, see core.caching). Keys carry version
+# stamps stored in the database, so any backend stays consistent; the file
+# backend lets the gunicorn workers of one dyno share entries and counters.
+if DEBUG:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'tagmi',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ.get('TAGMI_CACHE_DIR', '/tmp/tagmi-cache'),
+            'OPTIONS': {'MAX_ENTRIES': 20000},
+        }
+    }
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -115,6 +143,31 @@ SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https')
 
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
+# Hash uploaded files while they stream in, before Django's default handlers store them
+FILE_UPLOAD_HANDLERS = [
+    'core.uploads.ContentHashUploadHandler',
+    'django.core.files.uploadhandler.MemoryFileUploadHandler',
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+
+# When enabled, uploads are queued in the database and processed by `manage.py run_worker`
+ASYNC_UPLOADS = os.environ.get('TAGMI_ASYNC_UPLOADS', '') == 'True'
+
+# Over-budget requests (see core.query_budgets) raise instead of being logged
+QUERY_BUDGET_STRICT = os.environ.get('TAGMI_QUERY_BUDGET_STRICT', '') == 'True'
+
+# Per-process metric files, summed by /metrics (see core.metrics). Must be
+# shared by every worker of the dyno.
+METRICS_DIR = os.environ.get('TAGMI_METRICS_DIR', '/tmp/tagmi-metrics')
+
+# Also log the profiles of requests sent with X-Tagmi-Profile (see core.profiling)
+PROFILING_LOG = os.environ.get('TAGMI_PROFILING_LOG', '') == 'True'
+
+# Part of the fragment cache keys and ETags of group pages, so a deploy (new
+# templates) invalidates them.
+# Heroku sets HEROKU_RELEASE_VERSION when runtime dyno metadata is enabled.
+RELEASE_VERSION = os.environ.get('HEROKU_RELEASE_VERSION', '')
+
 if DEBUG:
     MEDIA_URL = '/media/'
     MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
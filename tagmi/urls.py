@@ -32,19 +32,30 @@ urlpatterns = [
 
     # Photo Upload View (your custom function-based view)
     path('photos/upload/', views.handleMultipleImagesUpload, name='upload_photo'),
+    path('photos/upload/jobs/<int:job_pk>/', views.upload_job_status_view, name='upload_job_status'),
     # Photo Management Views (related to Groups)
     path('groups/<int:group_pk>/photos/<int:photo_pk>/remove/', views.remove_photo_from_group_view, name='remove_photo_from_group'),
+    path('groups/<int:group_pk>/photos/download/', views.download_group_photos_view, name='download_group_photos'),
+    path('groups/<int:group_pk>/photos/remove/', views.bulk_remove_photos_from_group_view, name='bulk_remove_photos_from_group'),
+    path('groups/<int:group_pk>/photos/<int:photo_pk>/similar/', views.similar_photos_view, name='similar_photos'),
+    path('groups/<int:group_pk>/duplicates/', views.group_duplicates_view, name='group_duplicates'),
 
     # Tag Management Views (related to Groups)
     path('groups/<int:group_pk>/tags/add/', views.add_group_tag_view, name='add_group_tag'),
+    path('groups/<int:group_pk>/tags/autocomplete/', views.tag_autocomplete_view, name='tag_autocomplete'),
     path('groups/<int:group_pk>/tags/<int:tag_pk>/remove/', views.remove_group_tag_view, name='remove_group_tag'),
 
     # Photo Tag Management Views (assigning/removing tags from photos within a group context)
     path('groups/<int:group_pk>/photos/<int:photo_pk>/assign-tags/', views.assign_photo_tags_view, name='assign_photo_tags'),
+    path('groups/<int:group_pk>/photos/bulk-tags/', views.bulk_assign_photo_tags_view, name='bulk_assign_photo_tags'),
 
     # Note: There isn't a dedicated "Photo Detail" or "Photo List" page in this setup yet.
     # Photos are primarily viewed within the context of a Group (via GroupDetailView).
     # If you need direct photo views, you would add them here.
+    # Fragment cache hit/miss counters (staff only)
+    path('cache-stats/', views.cache_stats_view, name='cache_stats'),
+    # Prometheus metrics of every worker (staff only)
+    path('metrics', views.metrics_view, name='metrics'),
     # Admin URL
     path('admin/', admin.site.urls),
     # Allauth URLs
@@ -0,0 +1,26 @@
+"""
+URL configuration of the ASGI deployment profile (ROOT_URLCONF when
+TAGMI_ASYNC_VIEWS is on): tagmi.urls with the views of core.async_views in
+place of their synchronous versions, under the same names.
+"""
+from django.urls import path
+
+from core import async_views
+
+from .urls import urlpatterns as sync_urlpatterns
+
+ASYNC_VIEWS = {
+    'group_detail': async_views.group_detail_view,
+    'upload_photo': async_views.upload_photos_view,
+    'add_group_tag': async_views.add_group_tag_view,
+    'tag_autocomplete': async_views.tag_autocomplete_view,
+    'remove_group_tag': async_views.remove_group_tag_view,
+    'assign_photo_tags': async_views.assign_photo_tags_view,
+    'bulk_assign_photo_tags': async_views.bulk_assign_photo_tags_view,
+}
+
+urlpatterns = [
+    path(str(pattern.pattern), ASYNC_VIEWS[pattern.name], name=pattern.name)
+    if getattr(pattern, 'name', None) in ASYNC_VIEWS else pattern
+    for pattern in sync_urlpatterns
+]